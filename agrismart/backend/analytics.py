@@ -0,0 +1,262 @@
+"""
+Incrementally maintained analytics rollups for the reports pages.
+
+Crop-yield, soil-health and pest-risk results are rolled up per field, crop
+and week, with each week tagged by its growing season. The rollups are
+updated as predictions arrive: they listen to the prediction history
+writer, add each written batch to the running count, sum, sum of squares,
+min and max of their rows, and commit in the same transaction as the history
+rows. Nothing is ever recomputed from raw predictions.
+
+Rollup rows live in clustered WITHOUT ROWID tables next to the history, one
+row per (metric, field, crop, week), so any grouping by field, crop, week or
+season reads only a few rollup rows. Field reports feed all three metrics.
+Rows are rolled up under the crop the scorer used, as logged by the history
+writer, so predictions that relied on the default crop count towards it.
+Soil-health predictions take no crop and are rolled up under none.
+"""
+
+import csv
+import io
+import math
+from datetime import date, datetime, timedelta
+
+from history import headline
+
+# Metrics rolled up from each endpoint, with the score and label paths in its result
+METRICS = {
+    'soil-health': [('soil-health', ('soilHealthScore',), ('classification',))],
+    'crop-yield': [('crop-yield', ('predictedYield',), ('factors', 'overallRating'))],
+    'pest-risk': [('pest-risk', ('riskScore',), ('riskLevel',))],
+    'field-report': [
+        ('soil-health', ('soilHealth', 'soilHealthScore'), ('soilHealth', 'classification')),
+        ('crop-yield', ('cropYield', 'predictedYield'), ('cropYield', 'factors', 'overallRating')),
+        ('pest-risk', ('pestRisk', 'riskScore'), ('pestRisk', 'riskLevel'))
+    ]
+}
+METRIC_NAMES = ('soil-health', 'crop-yield', 'pest-risk')
+
+# Rollup columns a request may group by
+GROUP_COLUMNS = {'field': 'field_id', 'crop': 'crop_type', 'week': 'week', 'season': 'season'}
+
+# Growing season of each month: kharif (monsoon), rabi (winter) and zaid (summer)
+SEASONS = {
+    1: 'rabi', 2: 'rabi', 3: 'rabi', 4: 'zaid', 5: 'zaid', 6: 'kharif',
+    7: 'kharif', 8: 'kharif', 9: 'kharif', 10: 'kharif', 11: 'rabi', 12: 'rabi'
+}
+
+EXPORT_BATCH_ROWS = 1000
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS rollups ('
+    'metric TEXT NOT NULL, field_id TEXT NOT NULL, crop_type TEXT NOT NULL, week TEXT NOT NULL, '
+    'season TEXT NOT NULL, count INTEGER NOT NULL, total REAL NOT NULL, total_squares REAL NOT NULL, '
+    'minimum REAL NOT NULL, maximum REAL NOT NULL, '
+    'PRIMARY KEY (metric, field_id, crop_type, week)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS rollup_labels ('
+    'metric TEXT NOT NULL, field_id TEXT NOT NULL, crop_type TEXT NOT NULL, week TEXT NOT NULL, '
+    'season TEXT NOT NULL, label TEXT NOT NULL, count INTEGER NOT NULL, '
+    'PRIMARY KEY (metric, field_id, crop_type, week, label)) WITHOUT ROWID'
+)
+
+# Export columns and their types, for each dataset
+EXPORT_COLUMNS = {
+    'history': (
+        ('id', 'int'), ('timestamp', 'str'), ('endpoint', 'str'), ('fieldId', 'str'), ('cropType', 'str'),
+        ('modelVersion', 'str'), ('score', 'float'), ('label', 'str'), ('inputs', 'str'), ('outputs', 'str')
+    ),
+    'rollups': (
+        ('metric', 'str'), ('fieldId', 'str'), ('cropType', 'str'), ('week', 'str'), ('season', 'str'),
+        ('count', 'int'), ('mean', 'float'), ('min', 'float'), ('max', 'float')
+    )
+}
+
+
+def week_of(created):
+    """Return the ISO date of the Monday starting the week of a Unix time"""
+    day = datetime.fromtimestamp(created).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def season_of(week):
+    """Return the growing season of a week, such as kharif-2026 or rabi-2026 (November 2026 to March 2027)"""
+    start = date.fromisoformat(week)
+    season = SEASONS[start.month]
+    year = start.year - 1 if season == 'rabi' and start.month <= 3 else start.year
+    return f'{season}-{year}'
+
+
+class AnalyticsRollups:
+    """Per-field, crop and week rollups of prediction scores, updated as predictions are logged"""
+
+    def __init__(self, history):
+        self.history = history
+        history.add_listener(self.apply, SCHEMA)
+
+    def apply(self, connection, entries):
+        """Add a batch of history entries to the rollups, within the history write transaction"""
+        totals = {}
+        labels = {}
+        weeks = {}
+        for created, endpoint, field_id, crop_type, result in entries:
+            for metric, score_path, label_path in METRICS.get(endpoint, ()):
+                score = headline(result, score_path)
+                if not isinstance(score, (int, float)) or isinstance(score, bool):
+                    continue
+                week = week_of(created)
+                key = (metric, field_id or '', crop_type or '', week)
+                weeks.setdefault(week, season_of(week))
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = [1, score, score * score, score, score]
+                else:
+                    total[0] += 1
+                    total[1] += score
+                    total[2] += score * score
+                    total[3] = min(total[3], score)
+                    total[4] = max(total[4], score)
+                label = headline(result, label_path)
+                if isinstance(label, str):
+                    labels[key + (label,)] = labels.get(key + (label,), 0) + 1
+
+        connection.executemany(
+            'INSERT INTO rollups (metric, field_id, crop_type, week, season, count, total, total_squares, minimum, maximum) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (metric, field_id, crop_type, week) DO UPDATE SET '
+            'count = count + excluded.count, total = total + excluded.total, '
+            'total_squares = total_squares + excluded.total_squares, '
+            'minimum = MIN(minimum, excluded.minimum), maximum = MAX(maximum, excluded.maximum)',
+            [(*key, weeks[key[3]], *total) for key, total in totals.items()]
+        )
+        connection.executemany(
+            'INSERT INTO rollup_labels (metric, field_id, crop_type, week, season, label, count) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (metric, field_id, crop_type, week, label) DO UPDATE SET count = count + excluded.count',
+            [(*key[:4], weeks[key[3]], key[4], count) for key, count in labels.items()]
+        )
+
+    def _filters(self, metric, field_id, crop_type, season, start_week, end_week):
+        clauses = ['metric = ?']
+        parameters = [metric]
+        for column, value in (('field_id', field_id), ('crop_type', crop_type), ('season', season)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                parameters.append(value.lower() if column == 'crop_type' else value)
+        if start_week is not None:
+            clauses.append('week >= ?')
+            parameters.append(start_week)
+        if end_week is not None:
+            clauses.append('week <= ?')
+            parameters.append(end_week)
+        return ' AND '.join(clauses), parameters
+
+    def query(self, metric, group_by, field_id=None, crop_type=None, season=None, start_week=None, end_week=None):
+        """Return count, mean, standard deviation, min, max and label counts per group"""
+        column = GROUP_COLUMNS[group_by]
+        where, parameters = self._filters(metric, field_id, crop_type, season, start_week, end_week)
+
+        groups = {}
+        for key, count, total, total_squares, minimum, maximum in self.history.execute(
+            f'SELECT {column}, SUM(count), SUM(total), SUM(total_squares), MIN(minimum), MAX(maximum) '
+            f'FROM rollups WHERE {where} GROUP BY {column} ORDER BY {column}',
+            parameters
+        ):
+            mean = total / count
+            groups[key] = {
+                group_by: key or None,
+                'count': count,
+                'mean': round(mean, 2),
+                'std': round(math.sqrt(max(total_squares / count - mean * mean, 0.0)), 2),
+                'min': minimum,
+                'max': maximum,
+                'labels': {}
+            }
+        for key, label, count in self.history.execute(
+            f'SELECT {column}, label, SUM(count) FROM rollup_labels WHERE {where} GROUP BY {column}, label',
+            parameters
+        ):
+            if key in groups:
+                groups[key]['labels'][label] = count
+        return list(groups.values())
+
+    def iter_rollup_rows(self, metric=None):
+        """Yield batches of rollup rows as export records"""
+        where = 'WHERE metric = ? ' if metric is not None else ''
+        cursor = self.history.execute(
+            'SELECT metric, field_id, crop_type, week, season, count, total, minimum, maximum '
+            f'FROM rollups {where}ORDER BY metric, week, field_id, crop_type',
+            (metric,) if metric is not None else ()
+        )
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            yield [
+                (row_metric, field_id or None, crop_type or None, week, season, count, round(total / count, 4),
+                 minimum, maximum)
+                for row_metric, field_id, crop_type, week, season, count, total, minimum, maximum in rows
+            ]
+
+
+def history_export_rows(batches):
+    """Convert raw history row batches into export records"""
+    for rows in batches:
+        yield [
+            (row_id, datetime.fromtimestamp(created).isoformat(), *rest)
+            for row_id, created, *rest in rows
+        ]
+
+
+def stream_csv(columns, batches):
+    """Yield CSV text one batch of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting bytes until the streaming exporter drains them"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_parquet(columns, batches):
+    """Yield a Parquet file one row group per batch; requires pyarrow"""
+    # pyarrow takes tens of milliseconds to import, so it is only imported by the first Parquet export
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('Parquet export requires pyarrow')
+    types = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'str': pyarrow.string()}
+    schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    for rows in batches:
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
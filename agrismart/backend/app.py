@@ -1,513 +1,1980 @@
-from flask import Flask, request, jsonify
+import os
+
+import startup
+
+# Installed before the remaining imports so that they are profiled too
+if os.environ.get('STARTUP_PROFILE', '0') == '1':
+    startup.profiler.install()
+
+from flask import Blueprint, Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 from flask_cors import CORS
-import joblib
 import numpy as np
-import pandas as pd
-import os
+import csv
+import itertools
 import logging
-from datetime import datetime
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
 
-# Try to import TensorFlow, but continue without it if not available
-try:
-    from tensorflow.keras.models import load_model
-    TENSORFLOW_AVAILABLE = True
-except ImportError:
-    TENSORFLOW_AVAILABLE = False
-    logger = logging.getLogger(__name__)
-    logger.warning("TensorFlow not available. Pest model will use fallback predictions.")
+from analytics import (
+    EXPORT_COLUMNS,
+    GROUP_COLUMNS,
+    METRIC_NAMES,
+    AnalyticsRollups,
+    history_export_rows,
+    stream_csv,
+    stream_parquet
+)
+from batching import DeadlineExceeded, InferenceQueueFull, MicroBatcher
+from cache import PredictionCache
+from columnar import MIMETYPE as COLUMNS_MIMETYPE, ResultColumns, intern_codes, iter_bytes, pack
+from forecast import MAX_FORECAST_OBSERVATIONS, build_state, parse_state, resolve_settings, rolling_aggregates
+from history import HEADLINES, MAX_PAGE_SIZE, PredictionHistory
+from images import MAX_IMAGES_PER_REQUEST, ImageDecoder, ImageTooLarge, hash_upload, load_class_names, top_predictions
+import jsoncodec
+from metrics import MetricsRegistry, add_labels, format_histogram, format_sample
+from models import ModelRegistry, load_joblib_model, load_keras_model, load_numpy_model
+from pipeline import Pipeline
+from profiler import SamplingProfiler
+from regions import (
+    MAX_REGION_FIELDS,
+    MAX_REPORTED_ERRORS,
+    cell_bounds,
+    grid_cell,
+    parse_cell_weather,
+    parse_percentiles,
+    summarize_groups
+)
+from rules import code_dtype
+from schemas import (
+    CROP_YIELD_SCHEMA,
+    FIELD_REPORT_SCHEMA,
+    FORECAST_OBSERVATION_SCHEMA,
+    FORECAST_SCHEMA,
+    PEST_SCHEMA,
+    RAINFALL_SCHEMA,
+    REGION_FIELD_SCHEMA,
+    REGION_SCHEMA,
+    REGION_WEATHER_DEFAULTS,
+    SOIL_SCHEMA,
+    ValidationError
+)
+from scoring import (
+    BASE_YIELDS,
+    DEFAULT_BASE_YIELD,
+    DEFAULT_COMMON_PESTS,
+    PESTS_BY_CROP,
+    PEST_RISK_LEVEL_TABLE,
+    PREVENTIVE_MEASURES_TABLE,
+    SOIL_CLASSIFICATION_TABLE,
+    SOIL_RECOMMENDATIONS_TABLE,
+    YIELD_RECOMMENDATIONS_TABLE,
+    calculate_soil_health_fallback_batch,
+    calculate_weather_factor_batch,
+    calculate_pest_risk_fallback_batch,
+    calculate_rainfall_probability_fallback_batch,
+    expected_rainfall_amount_batch,
+    seeded_uniform_batch
+)
+
+startup.profiler.mark('imports')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Defaults of the SERVING_PROFILE profile (full or slim), applied before any component reads its settings
+SERVING_PROFILE = startup.apply_serving_profile()
+
+# Prediction routes, registered on the app by create_app()
+api = Blueprint('api', __name__)
+
+# Registry of pretrained models, loaded lazily in background threads
+model_registry = ModelRegistry.from_env(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'saved_Models')
+)
+model_registry.register('soil_model', 'soil_model.joblib', load_joblib_model)
+model_registry.register('rainfall_model', 'rainfall_model.joblib', load_joblib_model)
+# The NumPy export of the pest model (export_pest_model.py) avoids importing TensorFlow
+model_registry.register(
+    'pest_model', 'pest_model.npz', load_numpy_model, alternatives=[('pest_model.h5', load_keras_model)]
+)
+
+# Input feature counts of the models behind the tabular scoring routes
+MODEL_FEATURES = {'soil_model': 7, 'pest_model': 3, 'rainfall_model': 4}
+
+# Class names of the image pest model, as a JSON list in class index order
+PEST_CLASSES_PATH = os.path.join(model_registry.models_dir, 'pest_model_classes.json')
+
+# Default time budget for model calls per request; the X-Deadline-Ms header overrides it (0 disables).
+# Batch and stream chunks of up to BATCH_CHUNK_SIZE records only get a budget from the header.
+INFERENCE_DEADLINE_MS = float(os.environ.get('INFERENCE_DEADLINE_MS', 1000))
+
+# Largest X-Deadline-Ms accepted; longer budgets are capped to it
+MAX_DEADLINE_MS = 60000
+
+# Batch scoring limits
+BATCH_CHUNK_SIZE = 1000
+MAX_BATCH_RECORDS = 100000
+
+# Irrigation advice for rainfall probabilities above 70, above 40 and otherwise
+RAINFALL_RECOMMENDATIONS = ['Postpone irrigation', 'Monitor conditions', 'Continue normal irrigation']
+
+# Named /history bucket sizes in seconds
+HISTORY_BUCKETS = {'hour': 3600, 'day': 86400, 'week': 604800}
+
+# Bytes read from a streamed upload per read call
+STREAM_READ_SIZE = 64 * 1024
+
+def get_serving_model(name):
+    """Return a loaded model whose input shape matches its route's features, or None to use the fallback"""
+    model = model_registry.get(name)
+    input_shape = getattr(model, 'input_shape', None)
+    if input_shape is not None and tuple(input_shape[1:]) != (MODEL_FEATURES[name],):
+        return None
+    return model
+
+def get_image_model():
+    """Return the pest model when it is an image classifier taking (height, width, 3) inputs, or None"""
+    model = model_registry.get('pest_model')
+    input_shape = getattr(model, 'input_shape', None)
+    if input_shape is None or len(input_shape) != 4 or input_shape[3] != 3:
+        return None
+    return model
+
+def run_soil_model(soil_model, features):
+    """Run a soil model, returning predictions and max class probabilities as columns"""
+    predictions = np.asarray(soil_model.predict(features), dtype=float)
+    confidences = np.asarray(soil_model.predict_proba(features), dtype=float).max(axis=1)
+    return np.column_stack([predictions, confidences])
+
+def run_pest_model(pest_model, features):
+    """Run a pest model, returning the risk output for each row"""
+    return np.asarray(pest_model.predict(features), dtype=float)[:, 0]
+
+def run_rainfall_model(rainfall_model, features):
+    """Run a rainfall model, returning the prediction for each row"""
+    return np.asarray(rainfall_model.predict(features), dtype=float)
+
+def run_image_model(image_model, images):
+    """Run an image pest model, returning the class probabilities of each image"""
+    return np.asarray(image_model.predict(images), dtype=float)
+
+def predict_with_shadow(name, run_model, features):
+    """Run the current version of a model, sampling the batch for its shadow version when one is loaded"""
+    started = time.perf_counter()
+    outputs = run_model(model_registry.get(name), features)
+    model_registry.shadow_compare(name, features, outputs, time.perf_counter() - started, run_model)
+    return outputs
+
+def predict_soil_model(features):
+    """Run the soil model, returning predictions and max class probabilities as columns"""
+    return predict_with_shadow('soil_model', run_soil_model, features)
+
+def predict_pest_model(features):
+    """Run the pest model, returning the risk output for each row"""
+    return predict_with_shadow('pest_model', run_pest_model, features)
+
+def predict_rainfall_model(features):
+    """Run the rainfall model, returning the prediction for each row"""
+    return predict_with_shadow('rainfall_model', run_rainfall_model, features)
+
+def predict_image_model(images):
+    """Run the image pest model, returning the class probabilities of each image"""
+    return predict_with_shadow('pest_model', run_image_model, images)
+
+# Micro-batchers coalescing concurrent requests into shared model calls
+soil_batcher = MicroBatcher.from_env('soil', predict_soil_model)
+pest_batcher = MicroBatcher.from_env('pest', predict_pest_model)
+rainfall_batcher = MicroBatcher.from_env('rainfall', predict_rainfall_model)
+image_batcher = MicroBatcher.from_env('image', predict_image_model)
+
+# Thread pool decoding uploaded photos for /predict/pest-image
+image_decoder = ImageDecoder.from_env()
+
+# Server-side cache of prediction results; results echo the field area and scale with it, so it is never rounded
+prediction_cache = PredictionCache.from_env(exact_keys=['field_area'])
+
+# Append-only log of scored records, served by /history
+prediction_history = PredictionHistory.from_env()
+
+# Per-field, crop and week score rollups, updated by the history writer as predictions are logged
+analytics_rollups = AnalyticsRollups(prediction_history) if prediction_history.enabled else None
+
+# Request, stage and model metrics exposed on /metrics
+metrics = MetricsRegistry()
+request_count = metrics.counter('agrismart_requests_total', 'HTTP requests by route and status', ['route', 'status'])
+request_latency = metrics.histogram('agrismart_request_duration_seconds', 'Request latency by route', ['route'])
+stage_latency = metrics.histogram(
+    'agrismart_stage_duration_seconds',
+    'Time spent per request stage (parse, features, inference, recommendations, serialization)',
+    ['route', 'stage']
+)
+requests_in_flight = metrics.gauge('agrismart_requests_in_flight', 'Requests currently being handled', ['route'])
+model_predictions = metrics.counter(
+    'agrismart_model_predictions_total', 'Rows scored by each model or its rule-based fallback', ['model', 'path']
+)
+model_errors = metrics.counter('agrismart_model_errors_total', 'Model calls that failed and fell back to rules', ['model'])
+model_deadline_misses = metrics.counter(
+    'agrismart_model_deadline_misses_total', 'Model calls that missed the request deadline and fell back to rules', ['model']
+)
+
+# Models whose calls fell back to the rules while scoring the current chunk, collected by run_scorer()
+scoring_state = threading.local()
+
+# Sampling profiler, toggled at runtime through /debug/profiler when ALLOW_PROFILER=1
+profiler = SamplingProfiler()
+
+@contextmanager
+def record_stage(stage):
+    """Time one stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        route = g.get('metrics_route', 'none') if has_request_context() else 'none'
+        stage_latency.labels(route, stage).observe(time.perf_counter() - started)
+
+# Prediction stages shared across endpoints, timed under the request stage metrics
+field_pipeline = Pipeline(timer=record_stage)
 
-# Global variables to store loaded models
-soil_model = None
-rainfall_model = None
-pest_model = None
+def parse_deadline_ms(value):
+    """Parse an X-Deadline-Ms value, capped at MAX_DEADLINE_MS"""
+    deadline_ms = float(value)
+    if not math.isfinite(deadline_ms) or deadline_ms < 0:
+        raise ValueError(f"X-Deadline-Ms must be a non-negative number, got {value!r}")
+    return min(deadline_ms, MAX_DEADLINE_MS)
 
-def load_models():
-    """Load all pretrained models at startup"""
-    global soil_model, rainfall_model, pest_model
+def start_deadline(started, chunk=False):
+    """Start the current request's model budget; batch and stream requests restart it for every chunk"""
+    deadline_ms = g.chunk_deadline_ms if chunk else g.deadline_ms
+    g.deadline = started + deadline_ms / 1000 if deadline_ms > 0 else None
+
+def remaining_deadline():
+    """Return the seconds left in the current request's model budget, or None without a deadline"""
+    deadline = g.get('deadline') if has_request_context() else None
+    return None if deadline is None else deadline - time.perf_counter()
+
+def mark_degraded(model_name):
+    """Record that the chunk being scored fell back from a model to the rules"""
+    degraded = getattr(scoring_state, 'degraded', None)
+    if degraded is not None:
+        degraded.add(model_name)
+
+def run_scorer(score, *args):
+    """Run a scorer, returning its results and the names of the models that fell back to the rules meanwhile"""
+    scoring_state.degraded = set()
+    try:
+        return score(*args), scoring_state.degraded
+    finally:
+        scoring_state.degraded = None
+
+def load_models(wait=True):
+    """Load all pretrained models in parallel, optionally waiting for them to finish"""
+    logger.info(f"Loading models from: {model_registry.models_dir}")
+    model_registry.load_all(wait=wait)
+    if wait:
+        startup.profiler.mark('load_models')
+
+@api.before_request
+def start_request_metrics():
+    """Track the start time and in-flight count of each request"""
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.request_started = time.perf_counter()
+    requests_in_flight.labels(g.metrics_route).inc()
     
     try:
-        # Get the path to saved_Models directory
-        models_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'saved_Models')
-        logger.info(f"Loading models from: {models_dir}")
-        
-        # Load soil model (joblib)
-        soil_model_path = os.path.join(models_dir, 'soil_model.joblib')
-        if os.path.exists(soil_model_path):
-            soil_model = joblib.load(soil_model_path)
-            logger.info("Soil model loaded successfully")
-        else:
-            logger.warning(f"Soil model not found at {soil_model_path}")
-        
-        # Load rainfall model (joblib)
-        rainfall_model_path = os.path.join(models_dir, 'rainfall_model.joblib')
-        if os.path.exists(rainfall_model_path):
-            rainfall_model = joblib.load(rainfall_model_path)
-            logger.info("Rainfall model loaded successfully")
-        else:
-            logger.warning(f"Rainfall model not found at {rainfall_model_path}")
-        
-        # Load pest model (h5) - only if TensorFlow is available
-        pest_model_path = os.path.join(models_dir, 'pest_model.h5')
-        if os.path.exists(pest_model_path) and TENSORFLOW_AVAILABLE:
-            pest_model = load_model(pest_model_path)
-            logger.info("Pest model loaded successfully")
-        else:
-            if not TENSORFLOW_AVAILABLE:
-                logger.warning("TensorFlow not available - pest model will use fallback predictions")
-            else:
-                logger.warning(f"Pest model not found at {pest_model_path}")
-            
-    except Exception as e:
-        logger.error(f"Error loading models: {str(e)}")
+        g.chunk_deadline_ms = parse_deadline_ms(request.headers.get('X-Deadline-Ms', 0))
+        g.deadline_ms = g.chunk_deadline_ms if 'X-Deadline-Ms' in request.headers else INFERENCE_DEADLINE_MS
+    except ValueError:
+        g.chunk_deadline_ms = 0
+        g.deadline_ms = INFERENCE_DEADLINE_MS
+    start_deadline(g.request_started)
+
+@api.after_request
+def record_request_metrics(response):
+    """Count each request by status and record its latency"""
+    request_count.labels(g.metrics_route, str(response.status_code)).inc()
+    request_latency.labels(g.metrics_route).observe(time.perf_counter() - g.request_started)
+    return response
 
-@app.route('/health', methods=['GET'])
+@api.teardown_request
+def finish_request_metrics(error=None):
+    """Release the in-flight count, including for failed requests"""
+    if 'metrics_route' in g:
+        requests_in_flight.labels(g.metrics_route).dec()
+
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    models = model_registry.status()
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'models_loaded': {
-            'soil_model': soil_model is not None,
-            'rainfall_model': rainfall_model is not None,
-            'pest_model': pest_model is not None
+            name: model['state'] == 'loaded' for name, model in models.items()
+        },
+        'models': models,
+        'micro_batching': {
+            'soil_model': soil_batcher.stats(),
+            'rainfall_model': rainfall_batcher.stats(),
+            'pest_model': pest_batcher.stats(),
+            'pest_image_model': image_batcher.stats()
+        },
+        'prediction_cache': prediction_cache.stats(),
+        'prediction_history': prediction_history.stats()
+    })
+
+@api.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint, returning 503 until every model has finished loading"""
+    model_registry.load_all()
+    ready = model_registry.is_ready()
+    return jsonify({
+        'ready': ready,
+        'models': model_registry.status()
+    }), 200 if ready else 503
+
+@api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics endpoint, reporting this worker process's metrics under its pid label"""
+    lines = add_labels(metrics.render() + render_runtime_metrics(), {'pid': os.getpid()})
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@api.route('/debug/profiler', methods=['GET', 'POST'])
+def profiler_control():
+    """Start or stop the sampling profiler and return the collected samples"""
+    if os.environ.get('ALLOW_PROFILER', '0') != '1':
+        return jsonify({'error': 'Profiler is disabled; set ALLOW_PROFILER=1 to enable it'}), 404
+    
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            if data.get('enabled', True):
+                profiler.start(float(data.get('intervalMs', 5)))
+            else:
+                profiler.stop()
+        
+        return jsonify(profiler.snapshot(int(request.args.get('limit', 50))))
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/debug/startup', methods=['GET'])
+def startup_report():
+    """Return the startup phases, the slowest imports and model load costs recorded with STARTUP_PROFILE=1"""
+    if os.environ.get('ALLOW_PROFILER', '0') != '1':
+        return jsonify({'error': 'Profiler is disabled; set ALLOW_PROFILER=1 to enable it'}), 404
+    
+    try:
+        limit = int(request.args.get('limit', 30))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    models = model_registry.status()
+    return jsonify({
+        'profile': SERVING_PROFILE,
+        **startup.profiler.report(limit),
+        'models': {
+            name: {
+                'state': model['state'],
+                'load_seconds': model['load_seconds'],
+                'warmup_seconds': model['warmup_seconds'],
+                'load_memory_bytes': model['load_memory_bytes']
+            }
+            for name, model in models.items()
         }
     })
 
-@app.route('/predict/soil-health', methods=['POST'])
+@api.route('/models/reload', methods=['POST'])
+def reload_models():
+    """Reload models from their files in the background, swapping them in or holding them as shadows"""
+    if os.environ.get('ALLOW_MODEL_ADMIN', '0') != '1':
+        return jsonify({'error': 'Model administration is disabled; set ALLOW_MODEL_ADMIN=1 to enable it'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    known = list(model_registry.status())
+    names = data.get('models', known)
+    shadow = data.get('shadow')
+    if not isinstance(names, list) or not all(name in known for name in names):
+        return jsonify({'error': f"models must be a list of: {', '.join(known)}"}), 400
+    if shadow is not None and not isinstance(shadow, bool):
+        return jsonify({'error': 'shadow must be a boolean'}), 400
+    
+    started = {name: model_registry.reload(name, shadow=shadow) for name in names}
+    return jsonify({'started': started, 'models': model_registry.status()}), 202
+
+@api.route('/models/promote', methods=['POST'])
+def promote_model():
+    """Swap a model's shadow version in as its current version"""
+    if os.environ.get('ALLOW_MODEL_ADMIN', '0') != '1':
+        return jsonify({'error': 'Model administration is disabled; set ALLOW_MODEL_ADMIN=1 to enable it'}), 404
+    
+    name = (request.get_json(silent=True) or {}).get('model')
+    if name not in model_registry.status():
+        return jsonify({'error': f"model must be one of: {', '.join(model_registry.status())}"}), 400
+    if not model_registry.promote(name):
+        return jsonify({'error': f'{name} has no shadow version to promote'}), 409
+    return jsonify({'model': name, 'status': model_registry.status()[name]})
+
+@api.route('/predict/soil-health', methods=['POST'])
 def predict_soil_health():
     """Predict soil health based on soil parameters"""
     try:
-        data = request.get_json()
-        
         # Extract soil parameters
-        nitrogen = float(data.get('nitrogen', 45))
-        phosphorus = float(data.get('phosphorus', 28))
-        potassium = float(data.get('potassium', 62))
-        ph = float(data.get('ph', 6.5))
-        organic_matter = float(data.get('organicMatter', 3.2))
-        temperature = float(data.get('temperature', 25))
-        humidity = float(data.get('humidity', 65))
-        
-        # Prepare features for model prediction
-        features = np.array([[nitrogen, phosphorus, potassium, ph, organic_matter, temperature, humidity]])
-        
-        if soil_model is not None:
-            try:
-                # Use the actual model for prediction
-                prediction = soil_model.predict(features)[0]
-                confidence = float(soil_model.predict_proba(features).max()) * 100
-                
-                # Convert prediction to soil health score (0-100)
-                soil_health_score = min(max(prediction * 100, 0), 100)
-                
-            except Exception as e:
-                logger.warning(f"Model prediction failed, using fallback: {str(e)}")
-                # Fallback calculation
-                soil_health_score = calculate_soil_health_fallback(nitrogen, phosphorus, ph, temperature, humidity)
-                confidence = 85.0
-        else:
-            # Fallback calculation when model is not available
-            soil_health_score = calculate_soil_health_fallback(nitrogen, phosphorus, ph, temperature, humidity)
-            confidence = 80.0
-        
-        # Determine classification
-        if soil_health_score >= 80:
-            classification = 'Excellent'
-        elif soil_health_score >= 60:
-            classification = 'Good'
-        elif soil_health_score >= 40:
-            classification = 'Fair'
-        else:
-            classification = 'Poor'
-        
-        # Generate recommendations
-        recommendations = generate_soil_recommendations(nitrogen, phosphorus, ph, soil_health_score)
+        with record_stage('parse'):
+            data = parse_json_body()
+            features = extract_soil_features(data)
         
-        return jsonify({
-            'soilHealthScore': round(soil_health_score, 1),
-            'classification': classification,
-            'confidence': round(confidence, 1),
-            'recommendations': recommendations,
-            'timestamp': datetime.now().isoformat()
-        })
+        result = score_cached('soil-health', score_soil_health_chunk, [features])[0]
+        result['timestamp'] = datetime.now().isoformat()
+        record_history('soil-health', [data], [result])
+        with record_stage('serialization'):
+            return jsonify(result)
         
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         logger.error(f"Error in soil health prediction: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/predict/crop-yield', methods=['POST'])
-def predict_crop_yield():
-    """Predict crop yield based on soil and weather data"""
+@api.route('/predict/soil-health/batch', methods=['POST'])
+def predict_soil_health_batch():
+    """Predict soil health for a batch of soil parameter records"""
+    return run_batch_route('soil-health', extract_soil_features, score_soil_health_chunk)
+
+@api.route('/predict/soil-health/stream', methods=['POST'])
+def predict_soil_health_stream():
+    """Predict soil health for a streamed NDJSON or CSV upload of soil records"""
+    return run_stream_route('soil-health', extract_soil_features, score_soil_health_chunk)
+
+@api.route('/predict/pest-image', methods=['POST'])
+def predict_pest_image():
+    """Identify pests in photos uploaded as multipart image files or as one raw image body"""
+    if not image_decoder.available:
+        return jsonify({'error': 'Image decoding requires Pillow'}), 503
+    if get_image_model() is None:
+        return jsonify({'error': 'Pest image model is not loaded'}), 503
+    
     try:
-        data = request.get_json()
-        
-        # Extract input data
-        soil_data = data.get('soilData', {})
-        weather_data = data.get('weatherData', {})
-        crop_type = data.get('cropType', 'wheat')
-        field_area = float(data.get('fieldArea', 1))
-        
-        # Get soil health first
-        soil_health_response = predict_soil_health_internal(soil_data)
-        soil_health_score = soil_health_response['soilHealthScore']
-        
-        # Calculate base yield for crop type
-        base_yields = {
-            'wheat': 4.2,
-            'rice': 5.8,
-            'corn': 6.5,
-            'soybean': 3.2,
-            'cotton': 2.8,
-            'sugarcane': 45.0
-        }
-        base_yield = base_yields.get(crop_type.lower(), 4.0)
-        
-        # Calculate weather factor
-        temperature = float(weather_data.get('temperature', 25))
-        humidity = float(weather_data.get('humidity', 65))
-        rainfall = float(weather_data.get('rainfall', 120))
+        with record_stage('parse'):
+            uploads = read_image_uploads()
         
-        weather_factor = calculate_weather_factor(temperature, humidity, rainfall)
+        # Each photo's content hash is its cache key, so a re-uploaded photo is never decoded again
+        valid = [upload for upload in uploads if 'file' in upload]
+        files = {upload['contentHash']: upload['file'] for upload in valid}
+        scored = score_cached(
+            'pest-image', lambda hashes: score_images([files[content_hash] for content_hash in hashes]),
+            [upload['contentHash'] for upload in valid]
+        ) if valid else []
         
-        # Calculate soil factor
-        soil_factor = 0.6 + (soil_health_score / 100) * 0.8
+        results = [{key: value for key, value in upload.items() if key != 'file'} for upload in uploads]
+        records = [dict(results[upload['index']]) for upload in valid]
+        for upload, result in zip(valid, scored):
+            results[upload['index']].update(result)
+        record_history('pest-image', records, scored)
         
-        # Calculate final yield
-        predicted_yield = base_yield * soil_factor * weather_factor
-        total_production = predicted_yield * field_area
+        with record_stage('serialization'):
+            return jsonify({
+                'results': results,
+                'count': len(results),
+                'failed': sum(1 for result in results if 'error' in result),
+                'timestamp': datetime.now().isoformat()
+            })
         
-        # Calculate confidence
-        confidence = min(80 + (soil_health_response['confidence'] - 80) * 0.3 + 
-                        (10 if weather_factor > 0.9 else 5 if weather_factor > 0.7 else 0), 95)
-        
-        # Generate recommendations
-        recommendations = generate_yield_recommendations(predicted_yield, soil_health_score, weather_data)
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Error in pest image prediction: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/predict/crop-yield', methods=['POST'])
+def predict_crop_yield():
+    """Predict crop yield based on soil and weather data"""
+    try:
+        with record_stage('parse'):
+            data = parse_json_body()
+            inputs = extract_crop_yield_inputs(data)
         
-        return jsonify({
-            'predictedYield': round(predicted_yield, 2),
-            'totalProduction': round(total_production, 2),
-            'unit': 'tons/hectare',
-            'confidence': round(confidence),
-            'cropType': crop_type,
-            'fieldArea': field_area,
-            'factors': {
-                'soilHealth': round(soil_health_score, 1),
-                'weatherConditions': round(weather_factor * 100),
-                'overallRating': soil_health_response['classification']
-            },
-            'recommendations': recommendations,
-            'timestamp': datetime.now().isoformat()
-        })
+        result = score_cached('crop-yield', score_crop_yield_chunk, [inputs])[0]
+        result['timestamp'] = datetime.now().isoformat()
+        record_history('crop-yield', [data], [result], [inputs])
+        with record_stage('serialization'):
+            return jsonify(result)
         
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         logger.error(f"Error in crop yield prediction: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/predict/pest-risk', methods=['POST'])
+@api.route('/predict/crop-yield/batch', methods=['POST'])
+def predict_crop_yield_batch():
+    """Predict crop yield for a batch of soil and weather records"""
+    return run_batch_route('crop-yield', extract_crop_yield_inputs, score_crop_yield_chunk)
+
+@api.route('/predict/crop-yield/stream', methods=['POST'])
+def predict_crop_yield_stream():
+    """Predict crop yield for a streamed NDJSON or CSV upload of field-season records"""
+    return run_stream_route('crop-yield', extract_crop_yield_inputs, score_crop_yield_chunk)
+
+@api.route('/predict/pest-risk', methods=['POST'])
 def predict_pest_risk():
     """Predict pest risk based on environmental conditions"""
     try:
-        data = request.get_json()
-        
-        temperature = float(data.get('temperature', 25))
-        humidity = float(data.get('humidity', 65))
-        rainfall = float(data.get('rainfall', 120))
-        crop_type = data.get('cropType', 'wheat')
-        
-        # Prepare features for pest model
-        features = np.array([[temperature, humidity, rainfall]])
+        with record_stage('parse'):
+            data = parse_json_body()
+            inputs = extract_pest_inputs(data)
         
-        if pest_model is not None:
-            try:
-                # Use the actual neural network model
-                prediction = pest_model.predict(features)[0][0]
-                pest_risk_score = min(max(prediction * 100, 0), 100)
-                confidence = 85.0
-            except Exception as e:
-                logger.warning(f"Pest model prediction failed, using fallback: {str(e)}")
-                pest_risk_score = calculate_pest_risk_fallback(temperature, humidity, rainfall, crop_type)
-                confidence = 80.0
-        else:
-            pest_risk_score = calculate_pest_risk_fallback(temperature, humidity, rainfall, crop_type)
-            confidence = 75.0
-        
-        # Determine risk level
-        if pest_risk_score >= 70:
-            risk_level = 'High'
-        elif pest_risk_score >= 40:
-            risk_level = 'Medium'
-        else:
-            risk_level = 'Low'
-        
-        # Get common pests and preventive measures
-        common_pests = get_common_pests(crop_type, pest_risk_score)
-        preventive_measures = get_preventive_measures(pest_risk_score)
-        
-        return jsonify({
-            'riskLevel': risk_level,
-            'riskScore': round(pest_risk_score, 1),
-            'confidence': round(confidence, 1),
-            'commonPests': common_pests,
-            'preventiveMeasures': preventive_measures,
-            'timestamp': datetime.now().isoformat()
-        })
+        result = score_cached('pest-risk', score_pest_risk_chunk, [inputs])[0]
+        result['timestamp'] = datetime.now().isoformat()
+        record_history('pest-risk', [data], [result], [inputs])
+        with record_stage('serialization'):
+            return jsonify(result)
         
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         logger.error(f"Error in pest risk prediction: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/predict/rainfall', methods=['POST'])
+@api.route('/predict/pest-risk/batch', methods=['POST'])
+def predict_pest_risk_batch():
+    """Predict pest risk for a batch of environmental records"""
+    return run_batch_route('pest-risk', extract_pest_inputs, score_pest_risk_chunk)
+
+@api.route('/predict/pest-risk/stream', methods=['POST'])
+def predict_pest_risk_stream():
+    """Predict pest risk for a streamed NDJSON or CSV upload of environmental records"""
+    return run_stream_route('pest-risk', extract_pest_inputs, score_pest_risk_chunk)
+
+@api.route('/predict/rainfall', methods=['POST'])
 def predict_rainfall():
     """Predict rainfall based on weather conditions"""
     try:
-        data = request.get_json()
+        with record_stage('parse'):
+            data = parse_json_body()
+            inputs = extract_rainfall_features(data)
+        
+        result = score_cached('rainfall', score_rainfall_chunk, [inputs])[0]
+        result['timestamp'] = datetime.now().isoformat()
+        record_history('rainfall', [data], [result])
+        with record_stage('serialization'):
+            return jsonify(result)
+        
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Error in rainfall prediction: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/predict/rainfall/batch', methods=['POST'])
+def predict_rainfall_batch():
+    """Predict rainfall for a batch of weather records"""
+    return run_batch_route('rainfall', extract_rainfall_features, score_rainfall_chunk)
+
+@api.route('/predict/rainfall/stream', methods=['POST'])
+def predict_rainfall_stream():
+    """Predict rainfall for a streamed NDJSON or CSV upload of weather records"""
+    return run_stream_route('rainfall', extract_rainfall_features, score_rainfall_chunk)
+
+@api.route('/predict/field-report', methods=['POST'])
+def predict_field_report():
+    """Predict soil health, crop yield, pest risk and rainfall for a field in one pass"""
+    try:
+        with record_stage('parse'):
+            data = parse_json_body()
+            inputs = extract_field_report_inputs(data)
+        
+        result = score_cached('field-report', score_field_report_chunk, [inputs])[0]
+        result['timestamp'] = datetime.now().isoformat()
+        record_history('field-report', [data], [result], [inputs])
+        with record_stage('serialization'):
+            return jsonify(result)
         
-        temperature = float(data.get('temperature', 25))
-        humidity = float(data.get('humidity', 65))
-        pressure = float(data.get('pressure', 1013))
-        wind_speed = float(data.get('windSpeed', 10))
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Error in field report prediction: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/predict/field-report/batch', methods=['POST'])
+def predict_field_report_batch():
+    """Predict field reports for a batch of soil and weather records"""
+    return run_batch_route('field-report', extract_field_report_inputs, score_field_report_chunk)
+
+@api.route('/predict/field-report/stream', methods=['POST'])
+def predict_field_report_stream():
+    """Predict field reports for a streamed NDJSON or CSV upload of field-season records"""
+    return run_stream_route('field-report', extract_field_report_inputs, score_field_report_chunk)
+
+@api.route('/predict/forecast', methods=['POST'])
+def predict_forecast():
+    """Forecast rainfall and pest risk with rolling-window aggregates over a sequence of weather observations"""
+    try:
+        with record_stage('parse'):
+            forecast_inputs = extract_forecast_inputs(parse_json_body())
         
-        # Prepare features for rainfall model
-        features = np.array([[temperature, humidity, pressure, wind_speed]])
+        result = score_forecast(forecast_inputs)
+        result['timestamp'] = datetime.now().isoformat()
+        with record_stage('serialization'):
+            return jsonify(result)
         
-        if rainfall_model is not None:
-            try:
-                # Use the actual model
-                prediction = rainfall_model.predict(features)[0]
-                probability = min(max(prediction * 100, 0), 90)
-                confidence = 85.0
-            except Exception as e:
-                logger.warning(f"Rainfall model prediction failed, using fallback: {str(e)}")
-                probability = calculate_rainfall_probability_fallback(temperature, humidity, pressure)
-                confidence = 80.0
-        else:
-            probability = calculate_rainfall_probability_fallback(temperature, humidity, pressure)
-            confidence = 75.0
-        
-        # Calculate expected amount
-        expected_amount = round(5 + np.random.random() * 20) if probability > 60 else round(np.random.random() * 5)
-        
-        # Generate recommendation
-        if probability > 70:
-            recommendation = 'Postpone irrigation'
-        elif probability > 40:
-            recommendation = 'Monitor conditions'
-        else:
-            recommendation = 'Continue normal irrigation'
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Error in forecast prediction: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/predict/region', methods=['POST'])
+def predict_region():
+    """Score georeferenced fields in one pass and aggregate soil health and pest risk per grid cell"""
+    try:
+        with record_stage('parse'):
+            region = extract_region_inputs(parse_json_body())
+        
+        result = score_region(region)
+        result['timestamp'] = datetime.now().isoformat()
+        with record_stage('serialization'):
+            return jsonify(result)
+        
+    except ValidationError as e:
+        return validation_error_response(e)
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Error in region prediction: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/history', methods=['GET'])
+def prediction_history_endpoint():
+    """Page through logged predictions, or aggregate their headline scores per time bucket"""
+    if not prediction_history.enabled:
+        return jsonify({'error': 'Prediction history is disabled (PREDICTION_HISTORY=off)'}), 404
+    
+    try:
+        query = parse_history_query(request.args)
+        if query['bucket'] is not None:
+            buckets = prediction_history.aggregate(
+                query['endpoint'], query['bucket'], query['field_id'], query['crop_type'], query['start'], query['end']
+            )
+            for bucket in buckets:
+                bucket['start'] = datetime.fromtimestamp(bucket['start']).isoformat()
+            return jsonify({'endpoint': query['endpoint'], 'bucketSeconds': query['bucket'], 'buckets': buckets})
         
+        records, next_cursor = prediction_history.query(
+            query['endpoint'], query['field_id'], query['crop_type'], query['start'], query['end'],
+            query['limit'], query['cursor']
+        )
+        for record in records:
+            record['timestamp'] = datetime.fromtimestamp(record.pop('created')).isoformat()
         return jsonify({
-            'probability': round(probability, 1),
-            'expectedAmount': expected_amount,
-            'timeframe': '24 hours',
-            'confidence': round(confidence, 1),
-            'recommendation': recommendation,
-            'timestamp': datetime.now().isoformat()
+            'endpoint': query['endpoint'],
+            'records': records,
+            'count': len(records),
+            'nextCursor': f'{next_cursor[0]!r}:{next_cursor[1]}' if next_cursor is not None else None
         })
         
+    except ValidationError as e:
+        return validation_error_response(e)
     except Exception as e:
-        logger.error(f"Error in rainfall prediction: {str(e)}")
+        logger.error(f"Error in history query: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@api.route('/analytics/rollups', methods=['GET'])
+def analytics_rollups_endpoint():
+    """Serve crop-yield, soil-health or pest-risk rollups grouped by field, crop, week or season"""
+    if analytics_rollups is None:
+        return jsonify({'error': 'Analytics need the prediction history (PREDICTION_HISTORY=off)'}), 404
+    
+    args = request.args
+    errors = []
+    metric = args.get('metric')
+    if metric not in METRIC_NAMES:
+        errors.append({'field': 'metric', 'message': f"must be one of {', '.join(METRIC_NAMES)}"})
+    group_by = args.get('groupBy', 'week')
+    if group_by not in GROUP_COLUMNS:
+        errors.append({'field': 'groupBy', 'message': f"must be one of {', '.join(GROUP_COLUMNS)}"})
+    weeks = {}
+    for name in ('startWeek', 'endWeek'):
+        try:
+            weeks[name] = date.fromisoformat(args[name]).isoformat() if args.get(name) else None
+        except ValueError:
+            errors.append({'field': name, 'message': 'must be an ISO date such as 2026-06-01'})
+    if errors:
+        return validation_error_response(ValidationError(errors))
+    
+    try:
+        groups = analytics_rollups.query(
+            metric, group_by, args.get('fieldId'), args.get('cropType'), args.get('season'),
+            weeks['startWeek'], weeks['endWeek']
+        )
+        return jsonify({'metric': metric, 'groupBy': group_by, 'groups': groups, 'count': len(groups)})
+        
+    except Exception as e:
+        logger.error(f"Error in analytics rollups: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/analytics/export', methods=['GET'])
+def analytics_export():
+    """Stream logged predictions or rollups as CSV or Parquet without loading them into memory"""
+    if analytics_rollups is None:
+        return jsonify({'error': 'Analytics need the prediction history (PREDICTION_HISTORY=off)'}), 404
+    
+    args = request.args
+    errors = []
+    dataset = args.get('dataset', 'history')
+    if dataset not in EXPORT_COLUMNS:
+        errors.append({'field': 'dataset', 'message': f"must be one of {', '.join(EXPORT_COLUMNS)}"})
+    export_format = args.get('format', 'csv')
+    if export_format not in ('csv', 'parquet'):
+        errors.append({'field': 'format', 'message': 'must be csv or parquet'})
+    endpoint = args.get('endpoint')
+    if endpoint is not None and endpoint not in HEADLINES:
+        errors.append({'field': 'endpoint', 'message': f"must be one of {', '.join(HEADLINES)}"})
+    metric = args.get('metric')
+    if metric is not None and metric not in METRIC_NAMES:
+        errors.append({'field': 'metric', 'message': f"must be one of {', '.join(METRIC_NAMES)}"})
+    times = {}
+    for name in ('start', 'end'):
+        try:
+            times[name] = parse_history_time(args[name], name) if args.get(name) else None
+        except ValidationError as e:
+            errors += e.errors
+    if errors:
+        return validation_error_response(ValidationError(errors))
+    
+    if dataset == 'history':
+        prediction_history.flush()
+        batches = history_export_rows(prediction_history.iter_rows(
+            endpoint, args.get('fieldId'), args.get('cropType'), times['start'], times['end']
+        ))
+    else:
+        batches = analytics_rollups.iter_rollup_rows(metric)
+    
+    if export_format == 'parquet':
+        try:
+            chunks = stream_parquet(EXPORT_COLUMNS[dataset], batches)
+            first = next(chunks)
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 400
+        body = itertools.chain([first], chunks)
+        mimetype = 'application/vnd.apache.parquet'
+    else:
+        body = stream_csv(EXPORT_COLUMNS[dataset], batches)
+        mimetype = 'text/csv'
+    
+    filename = f"agrismart-{dataset}-{datetime.now().strftime('%Y%m%d')}.{export_format}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 # Helper functions
-def predict_soil_health_internal(soil_data):
-    """Internal function to get soil health prediction"""
-    nitrogen = float(soil_data.get('nitrogen', 45))
-    phosphorus = float(soil_data.get('phosphorus', 28))
-    potassium = float(soil_data.get('potassium', 62))
-    ph = float(soil_data.get('ph', 6.5))
-    organic_matter = float(soil_data.get('organicMatter', 3.2))
-    temperature = float(soil_data.get('temperature', 25))
-    humidity = float(soil_data.get('humidity', 65))
-    
-    soil_health_score = calculate_soil_health_fallback(nitrogen, phosphorus, ph, temperature, humidity)
-    
-    if soil_health_score >= 80:
-        classification = 'Excellent'
-    elif soil_health_score >= 60:
-        classification = 'Good'
-    elif soil_health_score >= 40:
-        classification = 'Fair'
+def parse_json_body():
+    """Parse the request body as a JSON object, raising ValidationError for malformed input"""
+    try:
+        data = jsoncodec.loads(request.get_data())
+    except ValueError:
+        raise ValidationError([{'field': None, 'message': 'Request body must be valid JSON'}])
+    if not isinstance(data, dict):
+        raise ValidationError([{'field': None, 'message': 'Request body must be a JSON object'}])
+    return data
+
+def read_image_uploads():
+    """Hash the uploaded photos in chunks, from multipart image/images files or a raw image/* body"""
+    if request.mimetype == 'multipart/form-data':
+        # Werkzeug has already spooled large files to disk, so they are hashed in place
+        files = request.files.getlist('image') + request.files.getlist('images')
+        sources = [(file.filename, file.stream, False) for file in files]
+    elif request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        sources = [(request.args.get('filename'), request.stream, True)]
     else:
-        classification = 'Poor'
+        raise ValidationError([{
+            'field': None, 'message': 'Upload images as multipart/form-data files or as a raw image/* body'
+        }])
+    if not 0 < len(sources) <= MAX_IMAGES_PER_REQUEST:
+        raise ValidationError([{
+            'field': 'image', 'message': f'must contain 1 to {MAX_IMAGES_PER_REQUEST} files'
+        }])
+    
+    uploads = []
+    for index, (filename, stream, spool) in enumerate(sources):
+        try:
+            content_hash, size, file = hash_upload(stream, spool=spool)
+            uploads.append({
+                'index': index, 'filename': filename, 'contentHash': content_hash, 'bytes': size, 'file': file
+            })
+        except ImageTooLarge as e:
+            uploads.append({'index': index, 'filename': filename, 'error': str(e)})
+    return uploads
+
+def queue_full_response(error):
+    """Build the 429 response returned when a model's inference queue is full"""
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
+def validation_error_response(error):
+    """Build the structured 400 response for invalid input"""
+    return jsonify({'error': str(error), 'details': error.errors}), 400
+
+def extract_soil_features(data):
+    """Extract soil model features from a request payload"""
+    return SOIL_SCHEMA.validate(data)
+
+def extract_pest_inputs(data):
+    """Extract pest model features and crop type from a request payload"""
+    temperature, humidity, rainfall, crop_type = PEST_SCHEMA.validate(data)
+    return [temperature, humidity, rainfall], crop_type
+
+def extract_rainfall_features(data):
+    """Extract rainfall model features from a request payload"""
+    return RAINFALL_SCHEMA.validate(data)
+
+def extract_crop_yield_inputs(data):
+    """Extract soil, weather and field inputs for crop yield prediction"""
+    soil_features, (temperature, humidity, rainfall), crop_type, field_area = CROP_YIELD_SCHEMA.validate(data)
     
     return {
-        'soilHealthScore': soil_health_score,
-        'classification': classification,
-        'confidence': 85.0
+        'soil_features': soil_features,
+        'crop_type': crop_type,
+        'field_area': field_area,
+        'temperature': temperature,
+        'humidity': humidity,
+        'rainfall': rainfall
     }
 
-def calculate_soil_health_fallback(nitrogen, phosphorus, ph, temperature, humidity):
-    """Fallback calculation for soil health when model is not available"""
-    score = 0
+def extract_field_report_inputs(data):
+    """Extract every input of a field report: crop yield inputs plus rainfall features"""
+    soil_features, weather, crop_type, field_area = FIELD_REPORT_SCHEMA.validate(data)
+    temperature, humidity, rainfall, pressure, wind_speed = weather
     
-    # Nitrogen contribution (0-30 points)
-    if nitrogen >= 50:
-        score += 30
-    elif nitrogen >= 30:
-        score += 20
-    else:
-        score += 10
+    return {
+        'soil_features': soil_features,
+        'crop_type': crop_type,
+        'field_area': field_area,
+        'temperature': temperature,
+        'humidity': humidity,
+        'rainfall': rainfall,
+        'rainfall_features': [temperature, humidity, pressure, wind_speed]
+    }
+
+def extract_forecast_inputs(data):
+    """Extract forecast settings, weather observations and the state of a continued forecast"""
+    field_id, crop_type, interval, window, seed = FORECAST_SCHEMA.validate(data)
+    state = parse_state(data['state']) if data.get('state') is not None else None
+    settings = resolve_settings({'cropType': crop_type, 'interval': interval, 'window': window, 'seed': seed}, state)
+    observations = FORECAST_OBSERVATION_SCHEMA.validate_list(
+        data.get('observations'), 'observations', MAX_FORECAST_OBSERVATIONS
+    )
     
-    # Phosphorus contribution (0-25 points)
-    if phosphorus >= 25:
-        score += 25
-    elif phosphorus >= 15:
-        score += 18
-    else:
-        score += 8
+    return {
+        'field_id': field_id,
+        'settings': settings,
+        'state': state,
+        'features': np.array([observation[:5] for observation in observations], dtype=float),
+        'timestamps': [observation[5] for observation in observations]
+    }
+
+def extract_region_inputs(data):
+    """Extract region settings and the valid fields of a region request, keeping per-field errors"""
+    cell_size, crop_type = REGION_SCHEMA.validate(data)
+    percentiles = parse_percentiles(data.get('percentiles'))
+    cell_weather = parse_cell_weather(data.get('cells'))
+    include_fields = data.get('includeFields', False)
+    if not isinstance(include_fields, bool):
+        raise ValidationError([{'field': 'includeFields', 'message': 'must be true or false'}])
+    fields = data.get('fields')
+    if not isinstance(fields, list) or not fields:
+        raise ValidationError([{'field': 'fields', 'message': 'must be a non-empty list of JSON objects'}])
+    if len(fields) > MAX_REGION_FIELDS:
+        raise ValidationError([{'field': 'fields', 'message': f'must hold at most {MAX_REGION_FIELDS} fields'}])
     
-    # pH contribution (0-20 points)
-    if 6.0 <= ph <= 7.0:
-        score += 20
-    elif 5.5 <= ph <= 7.5:
-        score += 15
-    else:
-        score += 5
+    region = {
+        'cell_size': cell_size, 'percentiles': percentiles, 'include_fields': include_fields, 'grid': {},
+        'indices': [], 'ids': [], 'cells': [], 'soil_features': [], 'weather': [], 'crop_types': [], 'errors': []
+    }
+    for index, item in enumerate(fields):
+        try:
+            latitude, longitude, cell, soil_features, weather, field_crop_type = REGION_FIELD_SCHEMA.validate(item)
+            if cell is None:
+                if latitude is None or longitude is None:
+                    raise ValidationError([{'field': 'latitude', 'message': 'latitude and longitude are required without cell'}])
+                cell, row, column = grid_cell(latitude, longitude, cell_size)
+                region['grid'][cell] = (row, column)
+        except ValidationError as e:
+            region['errors'].append({'index': index, 'error': str(e), 'details': e.errors})
+            continue
+        
+        # Weather values missing on the field come from its cell, then from the defaults
+        if None in weather:
+            shared = cell_weather.get(cell, REGION_WEATHER_DEFAULTS)
+            weather = [shared[position] if value is None else value for position, value in enumerate(weather)]
+        region['indices'].append(index)
+        region['ids'].append(item.get('id'))
+        region['cells'].append(cell)
+        region['soil_features'].append(soil_features)
+        region['weather'].append(weather)
+        region['crop_types'].append(field_crop_type or crop_type)
+    
+    return region
+
+def parse_history_time(value, name):
+    """Parse an ISO 8601 time or Unix seconds from a query parameter"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValidationError([{'field': name, 'message': 'must be an ISO 8601 time or Unix seconds'}])
+
+def parse_history_query(args):
+    """Validate /history query parameters"""
+    errors = []
+    endpoint = args.get('endpoint')
+    if endpoint not in HEADLINES:
+        errors.append({'field': 'endpoint', 'message': f"must be one of {', '.join(HEADLINES)}"})
+    
+    limit = args.get('limit', '100')
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        errors.append({'field': 'limit', 'message': f'must be an integer between 1 and {MAX_PAGE_SIZE}'})
+    
+    bucket = args.get('bucket')
+    if bucket is not None:
+        bucket = HISTORY_BUCKETS.get(bucket, bucket)
+        if not str(bucket).isdigit() or int(bucket) < 1:
+            errors.append({'field': 'bucket', 'message': f"must be {', '.join(HISTORY_BUCKETS)} or a number of seconds"})
+    
+    cursor = args.get('cursor')
+    if cursor is not None:
+        try:
+            created, row_id = cursor.split(':')
+            cursor = (float(created), int(row_id))
+        except ValueError:
+            errors.append({'field': 'cursor', 'message': 'must be the nextCursor of a previous page'})
+    
+    times = {}
+    for name in ('start', 'end'):
+        try:
+            times[name] = parse_history_time(args[name], name) if args.get(name) else None
+        except ValidationError as e:
+            errors += e.errors
+    if errors:
+        raise ValidationError(errors)
     
-    # Temperature and humidity contribution (0-25 points)
-    if 20 <= temperature <= 30 and 40 <= humidity <= 70:
-        score += 25
-    elif 15 <= temperature <= 35 and 30 <= humidity <= 80:
-        score += 18
+    return {
+        'endpoint': endpoint,
+        'field_id': args.get('fieldId'),
+        'crop_type': args.get('cropType'),
+        'start': times['start'],
+        'end': times['end'],
+        'limit': int(limit),
+        'bucket': int(bucket) if bucket is not None else None,
+        'cursor': cursor
+    }
+
+def score_soil_health(features):
+    """Score a soil feature matrix, returning scores, confidences and whether the model produced them"""
+    if get_serving_model('soil_model') is not None:
+        try:
+            # Use the actual model for prediction
+            outputs = soil_batcher.predict(features, timeout=remaining_deadline())
+            model_predictions.labels('soil_model', 'model').inc(len(features))
+            
+            # Convert prediction to soil health score (0-100)
+            return np.clip(outputs[:, 0] * 100, 0, 100), outputs[:, 1] * 100, True
+        except InferenceQueueFull:
+            raise
+        except DeadlineExceeded as e:
+            logger.warning(f"{str(e)}, using fallback")
+            model_deadline_misses.labels('soil_model').inc()
+            mark_degraded('soil_model')
+            confidence = 85.0
+        except Exception as e:
+            logger.warning(f"Model prediction failed, using fallback: {str(e)}")
+            model_errors.labels('soil_model').inc()
+            mark_degraded('soil_model')
+            confidence = 85.0
     else:
-        score += 10
-    
-    return min(score, 100)
-
-def calculate_weather_factor(temperature, humidity, rainfall):
-    """Calculate weather impact factor on crop yield"""
-    factor = 1.0
-    
-    # Temperature factor
-    if 20 <= temperature <= 30:
-        factor *= 1.1
-    elif temperature < 15 or temperature > 35:
-        factor *= 0.8
-    
-    # Humidity factor
-    if 50 <= humidity <= 70:
-        factor *= 1.05
-    elif humidity < 30 or humidity > 85:
-        factor *= 0.9
-    
-    # Rainfall factor
-    if 50 <= rainfall <= 150:
-        factor *= 1.1
-    elif rainfall > 200:
-        factor *= 0.85
-    
-    return max(0.6, min(1.4, factor))
-
-def calculate_pest_risk_fallback(temperature, humidity, rainfall, crop_type):
-    """Fallback calculation for pest risk"""
-    risk_score = 0
-    
-    # High temperature and humidity increase pest risk
-    if temperature > 30 and humidity > 70:
-        risk_score += 40
-    elif temperature > 25 and humidity > 60:
-        risk_score += 25
+        # Fallback calculation when model is not available
+        confidence = 80.0
+    
+    model_predictions.labels('soil_model', 'fallback').inc(len(features))
+    scores = calculate_soil_health_fallback_batch(
+        features[:, 0], features[:, 1], features[:, 3], features[:, 5], features[:, 6]
+    )
+    return scores, np.full(len(features), confidence), False
+
+def score_pest_risk(features, crop_types):
+    """Score a pest feature matrix, returning pest risk scores and confidences"""
+    if get_serving_model('pest_model') is not None:
+        try:
+            # Use the actual neural network model
+            predictions = pest_batcher.predict(features, timeout=remaining_deadline())
+            model_predictions.labels('pest_model', 'model').inc(len(features))
+            return np.clip(predictions * 100, 0, 100), np.full(len(features), 85.0)
+        except InferenceQueueFull:
+            raise
+        except DeadlineExceeded as e:
+            logger.warning(f"{str(e)}, using fallback")
+            model_deadline_misses.labels('pest_model').inc()
+            mark_degraded('pest_model')
+            confidence = 80.0
+        except Exception as e:
+            logger.warning(f"Pest model prediction failed, using fallback: {str(e)}")
+            model_errors.labels('pest_model').inc()
+            mark_degraded('pest_model')
+            confidence = 80.0
     else:
-        risk_score += 10
+        confidence = 75.0
     
-    # Rainfall factor
-    if rainfall > 100:
-        risk_score += 30
-    elif rainfall > 50:
-        risk_score += 20
+    model_predictions.labels('pest_model', 'fallback').inc(len(features))
+    scores = calculate_pest_risk_fallback_batch(features[:, 0], features[:, 1], features[:, 2], crop_types)
+    return scores, np.full(len(features), confidence)
+
+def score_rainfall(features):
+    """Score a rainfall feature matrix, returning probabilities and confidences"""
+    if get_serving_model('rainfall_model') is not None:
+        try:
+            # Use the actual model
+            predictions = rainfall_batcher.predict(features, timeout=remaining_deadline())
+            model_predictions.labels('rainfall_model', 'model').inc(len(features))
+            return np.clip(predictions * 100, 0, 90), np.full(len(features), 85.0)
+        except InferenceQueueFull:
+            raise
+        except DeadlineExceeded as e:
+            logger.warning(f"{str(e)}, using fallback")
+            model_deadline_misses.labels('rainfall_model').inc()
+            mark_degraded('rainfall_model')
+            confidence = 80.0
+        except Exception as e:
+            logger.warning(f"Rainfall model prediction failed, using fallback: {str(e)}")
+            model_errors.labels('rainfall_model').inc()
+            mark_degraded('rainfall_model')
+            confidence = 80.0
     else:
-        risk_score += 5
-    
-    # Crop-specific factors
-    crop_risk_factors = {
-        'wheat': 15,
-        'rice': 25,
-        'corn': 20,
-        'cotton': 30,
-        'soybean': 18
+        confidence = 75.0
+    
+    model_predictions.labels('rainfall_model', 'fallback').inc(len(features))
+    probabilities = calculate_rainfall_probability_fallback_batch(features[:, 0], features[:, 1], features[:, 2])
+    return probabilities, np.full(len(features), confidence)
+
+# Prediction stages shared by every endpoint; each runs at most once per chunk
+@field_pipeline.stage('soil_features', ['inputs'], timing='features')
+def soil_features_stage(inputs):
+    return np.array([field_inputs['soil_features'] for field_inputs in inputs], dtype=float)
+
+@field_pipeline.stage('weather', ['inputs'], timing='features')
+def weather_stage(inputs):
+    return np.array([
+        [field_inputs['temperature'], field_inputs['humidity'], field_inputs['rainfall']]
+        for field_inputs in inputs
+    ], dtype=float)
+
+@field_pipeline.stage('crop_types', ['inputs'], timing='features')
+def crop_types_stage(inputs):
+    return [field_inputs['crop_type'] for field_inputs in inputs]
+
+@field_pipeline.stage('rainfall_features', ['inputs'], timing='features')
+def rainfall_features_stage(inputs):
+    return np.array([field_inputs['rainfall_features'] for field_inputs in inputs], dtype=float)
+
+@field_pipeline.stage('soil_scores', ['soil_features'], timing='inference')
+def soil_scores_stage(soil_features):
+    return score_soil_health(soil_features)
+
+@field_pipeline.stage('weather_factors', ['weather'], timing='inference')
+def weather_factors_stage(weather):
+    return calculate_weather_factor_batch(weather[:, 0], weather[:, 1], weather[:, 2])
+
+@field_pipeline.stage('pest_scores', ['weather', 'crop_types'], timing='inference')
+def pest_scores_stage(weather, crop_types):
+    return score_pest_risk(weather, crop_types)
+
+@field_pipeline.stage('rainfall_scores', ['rainfall_features'], timing='inference')
+def rainfall_scores_stage(rainfall_features):
+    return score_rainfall(rainfall_features)
+
+@field_pipeline.stage('soil_health', ['soil_features', 'soil_scores'], timing='recommendations')
+def soil_health_stage(soil_features, soil_scores):
+    scores, confidences, _ = soil_scores
+    classifications = SOIL_CLASSIFICATION_TABLE.score(scores)
+    recommendations = SOIL_RECOMMENDATIONS_TABLE.score(soil_features[:, 0], soil_features[:, 1], soil_features[:, 3], scores)
+    return [
+        build_soil_health_result(*row)
+        for row in zip(scores.tolist(), confidences.tolist(), classifications, recommendations)
+    ]
+
+@field_pipeline.stage('crop_yield_scores', ['inputs', 'soil_scores', 'weather_factors'], timing='recommendations')
+def crop_yield_scores_stage(inputs, soil_scores, weather_factors):
+    scores, soil_confidences, used_model = soil_scores
+    # Rule-based soil health scores keep the fixed yield confidence
+    if not used_model:
+        soil_confidences = np.full(len(inputs), 85.0)
+    
+    # Calculate base yield for crop type, soil factor and final yield
+    base_yields = np.array([
+        BASE_YIELDS.get(field_inputs['crop_type'].lower(), DEFAULT_BASE_YIELD) for field_inputs in inputs
+    ])
+    soil_factors = 0.6 + (scores / 100) * 0.8
+    predicted_yields = base_yields * soil_factors * weather_factors
+    
+    confidences = np.minimum(
+        80 + (soil_confidences - 80) * 0.3 + np.select([weather_factors > 0.9, weather_factors > 0.7], [10, 5], 0), 95
+    )
+    temperatures = np.array([field_inputs['temperature'] for field_inputs in inputs], dtype=float)
+    return predicted_yields, confidences, scores, temperatures
+
+@field_pipeline.stage('crop_yield', ['inputs', 'crop_yield_scores', 'weather_factors'], timing='recommendations')
+def crop_yield_stage(inputs, crop_yield_scores, weather_factors):
+    predicted_yields, confidences, scores, temperatures = crop_yield_scores
+    ratings = SOIL_CLASSIFICATION_TABLE.score(scores)
+    recommendations = YIELD_RECOMMENDATIONS_TABLE.score(predicted_yields, scores, temperatures)
+    return [
+        build_crop_yield_result(*row)
+        for row in zip(
+            inputs, predicted_yields.tolist(), confidences.tolist(), scores.tolist(), weather_factors.tolist(),
+            ratings, recommendations
+        )
+    ]
+
+@field_pipeline.stage('pest_risk', ['crop_types', 'pest_scores'], timing='recommendations')
+def pest_risk_stage(crop_types, pest_scores):
+    scores, confidences = pest_scores
+    risk_levels = PEST_RISK_LEVEL_TABLE.score(scores)
+    preventive_measures = PREVENTIVE_MEASURES_TABLE.score(scores)
+    return [
+        build_pest_risk_result(*row)
+        for row in zip(crop_types, scores.tolist(), confidences.tolist(), risk_levels, preventive_measures)
+    ]
+
+@field_pipeline.stage('rainfall', ['rainfall_features', 'rainfall_scores'], timing='recommendations')
+def rainfall_stage(rainfall_features, rainfall_scores):
+    probabilities, confidences = rainfall_scores
+    amounts = expected_rainfall_amount_batch(probabilities, seeded_uniform_batch(rainfall_features))
+    return [
+        build_rainfall_result(*row)
+        for row in zip(probabilities.tolist(), confidences.tolist(), amounts.tolist())
+    ]
+
+# Columnar forms of the result stages above, holding the same values as NumPy arrays and dictionary codes
+@field_pipeline.stage('soil_health_columns', ['soil_features', 'soil_scores'], timing='recommendations')
+def soil_health_columns_stage(soil_features, soil_scores):
+    scores, confidences, _ = soil_scores
+    return (
+        ResultColumns(len(scores))
+        .add('soilHealthScore', scores, np.float32, decimals=1)
+        .add('classification', SOIL_CLASSIFICATION_TABLE.codes(scores), dictionary=SOIL_CLASSIFICATION_TABLE.dictionary)
+        .add('confidence', confidences, np.float32, decimals=1)
+        .add(
+            'recommendations',
+            SOIL_RECOMMENDATIONS_TABLE.codes(soil_features[:, 0], soil_features[:, 1], soil_features[:, 3], scores),
+            dictionary=SOIL_RECOMMENDATIONS_TABLE.dictionary
+        )
+    )
+
+@field_pipeline.stage('crop_yield_columns', ['inputs', 'crop_yield_scores', 'weather_factors'], timing='recommendations')
+def crop_yield_columns_stage(inputs, crop_yield_scores, weather_factors):
+    predicted_yields, confidences, scores, temperatures = crop_yield_scores
+    field_areas = np.array([field_inputs['field_area'] for field_inputs in inputs], dtype=float)
+    crop_codes, crop_types = intern_codes([field_inputs['crop_type'] for field_inputs in inputs])
+    return (
+        ResultColumns(len(inputs))
+        .constant('unit', 'tons/hectare')
+        .add('predictedYield', predicted_yields, np.float32, decimals=2)
+        .add('totalProduction', predicted_yields * field_areas, decimals=2)
+        .add('confidence', np.round(confidences), np.int16)
+        .add('cropType', crop_codes, dictionary=crop_types)
+        .add('fieldArea', field_areas)
+        .add('factors.soilHealth', scores, np.float32, decimals=1)
+        .add('factors.weatherConditions', np.round(weather_factors * 100), np.int16)
+        .add('factors.overallRating', SOIL_CLASSIFICATION_TABLE.codes(scores), dictionary=SOIL_CLASSIFICATION_TABLE.dictionary)
+        .add(
+            'recommendations', YIELD_RECOMMENDATIONS_TABLE.codes(predicted_yields, scores, temperatures),
+            dictionary=YIELD_RECOMMENDATIONS_TABLE.dictionary
+        )
+    )
+
+@field_pipeline.stage('pest_risk_columns', ['crop_types', 'pest_scores'], timing='recommendations')
+def pest_risk_columns_stage(crop_types, pest_scores):
+    scores, confidences = pest_scores
+    common_pests, pest_lists = common_pests_codes(crop_types, scores)
+    return (
+        ResultColumns(len(scores))
+        .add('riskLevel', PEST_RISK_LEVEL_TABLE.codes(scores), dictionary=PEST_RISK_LEVEL_TABLE.dictionary)
+        .add('riskScore', scores, np.float32, decimals=1)
+        .add('confidence', confidences, np.float32, decimals=1)
+        .add('commonPests', common_pests, dictionary=pest_lists)
+        .add('preventiveMeasures', PREVENTIVE_MEASURES_TABLE.codes(scores), dictionary=PREVENTIVE_MEASURES_TABLE.dictionary)
+    )
+
+@field_pipeline.stage('rainfall_columns', ['rainfall_features', 'rainfall_scores'], timing='recommendations')
+def rainfall_columns_stage(rainfall_features, rainfall_scores):
+    probabilities, confidences = rainfall_scores
+    amounts = expected_rainfall_amount_batch(probabilities, seeded_uniform_batch(rainfall_features))
+    return (
+        ResultColumns(len(probabilities))
+        .constant('timeframe', '24 hours')
+        .add('probability', probabilities, np.float32, decimals=1)
+        .add('expectedAmount', amounts, np.int32)
+        .add('confidence', confidences, np.float32, decimals=1)
+        .add('recommendation', rainfall_recommendation_codes(probabilities), dictionary=RAINFALL_RECOMMENDATIONS)
+    )
+
+def score_images(files):
+    """Decode photos in the thread pool and classify them together through the image micro-batcher"""
+    image_model = get_image_model()
+    if image_model is None:
+        raise RuntimeError('Pest image model is not loaded')
+    height, width = image_model.input_shape[1:3]
+    
+    with record_stage('features'):
+        images = image_decoder.decode_many(files, (width, height))
+        decoded = [image for image in images if not isinstance(image, ValueError)]
+    if decoded:
+        probabilities = image_batcher.predict(np.stack(decoded))
+        model_predictions.labels('pest_model', 'model').inc(len(decoded))
+    
+    with record_stage('recommendations'):
+        class_names = load_class_names(PEST_CLASSES_PATH, probabilities.shape[1]) if decoded else []
+        predictions = iter(top_predictions(probabilities, class_names) if decoded else [])
+        results = []
+        for image in images:
+            if isinstance(image, ValueError):
+                results.append({'error': str(image)})
+                continue
+            top = next(predictions)
+            results.append({'label': top[0]['label'], 'confidence': top[0]['confidence'], 'predictions': top})
+    return results
+
+def score_forecast(forecast):
+    """Score every new forecast observation in one pass and continue the trailing windows"""
+    settings = forecast['settings']
+    state = forecast['state']
+    count = state['count'] if state is not None else 0
+    history = state['history'] if state is not None else {}
+    features = forecast['features']
+    
+    with record_stage('features'):
+        # Observation columns: temperature, humidity, rainfall, pressure, wind speed
+        weather = features[:, :3]
+        rainfall_features = features[:, [0, 1, 3, 4]]
+        crop_types = [settings['cropType']] * len(features)
+    outputs, degraded = run_scorer(
+        field_pipeline.run,
+        {'weather': weather, 'crop_types': crop_types, 'rainfall_features': rainfall_features},
+        ['pest_scores', 'rainfall_scores']
+    )
+    
+    with record_stage('recommendations'):
+        probabilities, _ = outputs['rainfall_scores']
+        pest_scores, _ = outputs['pest_scores']
+        draws = seeded_uniform_batch(rainfall_features, settings['seed'])
+        amounts = expected_rainfall_amount_batch(probabilities, draws).astype(float)
+        series = {'rainfallProbability': probabilities, 'expectedAmount': amounts, 'pestRiskScore': pest_scores}
+        
+        window = settings['window']
+        _, probability_means, _ = rolling_aggregates(history.get('rainfallProbability', ()), probabilities, window, count)
+        amount_sums, _, _ = rolling_aggregates(history.get('expectedAmount', ()), amounts, window, count)
+        _, pest_means, pest_peaks = rolling_aggregates(history.get('pestRiskScore', ()), pest_scores, window, count)
+        points = [
+            build_forecast_point(*row)
+            for row in zip(
+                range(count, count + len(features)), forecast['timestamps'], probabilities.tolist(), amounts.tolist(),
+                pest_scores.tolist(), PEST_RISK_LEVEL_TABLE.score(pest_scores), probability_means.tolist(),
+                amount_sums.tolist(), pest_means.tolist(), pest_peaks.tolist(), PEST_RISK_LEVEL_TABLE.score(pest_means)
+            )
+        ]
+        peak = int(np.argmax(pest_scores))
+    
+    return {
+        'fieldId': forecast['field_id'],
+        'cropType': settings['cropType'],
+        'interval': settings['interval'],
+        'window': window,
+        'forecast': points,
+        'summary': {
+            'observations': len(features),
+            'totalObservations': count + len(features),
+            'maxRainfallProbability': round(float(probabilities.max()), 1),
+            'totalExpectedAmount': int(amounts.sum()),
+            'peakPestRiskScore': round(float(pest_scores[peak]), 1),
+            'peakIndex': count + peak,
+            'peakRiskLevel': points[peak]['riskLevel']
+        },
+        'state': build_state(settings, count + len(features), history, series),
+        'modelVersion': endpoint_model_version('forecast', degraded)
     }
-    risk_score += crop_risk_factors.get(crop_type.lower(), 20)
+
+def score_region(region):
+    """Score every valid field of a region in one pass and summarize the scores per cell"""
+    result = {
+        'cellSize': region['cell_size'],
+        'count': len(region['indices']),
+        'failed': len(region['errors']),
+        'errors': region['errors'][:MAX_REPORTED_ERRORS],
+        'modelVersion': endpoint_model_version('region')
+    }
+    if not region['indices']:
+        return {**result, 'uniqueWeatherInputs': 0, 'cells': []}
+    
+    with record_stage('features'):
+        soil_features = np.array(region['soil_features'], dtype=float)
+        # Fields in one cell usually share weather, so each distinct weather and crop pair is scored once
+        crop_codes = {}
+        codes = [crop_codes.setdefault(crop_type.lower(), len(crop_codes)) for crop_type in region['crop_types']]
+        weather_keys, weather_index = np.unique(
+            np.column_stack([np.array(region['weather'], dtype=float), codes]), axis=0, return_inverse=True
+        )
+        crop_names = list(crop_codes)
+        cell_names, groups = np.unique(np.array(region['cells']), return_inverse=True)
+    outputs, degraded = run_scorer(
+        field_pipeline.run,
+        {
+            'soil_features': soil_features,
+            'weather': weather_keys[:, :3],
+            'crop_types': [crop_names[int(code)] for code in weather_keys[:, 3]]
+        },
+        ['soil_scores', 'pest_scores']
+    )
+    result['modelVersion'] = endpoint_model_version('region', degraded)
     
-    return min(risk_score, 100)
+    with record_stage('recommendations'):
+        soil_scores, _, _ = outputs['soil_scores']
+        pest_scores = outputs['pest_scores'][0][weather_index.reshape(-1)]
+        classifications = SOIL_CLASSIFICATION_TABLE.score(soil_scores)
+        risk_levels = PEST_RISK_LEVEL_TABLE.score(pest_scores)
+        groups = groups.reshape(-1)
+        percentiles = region['percentiles']
+        soil_summaries = summarize_groups(
+            groups, len(cell_names), soil_scores, classifications, 'classification', percentiles
+        )
+        pest_summaries = summarize_groups(groups, len(cell_names), pest_scores, risk_levels, 'riskLevel', percentiles)
+        
+        grid = region['grid']
+        result['uniqueWeatherInputs'] = len(weather_keys)
+        result['cells'] = [
+            {
+                'cell': cell,
+                'bounds': cell_bounds(*grid[cell], region['cell_size']) if cell in grid else None,
+                'fields': field_count,
+                'soilHealth': soil_summary,
+                'pestRisk': pest_summary
+            }
+            for cell, field_count, soil_summary, pest_summary in zip(
+                cell_names.tolist(), np.bincount(groups).tolist(), soil_summaries, pest_summaries
+            )
+        ]
+        if region['include_fields']:
+            result['fields'] = [
+                {
+                    'index': index,
+                    'id': field_id,
+                    'cell': cell,
+                    'soilHealthScore': round(soil_score, 1),
+                    'classification': classification,
+                    'pestRiskScore': round(pest_score, 1),
+                    'riskLevel': risk_level
+                }
+                for index, field_id, cell, soil_score, classification, pest_score, risk_level in zip(
+                    region['indices'], region['ids'], region['cells'], soil_scores.tolist(), classifications,
+                    pest_scores.tolist(), risk_levels
+                )
+            ]
+    
+    return result
+
+# Chunk scorers return a list of result dicts, or one ResultColumns with columns=True
+def score_soil_health_chunk(inputs, columns=False):
+    """Score a chunk of extracted soil features with one model call"""
+    with record_stage('features'):
+        features = np.array(inputs, dtype=float)
+    output = 'soil_health_columns' if columns else 'soil_health'
+    return field_pipeline.run({'soil_features': features}, [output])[output]
+
+def score_pest_risk_chunk(inputs, columns=False):
+    """Score a chunk of extracted pest inputs with one model call"""
+    with record_stage('features'):
+        crop_types = [crop_type for _, crop_type in inputs]
+        features = np.array([features for features, _ in inputs], dtype=float)
+    output = 'pest_risk_columns' if columns else 'pest_risk'
+    return field_pipeline.run({'weather': features, 'crop_types': crop_types}, [output])[output]
 
-def calculate_rainfall_probability_fallback(temperature, humidity, pressure):
-    """Fallback calculation for rainfall probability"""
-    probability = 0
+def score_rainfall_chunk(inputs, columns=False):
+    """Score a chunk of extracted rainfall features with one model call"""
+    with record_stage('features'):
+        features = np.array(inputs, dtype=float)
+    output = 'rainfall_columns' if columns else 'rainfall'
+    return field_pipeline.run({'rainfall_features': features}, [output])[output]
+
+def score_crop_yield_chunk(inputs, columns=False):
+    """Score a chunk of extracted crop yield inputs, reusing the soil model scores"""
+    output = 'crop_yield_columns' if columns else 'crop_yield'
+    return field_pipeline.run({'inputs': inputs}, [output])[output]
+
+def score_field_report_chunk(inputs, columns=False):
+    """Score soil health, crop yield, pest risk and rainfall for a chunk in one pass"""
+    if columns:
+        outputs = field_pipeline.run(
+            {'inputs': inputs}, ['soil_health_columns', 'crop_yield_columns', 'pest_risk_columns', 'rainfall_columns']
+        )
+        return ResultColumns.merge([
+            ('soilHealth', outputs['soil_health_columns']),
+            ('cropYield', outputs['crop_yield_columns']),
+            ('pestRisk', outputs['pest_risk_columns']),
+            ('rainfall', outputs['rainfall_columns'])
+        ])
+    outputs = field_pipeline.run({'inputs': inputs}, ['soil_health', 'crop_yield', 'pest_risk', 'rainfall'])
+    return [
+        {'soilHealth': soil_health, 'cropYield': crop_yield, 'pestRisk': pest_risk, 'rainfall': rainfall}
+        for soil_health, crop_yield, pest_risk, rainfall
+        in zip(outputs['soil_health'], outputs['crop_yield'], outputs['pest_risk'], outputs['rainfall'])
+    ]
+
+def render_runtime_metrics():
+    """Render model, micro-batching and cache state in the Prometheus text format"""
+    lines = [
+        '# HELP agrismart_model_loaded Whether each model is loaded (1) or served by fallbacks (0)',
+        '# TYPE agrismart_model_loaded gauge'
+    ]
+    models = model_registry.status()
+    for name, model in models.items():
+        lines.append(format_sample('agrismart_model_loaded', {'model': name}, model['state'] == 'loaded'))
+    lines += [
+        '# HELP agrismart_model_load_seconds Time taken to load each model',
+        '# TYPE agrismart_model_load_seconds gauge'
+    ]
+    for name, model in models.items():
+        if model['load_seconds'] is not None:
+            lines.append(format_sample('agrismart_model_load_seconds', {'model': name}, model['load_seconds']))
+    lines += [
+        '# HELP agrismart_model_info Version of each loaded model, and of its shadow version if one is held',
+        '# TYPE agrismart_model_info gauge'
+    ]
+    for name, model in models.items():
+        if model['version'] is not None:
+            lines.append(format_sample('agrismart_model_info', {'model': name, 'version': model['version'], 'role': 'current'}, 1))
+        if model['shadow'] is not None:
+            lines.append(format_sample('agrismart_model_info', {'model': name, 'version': model['shadow']['version'], 'role': 'shadow'}, 1))
+    lines += [
+        '# HELP agrismart_model_reloads_total Model versions swapped in without a restart',
+        '# TYPE agrismart_model_reloads_total counter'
+    ]
+    for name, model in models.items():
+        lines.append(format_sample('agrismart_model_reloads_total', {'model': name}, model['reloads']))
+    
+    batchers = {
+        'soil_model': soil_batcher, 'pest_model': pest_batcher, 'rainfall_model': rainfall_batcher,
+        'pest_image_model': image_batcher
+    }
+    lines += [
+        '# HELP agrismart_batch_size Rows per model call made by the micro-batchers',
+        '# TYPE agrismart_batch_size histogram'
+    ]
+    for name, batcher in batchers.items():
+        lines += format_histogram('agrismart_batch_size', {'model': name}, batcher.batch_sizes.snapshot())
+    lines += [
+        '# HELP agrismart_batch_queue_wait_milliseconds Time requests wait in the micro-batching queue',
+        '# TYPE agrismart_batch_queue_wait_milliseconds histogram'
+    ]
+    for name, batcher in batchers.items():
+        lines += format_histogram('agrismart_batch_queue_wait_milliseconds', {'model': name}, batcher.queue_waits.snapshot())
+    for metric, kind, documentation, attribute in [
+        ('agrismart_batch_queue_depth', 'gauge', 'Requests waiting in each inference queue', 'queued'),
+        ('agrismart_batch_rejected_total', 'counter', 'Requests rejected with 429 because the queue was full', 'rejected')
+    ]:
+        lines += [f'# HELP {metric} {documentation}', f'# TYPE {metric} {kind}']
+        for name, batcher in batchers.items():
+            lines.append(format_sample(metric, {'model': name}, getattr(batcher, attribute)))
     
-    if humidity > 80:
-        probability += 40
-    elif humidity > 60:
-        probability += 20
+    history_stats = prediction_history.stats()
+    if history_stats['enabled']:
+        for key, name, kind in [
+            ('written', 'agrismart_history_written_total', 'counter'),
+            ('dropped', 'agrismart_history_dropped_total', 'counter'),
+            ('write_errors', 'agrismart_history_write_errors_total', 'counter'),
+            ('pruned', 'agrismart_history_pruned_total', 'counter'),
+            ('queued', 'agrismart_history_queue_depth', 'gauge')
+        ]:
+            lines += [f'# TYPE {name} {kind}', format_sample(name, {}, history_stats[key])]
     
-    if pressure < 1000:
-        probability += 30
-    elif pressure < 1010:
-        probability += 15
+    cache_stats = prediction_cache.stats()
+    if cache_stats['enabled']:
+        for key, name, kind in [
+            ('hits', 'agrismart_prediction_cache_hits_total', 'counter'),
+            ('misses', 'agrismart_prediction_cache_misses_total', 'counter'),
+            ('evictions', 'agrismart_prediction_cache_evictions_total', 'counter'),
+            ('entries', 'agrismart_prediction_cache_entries', 'gauge'),
+            ('bytes', 'agrismart_prediction_cache_bytes', 'gauge')
+        ]:
+            lines += [f'# TYPE {name} {kind}', format_sample(name, {}, cache_stats[key])]
     
-    if temperature < 25:
-        probability += 10
+    return lines
+
+def endpoint_model_version(endpoint, degraded=()):
+    """Return the versions of the models serving an endpoint, or 'rules' for fallbacks and degraded models"""
+    if endpoint == 'pest-image':
+        # Photos have no rule-based fallback; the route refuses them while the model is unavailable
+        return model_registry.version('pest_model') if get_image_model() is not None else 'unavailable'
+    
+    model_names = {
+        'soil-health': ['soil_model'],
+        'crop-yield': ['soil_model'],
+        'pest-risk': ['pest_model'],
+        'rainfall': ['rainfall_model'],
+        'field-report': ['soil_model', 'pest_model', 'rainfall_model'],
+        'forecast': ['pest_model', 'rainfall_model'],
+        'region': ['soil_model', 'pest_model']
+    }.get(endpoint, [])
+    
+    return '+'.join(
+        'rules' if model_name in degraded or get_serving_model(model_name) is None
+        else model_registry.version(model_name)
+        for model_name in model_names
+    ) or 'rules'
+
+def input_crop_type(inputs):
+    """Return the crop type a chunk scorer used for one extracted input, or None when it uses none"""
+    if isinstance(inputs, dict):
+        return inputs.get('crop_type')
+    # Pest inputs are (features, crop type) pairs; the other feature inputs are plain lists
+    if isinstance(inputs, tuple) and len(inputs) == 2 and isinstance(inputs[1], str):
+        return inputs[1]
+    return None
+
+def record_history(endpoint, records, results, inputs=None):
+    """Queue scored request records for the prediction history without blocking, with their extracted inputs"""
+    if prediction_history.enabled:
+        crop_types = [input_crop_type(item) for item in inputs] if inputs is not None else None
+        # Each result carries the version that scored it, which is 'rules' where a model fell back
+        model_versions = [result.get('modelVersion') for result in results]
+        prediction_history.record_many(endpoint, model_versions, records, results, crop_types)
+
+def score_cached(endpoint, score_chunk, inputs):
+    """Score a chunk of extracted inputs, serving repeated inputs from the prediction cache"""
+    version = endpoint_model_version(endpoint)
+    if not prediction_cache.enabled:
+        scored, degraded = run_scorer(score_chunk, inputs)
+        version = endpoint_model_version(endpoint, degraded) if degraded else version
+        return [{**result, 'modelVersion': version} for result in scored]
+    
+    keys = [prediction_cache.make_key(endpoint, version, item) for item in inputs]
+    results = prediction_cache.get_many(keys)
+    
+    # Score each distinct missing input once, even when it repeats within the chunk
+    missing = {}
+    for index, result in enumerate(results):
+        if result is None:
+            missing.setdefault(keys[index], []).append(index)
+    versions = [version] * len(results)
+    if missing:
+        scored, degraded = run_scorer(score_chunk, [inputs[indices[0]] for indices in missing.values()])
+        # Rows a model fell back on were scored by the rules, and are labelled and left uncached as such
+        scored_version = endpoint_model_version(endpoint, degraded) if degraded else version
+        for indices, result in zip(missing.values(), scored):
+            for index in indices:
+                results[index] = result
+                versions[index] = scored_version
+        # A model swapped in mid-chunk may have scored part of it; do not cache under the old version
+        if not degraded and endpoint_model_version(endpoint) == version:
+            prediction_cache.set_many(list(zip(missing.keys(), scored)))
+    
+    return [{**result, 'modelVersion': row_version} for result, row_version in zip(results, versions)]
+
+def build_soil_health_result(soil_health_score, confidence, classification, recommendations):
+    """Build the soil health response for one record"""
+    return {
+        'soilHealthScore': round(soil_health_score, 1),
+        'classification': classification,
+        'confidence': round(confidence, 1),
+        'recommendations': list(recommendations)
+    }
+
+def build_pest_risk_result(crop_type, pest_risk_score, confidence, risk_level, preventive_measures):
+    """Build the pest risk response for one record"""
+    return {
+        'riskLevel': risk_level,
+        'riskScore': round(pest_risk_score, 1),
+        'confidence': round(confidence, 1),
+        'commonPests': get_common_pests(crop_type, pest_risk_score),
+        'preventiveMeasures': list(preventive_measures)
+    }
+
+def build_rainfall_result(probability, confidence, expected_amount):
+    """Build the rainfall response for one record"""
+    return {
+        'probability': round(probability, 1),
+        'expectedAmount': expected_amount,
+        'timeframe': '24 hours',
+        'confidence': round(confidence, 1),
+        'recommendation': RAINFALL_RECOMMENDATIONS[0 if probability > 70 else 1 if probability > 40 else 2]
+    }
+
+def rainfall_recommendation_codes(probabilities):
+    """Return indices into RAINFALL_RECOMMENDATIONS for rainfall probabilities"""
+    return np.select([np.greater(probabilities, 70), np.greater(probabilities, 40)], [0, 1], 2).astype(np.uint8)
+
+def build_forecast_point(index, timestamp, probability, expected_amount, pest_risk_score, risk_level,
+                         window_probability, window_amount, window_pest_risk_score, window_peak_pest_risk_score,
+                         window_risk_level):
+    """Build the forecast entry for one observation and its trailing window"""
+    return {
+        'index': index,
+        'timestamp': timestamp,
+        'rainfallProbability': round(probability, 1),
+        'expectedAmount': int(expected_amount),
+        'pestRiskScore': round(pest_risk_score, 1),
+        'riskLevel': risk_level,
+        'rolling': {
+            'rainfallProbability': round(window_probability, 1),
+            'expectedAmount': int(window_amount),
+            'pestRiskScore': round(window_pest_risk_score, 1),
+            'peakPestRiskScore': round(window_peak_pest_risk_score, 1),
+            'riskLevel': window_risk_level
+        }
+    }
+
+def build_crop_yield_result(inputs, predicted_yield, confidence, soil_health_score, weather_factor,
+                            rating, recommendations):
+    """Build the crop yield response for one record"""
+    return {
+        'predictedYield': round(predicted_yield, 2),
+        'totalProduction': round(predicted_yield * inputs['field_area'], 2),
+        'unit': 'tons/hectare',
+        'confidence': round(confidence),
+        'cropType': inputs['crop_type'],
+        'fieldArea': inputs['field_area'],
+        'factors': {
+            'soilHealth': round(soil_health_score, 1),
+            'weatherConditions': round(weather_factor * 100),
+            'overallRating': rating
+        },
+        'recommendations': list(recommendations)
+    }
+
+def parse_batch_records():
+    """Parse batch records from a JSON array or NDJSON request body"""
+    if 'ndjson' in (request.mimetype or ''):
+        records = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(jsoncodec.loads(line))
+            except ValueError as e:
+                records.append(ValueError(f"Invalid JSON record: {str(e)}"))
+    else:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('records')
+        if not isinstance(payload, list):
+            raise ValueError('Batch payload must be a JSON array of records')
+        records = payload
     
-    return min(probability, 90)
+    if len(records) > MAX_BATCH_RECORDS:
+        raise ValueError(f"Batch exceeds the maximum of {MAX_BATCH_RECORDS} records")
+    return records
+
+def extract_chunk(records, start, extract):
+    """Extract the inputs of the chunk of records starting at start, returning indices, inputs and errors"""
+    indices = []
+    inputs = []
+    errors = []
+    for index in range(start, min(start + BATCH_CHUNK_SIZE, len(records))):
+        record = records[index]
+        try:
+            if isinstance(record, Exception):
+                raise record
+            inputs.append(extract(record))
+            indices.append(index)
+        except ValidationError as e:
+            errors.append({'index': index, 'error': str(e), 'details': e.errors})
+        except (TypeError, ValueError) as e:
+            errors.append({'index': index, 'error': str(e)})
+    return indices, inputs, errors
 
-def generate_soil_recommendations(nitrogen, phosphorus, ph, score):
-    """Generate soil improvement recommendations"""
-    recommendations = []
+def score_batch(endpoint, records, extract, score_chunk):
+    """Score records in fixed-size chunks, keeping per-record errors in order"""
+    results = [None] * len(records)
     
-    if nitrogen < 30:
-        recommendations.append('Apply nitrogen fertilizer (60-80 kg/ha)')
-    if phosphorus < 15:
-        recommendations.append('Add phosphorus supplement (40-50 kg/ha)')
-    if ph < 6.0:
-        recommendations.append('Apply lime to increase soil pH')
-    if score < 60:
-        recommendations.append('Consider soil testing for micronutrients')
+    for start in range(0, len(records), BATCH_CHUNK_SIZE):
+        if has_request_context():
+            # A whole chunk is a full model batch, so the default per-request budget does not fit it
+            start_deadline(time.perf_counter(), chunk=True)
+        with record_stage('parse'):
+            indices, inputs, errors = extract_chunk(records, start, extract)
+        for error in errors:
+            results[error['index']] = error
+        
+        if inputs:
+            chunk_results = score_cached(endpoint, score_chunk, inputs)
+            for index, result in zip(indices, chunk_results):
+                results[index] = result
+            record_history(endpoint, [records[index] for index in indices], chunk_results, inputs)
     
-    return recommendations
+    return results
 
-def generate_yield_recommendations(yield_val, soil_health, weather_data):
-    """Generate crop yield improvement recommendations"""
-    recommendations = []
+def score_batch_columns(endpoint, records, extract, score_chunk):
+    """Score records in fixed-size chunks into ResultColumns with an index column, plus per-record errors"""
+    parts = []
+    errors = []
     
-    if yield_val < 3.0:
-        recommendations.append('Consider crop rotation or variety change')
-    if soil_health < 60:
-        recommendations.append('Improve soil health with organic matter')
-    if weather_data.get('temperature', 25) > 30:
-        recommendations.append('Implement heat stress management')
+    for start in range(0, len(records), BATCH_CHUNK_SIZE):
+        if has_request_context():
+            # A whole chunk is a full model batch, so the default per-request budget does not fit it
+            start_deadline(time.perf_counter(), chunk=True)
+        with record_stage('parse'):
+            indices, inputs, chunk_errors = extract_chunk(records, start, extract)
+        errors += chunk_errors
+        
+        if inputs:
+            # Columnar results skip the per-record prediction cache; bulk jobs rarely repeat records
+            columns, degraded = run_scorer(score_chunk, inputs, True)
+            columns = columns.constant('modelVersion', endpoint_model_version(endpoint, degraded))
+            if prediction_history.enabled:
+                record_history(endpoint, [records[index] for index in indices], columns.rows(), inputs)
+            parts.append(columns.add('index', indices, np.uint32))
     
-    return recommendations
+    return ResultColumns.concat(parts), errors
+
+def wants_columns():
+    """Whether the client asked for packed columnar results, by Accept header or ?format=columns"""
+    if request.args.get('format') == 'columns':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', COLUMNS_MIMETYPE]) == COLUMNS_MIMETYPE
+
+def run_batch_route(endpoint, extract, score_chunk):
+    """Handle a batch prediction request and return per-record results"""
+    try:
+        with record_stage('parse'):
+            records = parse_batch_records()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        if wants_columns():
+            columns, errors = score_batch_columns(endpoint, records, extract, score_chunk)
+            with record_stage('serialization'):
+                frame = pack(
+                    columns, count=len(records), failed=len(errors), errors=errors,
+                    timestamp=datetime.now().isoformat()
+                )
+                # Column buffers are copied one at a time as the response is written, never joined
+                return Response(iter_bytes(frame), mimetype=COLUMNS_MIMETYPE)
+        
+        results = score_batch(endpoint, records, extract, score_chunk)
+        
+        with record_stage('serialization'):
+            return jsonify({
+                'results': results,
+                'count': len(results),
+                'failed': sum(1 for result in results if 'error' in result),
+                'timestamp': datetime.now().isoformat()
+            })
+        
+    except InferenceQueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Error in {endpoint} batch prediction: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def iter_request_lines():
+    """Yield decoded lines from the request body without buffering the whole upload"""
+    remainder = b''
+    while True:
+        chunk = request.stream.read(STREAM_READ_SIZE)
+        if not chunk:
+            break
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8', errors='replace') + '\n'
+    if remainder:
+        yield remainder.decode('utf-8', errors='replace')
+
+def unflatten_csv_row(row):
+    """Turn a CSV row into a record, nesting dotted columns such as soilData.nitrogen"""
+    record = {}
+    for column, value in row.items():
+        # Empty cells fall back to the endpoint defaults
+        if column is None or value is None or value == '':
+            continue
+        target = record
+        *parents, key = column.strip().split('.')
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[key] = value
+    return record
+
+def iter_stream_records(offset=0):
+    """Incrementally parse (index, record) pairs from an NDJSON or CSV upload, skipping rows before offset"""
+    lines = iter_request_lines()
+    
+    if 'csv' in (request.mimetype or ''):
+        for index, row in enumerate(csv.DictReader(lines)):
+            if index >= offset:
+                yield index, unflatten_csv_row(row)
+        return
+    
+    index = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        if index >= offset:
+            try:
+                yield index, jsoncodec.loads(line)
+            except ValueError as e:
+                yield index, ValueError(f"Invalid JSON record: {str(e)}")
+        index += 1
+
+def run_stream_route(endpoint, extract, score_chunk):
+    """Score a streamed upload chunk by chunk and stream results back as NDJSON, or as packed column frames"""
+    try:
+        offset = int(request.args.get('offset', 0))
+        if offset < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'offset must be a non-negative integer'}), 400
+    columns = wants_columns()
+    
+    def message(payload):
+        """Encode a progress, error or completion message as an NDJSON line or an empty column frame"""
+        if columns:
+            return b''.join(pack(ResultColumns(0), **payload))
+        return jsoncodec.dumps(payload) + '\n'
+    
+    def generate():
+        count = 0
+        failed = 0
+        next_offset = offset
+        records = iter_stream_records(offset)
+        
+        try:
+            while True:
+                with record_stage('parse'):
+                    chunk = [item for _, item in zip(range(BATCH_CHUNK_SIZE), records)]
+                if not chunk:
+                    break
+                
+                if columns:
+                    scored, errors = score_batch_columns(endpoint, [record for _, record in chunk], extract, score_chunk)
+                    with record_stage('serialization'):
+                        # Positions within the chunk become record numbers within the upload
+                        numbers = np.array([index for index, _ in chunk], dtype=np.uint32)
+                        if 'index' in scored.columns:
+                            scored.columns['index'] = numbers[scored.columns['index']]
+                        for error in errors:
+                            error['index'] = int(numbers[error['index']])
+                        failed += len(errors)
+                        count += len(chunk)
+                        next_offset = chunk[-1][0] + 1
+                        progress = {'processed': count, 'failed': failed, 'nextOffset': next_offset}
+                        yield from iter_bytes(pack(scored, errors=errors, progress=progress))
+                    continue
+                
+                results = score_batch(endpoint, [record for _, record in chunk], extract, score_chunk)
+                
+                with record_stage('serialization'):
+                    lines = []
+                    for (index, _), result in zip(chunk, results):
+                        failed += 'error' in result
+                        lines.append(jsoncodec.dumps({**result, 'index': index}))
+                    count += len(chunk)
+                    next_offset = chunk[-1][0] + 1
+                    lines.append(jsoncodec.dumps({'progress': {'processed': count, 'failed': failed, 'nextOffset': next_offset}}))
+                    yield '\n'.join(lines) + '\n'
+            
+        except Exception as e:
+            # Results up to nextOffset were delivered, so the client can resume from there
+            logger.error(f"Error in {endpoint} stream prediction: {str(e)}")
+            yield message({'error': str(e), 'nextOffset': next_offset})
+            return
+        
+        yield message({
+            'done': True,
+            'count': count,
+            'failed': failed,
+            'nextOffset': next_offset,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    mimetype = COLUMNS_MIMETYPE if columns else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
 
 def get_common_pests(crop_type, risk_score):
     """Get common pests for crop type"""
-    pests_by_crop = {
-        'wheat': ['Aphids', 'Rust', 'Armyworm'],
-        'rice': ['Brown planthopper', 'Stem borer', 'Blast'],
-        'corn': ['Corn borer', 'Armyworm', 'Cutworm'],
-        'cotton': ['Bollworm', 'Whitefly', 'Thrips']
-    }
+    pests = PESTS_BY_CROP.get(crop_type.lower(), DEFAULT_COMMON_PESTS)
+    return list(pests) if risk_score > 60 else pests[:2]
+
+def common_pests_codes(crop_types, risk_scores):
+    """Return codes for the common pests of each record and the distinct pest lists they index"""
+    crop_codes, crops = intern_codes([crop_type.lower() for crop_type in crop_types])
+    pest_lists = []
+    for crop in crops:
+        # Codes 2i and 2i + 1: the first two pests of crop i, and all of them above a risk score of 60
+        pests = list(PESTS_BY_CROP.get(crop, DEFAULT_COMMON_PESTS))
+        pest_lists += [pests[:2], pests]
+    codes = crop_codes.astype(np.uint32) * 2 + (np.asarray(risk_scores) > 60)
+    return codes.astype(code_dtype(len(pest_lists))), pest_lists
+
+def log_startup_report(limit=10):
+    """Log the startup phases and slowest imports recorded with STARTUP_PROFILE=1"""
+    report = startup.profiler.report(limit)
+    phases = ', '.join(f"{phase['phase']} {phase['seconds'] * 1000:.0f}ms" for phase in report['phases'])
+    logger.info(
+        f"Startup ({SERVING_PROFILE} profile): {report['before_profiler_seconds']}s before profiling, "
+        f"{phases}, RSS {(report['rss_bytes'] or 0) / 1e6:.1f} MB"
+    )
+    for record in report['imports']:
+        logger.info(
+            f"  import {record['module']}: {record['seconds'] * 1000:.1f}ms "
+            f"({record['self_seconds'] * 1000:.1f}ms self), RSS +{(record['rss_bytes'] or 0) / 1e6:.1f} MB"
+        )
+
+def create_app(preload_models=False):
+    """Create the Flask application, optionally loading every model before returning"""
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for all routes
+    jsoncodec.install(app)
+    app.register_blueprint(api)
+    startup.profiler.mark('create_app')
     
-    pests = pests_by_crop.get(crop_type.lower(), ['General pests', 'Aphids', 'Caterpillars'])
-    return pests if risk_score > 60 else pests[:2]
+    if preload_models:
+        load_models(wait=True)
+    
+    if startup.profiler.installed:
+        log_startup_report()
+    
+    return app
 
-def get_preventive_measures(risk_score):
-    """Get preventive measures based on risk score"""
-    if risk_score >= 70:
-        return ['Apply preventive pesticides', 'Increase monitoring frequency', 'Use pheromone traps']
-    elif risk_score >= 40:
-        return ['Regular field monitoring', 'Maintain field hygiene', 'Use biological controls']
-    else:
-        return ['Continue routine monitoring', 'Maintain crop health']
+startup.profiler.mark('module')
+
+# Default application for `python app.py`, `flask run` and WSGI servers
+app = create_app()
 
 if __name__ == '__main__':
-    # Load models at startup
-    load_models()
+    # Start loading models in the background; routes use fallbacks until they are ready
+    load_models(wait=False)
     
     # Run the Flask app
     app.run(host='0.0.0.0', port=5000, debug=True)
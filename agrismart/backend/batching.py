@@ -0,0 +1,187 @@
+"""
+Dynamic micro-batching for the AgriSmart prediction models.
+
+A MicroBatcher queues concurrent predict calls and flushes them to the model
+as one batch once the queued rows reach a maximum batch size or the oldest
+request has waited a maximum number of milliseconds. Each caller blocks on its
+own future and receives only its own rows back.
+
+The queue is bounded: when max_queue requests are already waiting, predict()
+raises InferenceQueueFull so the route can shed load with a 429. A caller
+can also pass a timeout; if the model has not answered by then, predict()
+raises DeadlineExceeded and the caller falls back to the rule-based scorer.
+Requests whose caller already gave up are dropped before the model call.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+QUEUE_WAIT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when a batcher already has max_queue requests waiting"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a model call does not finish within the caller's deadline"""
+
+
+class MicroBatcher:
+    """Coalesce concurrent predict calls into batched model invocations"""
+
+    def __init__(self, name, predict_fn, max_batch_size=64, max_wait_ms=2.0, enabled=True, max_queue=1024, workers=1):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.enabled = enabled
+        self.max_queue = max_queue
+        self.workers = workers
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_waits = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.rejected = 0
+        self.deadline_misses = 0
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls, name, predict_fn):
+        """Create a batcher configured by MICRO_BATCHING and <NAME>_BATCH_* variables"""
+        prefix = name.upper()
+        return cls(
+            name,
+            predict_fn,
+            max_batch_size=int(os.environ.get(f'{prefix}_BATCH_MAX_SIZE', 64)),
+            max_wait_ms=float(os.environ.get(f'{prefix}_BATCH_MAX_WAIT_MS', 2)),
+            enabled=os.environ.get('MICRO_BATCHING', '1') != '0',
+            max_queue=int(os.environ.get(f'{prefix}_BATCH_MAX_QUEUE', 1024)),
+            workers=int(os.environ.get(f'{prefix}_BATCH_WORKERS', 1))
+        )
+
+    def predict(self, features, timeout=None):
+        """Predict a feature matrix, sharing the model call with concurrent requests
+
+        With a timeout in seconds, raises DeadlineExceeded if the result is not ready in time.
+        """
+        features = np.asarray(features, dtype=float)
+        if timeout is not None and timeout <= 0:
+            self._count_deadline_miss()
+            raise DeadlineExceeded(f"{self.name} request deadline already passed")
+
+        # Large chunks are already a full batch, so without a deadline (as for batch and stream chunks
+        # unless the client sets X-Deadline-Ms) they skip the queue
+        if not self.enabled or (timeout is None and len(features) >= self.max_batch_size):
+            self.batch_sizes.observe(len(features))
+            return np.asarray(self.predict_fn(features))
+
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFull(f"{self.name} inference queue is full ({self.max_queue} requests)")
+            self._queued += 1
+
+        future = Future()
+        self._ensure_worker().put((features, future, time.perf_counter()))
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Drop the request if it has not reached the model yet
+            future.cancel()
+            self._count_deadline_miss()
+            raise DeadlineExceeded(f"{self.name} model missed its {timeout * 1000:.0f} ms deadline")
+
+    @property
+    def queued(self):
+        """Requests currently waiting in the queue"""
+        return self._queued
+
+    def stats(self):
+        """Return configuration, queue state and batch-size / queue-wait histograms"""
+        return {
+            'enabled': self.enabled,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'max_queue': self.max_queue,
+            'workers': self.workers,
+            'queued': self._queued,
+            'rejected': self.rejected,
+            'deadline_misses': self.deadline_misses,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_waits.snapshot()
+        }
+
+    def _count_deadline_miss(self):
+        with self._lock:
+            self.deadline_misses += 1
+
+    def _ensure_worker(self):
+        """Start the flush threads, restarting them in forked worker processes"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue()
+                    self._queued = 0
+                    for index in range(self.workers):
+                        threading.Thread(
+                            target=self._run, args=(self._queue,), name=f'{self.name}-batcher-{index}', daemon=True
+                        ).start()
+                    self._pid = pid
+        return self._queue
+
+    def _run(self, pending):
+        """Collect queued requests into batches and flush them"""
+        max_wait = self.max_wait_ms / 1000
+        while True:
+            batch = [pending.get()]
+            rows = len(batch[0][0])
+            deadline = batch[0][2] + max_wait
+
+            while rows < self.max_batch_size:
+                # Once the wait budget is spent, only take requests that are already queued
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        """Run one model call for a batch and route results to each waiting request"""
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= len(batch)
+        for _, _, enqueued in batch:
+            self.queue_waits.observe((started - enqueued) * 1000)
+
+        # Skip requests whose callers already gave up on their deadline
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        self.batch_sizes.observe(sum(len(features) for features, _, _ in batch))
+
+        try:
+            outputs = np.asarray(self.predict_fn(np.concatenate([features for features, _, _ in batch])))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for features, future, _ in batch:
+            future.set_result(outputs[offset:offset + len(features)])
+            offset += len(features)
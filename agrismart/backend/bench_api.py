@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Load-test and latency benchmark for the AgriSmart prediction API.
+
+Drives every prediction route with randomized, realistic payloads and reports
+requests/sec, rows/sec and p50/p95/p99 latency per scenario. A scenario is a
+route, single or batch requests, the model-backed or fallback path and a cold
+or warm prediction cache. Results are written as JSON so runs can be compared
+across commits, and --baseline fails the run when a scenario regresses by
+more than --threshold.
+
+The default target is the Flask app in-process through its test client, with
+the prediction history off (unless PREDICTION_HISTORY is set) so history
+writes do not skew the latencies. Pass --url to benchmark a running server
+instead; the model/fallback path is then
+whatever that server serves, and cold-cache runs use unique payloads.
+
+Usage:
+    python bench_api.py --output bench.json
+    python bench_api.py --baseline bench.json --threshold 0.15
+    python bench_api.py --url http://127.0.0.1:5000 --concurrency 16
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CROP_TYPES = ['wheat', 'rice', 'corn', 'soybean', 'cotton', 'sugarcane']
+
+# Number of distinct payloads repeated by warm-cache scenarios
+WARM_POOL_SIZE = 16
+
+
+def random_soil_payload(rng):
+    """Soil parameters in realistic field ranges"""
+    return {
+        'nitrogen': round(rng.uniform(10, 80), 1),
+        'phosphorus': round(rng.uniform(5, 40), 1),
+        'potassium': round(rng.uniform(30, 120), 1),
+        'ph': round(rng.uniform(4.5, 8.5), 2),
+        'organicMatter': round(rng.uniform(0.5, 6), 2),
+        'temperature': round(rng.uniform(10, 40), 1),
+        'humidity': round(rng.uniform(20, 95), 1)
+    }
+
+
+def random_weather_payload(rng):
+    """Weather conditions in realistic ranges"""
+    return {
+        'temperature': round(rng.uniform(10, 40), 1),
+        'humidity': round(rng.uniform(20, 95), 1),
+        'rainfall': round(rng.uniform(0, 250), 1),
+        'pressure': round(rng.uniform(990, 1025), 1),
+        'windSpeed': round(rng.uniform(0, 40), 1)
+    }
+
+
+def random_crop_yield_payload(rng):
+    return {
+        'soilData': random_soil_payload(rng),
+        'weatherData': random_weather_payload(rng),
+        'cropType': rng.choice(CROP_TYPES),
+        'fieldArea': round(rng.uniform(0.5, 20), 1)
+    }
+
+
+def random_field_report_payload(rng):
+    return {**random_crop_yield_payload(rng), 'fieldId': f'field-{rng.randrange(1000)}'}
+
+
+def random_pest_payload(rng):
+    payload = random_weather_payload(rng)
+    payload['cropType'] = rng.choice(CROP_TYPES)
+    return payload
+
+
+PAYLOAD_GENERATORS = {
+    'soil-health': random_soil_payload,
+    'crop-yield': random_crop_yield_payload,
+    'field-report': random_field_report_payload,
+    'pest-risk': random_pest_payload,
+    'rainfall': random_weather_payload
+}
+
+# Models behind each route; the model path is only model-backed once all of them are loaded
+ROUTE_MODELS = {
+    'soil-health': ['soil_model'],
+    'crop-yield': ['soil_model'],
+    'field-report': ['soil_model', 'pest_model', 'rainfall_model'],
+    'pest-risk': ['pest_model'],
+    'rainfall': ['rainfall_model']
+}
+
+
+class InProcessTarget:
+    """Benchmark target calling the Flask app through its test client"""
+
+    name = 'inprocess'
+
+    def __init__(self):
+        sys.path.insert(0, BACKEND_DIR)
+        # Every request would otherwise also be written to the SQLite history
+        os.environ.setdefault('PREDICTION_HISTORY', 'off')
+        import app as app_module
+        self.module = app_module
+        self.module.load_models(wait=True)
+        self._local = threading.local()
+
+    def post(self, path, payload):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.module.app.test_client()
+        return client.post(path, json=payload).status_code
+
+    def set_path(self, path):
+        """Select the model-backed or fallback path; returns False if the model path is unavailable"""
+        self.module.model_registry.fallback_only = path == 'fallback'
+        return True
+
+    def model_loaded(self, route):
+        models = self.module.model_registry.status()
+        return all(models[model_name]['state'] == 'loaded' for model_name in ROUTE_MODELS[route])
+
+    def clear_cache(self):
+        self.module.prediction_cache.clear()
+
+
+class HttpTarget:
+    """Benchmark target calling a running server over keep-alive HTTP connections"""
+
+    name = 'http'
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self._local = threading.local()
+
+    def post(self, path, payload):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        body = json.dumps(payload)
+        try:
+            connection.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Reconnect once if the server closed the keep-alive connection
+            connection.close()
+            connection.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+        response.read()
+        return response.status
+
+    def set_path(self, path):
+        # The server decides which path it serves
+        return path == 'server'
+
+    def model_loaded(self, route):
+        return None
+
+    def clear_cache(self):
+        pass
+
+
+def summarize(name, latencies, elapsed, rows_per_request, errors):
+    """Build the result record for one scenario"""
+    latencies_ms = np.array(latencies) * 1000
+    requests = len(latencies)
+    return {
+        'name': name,
+        'requests': requests,
+        'errors': errors,
+        'rows_per_request': rows_per_request,
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(requests / elapsed, 1),
+        'rows_per_second': round(requests * rows_per_request / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+        'max_ms': round(float(latencies_ms.max()), 3)
+    }
+
+
+def run_scenario(target, route, mode, cache, requests, concurrency, batch_size, rng):
+    """Run one scenario and return its result record"""
+    generate = PAYLOAD_GENERATORS[route]
+    path = f'/predict/{route}/batch' if mode == 'batch' else f'/predict/{route}'
+    rows_per_request = batch_size if mode == 'batch' else 1
+
+    def make_payload():
+        if mode == 'batch':
+            return [generate(rng) for _ in range(batch_size)]
+        return generate(rng)
+
+    if cache == 'warm':
+        pool = [make_payload() for _ in range(WARM_POOL_SIZE)]
+        for payload in pool:
+            target.post(path, payload)
+        payloads = [pool[index % WARM_POOL_SIZE] for index in range(requests)]
+    else:
+        target.clear_cache()
+        payloads = [make_payload() for _ in range(requests)]
+
+    errors = 0
+    errors_lock = threading.Lock()
+
+    def timed_post(payload):
+        nonlocal errors
+        started = time.perf_counter()
+        status = target.post(path, payload)
+        latency = time.perf_counter() - started
+        if status != 200:
+            with errors_lock:
+                errors += 1
+        return latency
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_post, payloads))
+    elapsed = time.perf_counter() - started
+
+    return summarize(f'{route}/{mode}/{cache}', latencies, elapsed, rows_per_request, errors)
+
+
+def git_commit():
+    """Return the current git commit, if available"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Return regressions of throughput or p95 latency beyond threshold against a baseline run"""
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        if result['requests_per_second'] < before['requests_per_second'] * (1 - threshold):
+            regressions.append(
+                f"{result['name']}: {before['requests_per_second']} -> {result['requests_per_second']} req/s"
+            )
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f"{result['name']}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmark suite"""
+    parser = argparse.ArgumentParser(description='Benchmark throughput and latency of the prediction API')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--routes', nargs='+', choices=sorted(PAYLOAD_GENERATORS), default=sorted(PAYLOAD_GENERATORS))
+    parser.add_argument('--modes', nargs='+', choices=['single', 'batch'], default=['single', 'batch'])
+    parser.add_argument('--paths', nargs='+', choices=['model', 'fallback'], default=['model', 'fallback'],
+                        help='in-process only: model-backed and/or fallback scoring')
+    parser.add_argument('--caches', nargs='+', choices=['cold', 'warm'], default=['cold', 'warm'])
+    parser.add_argument('--requests', type=int, default=500, help='requests per single-record scenario')
+    parser.add_argument('--batch-requests', type=int, default=20, help='requests per batch scenario')
+    parser.add_argument('--batch-size', type=int, default=1000, help='records per batch request')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent client threads')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against a previous JSON result file')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed relative regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+    paths = ['server'] if args.url else args.paths
+    rng = random.Random(args.seed)
+
+    results = []
+    print(f"{'scenario':<40} {'req/s':>9} {'rows/s':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for path in paths:
+        target.set_path(path)
+        for route in args.routes:
+            for mode in args.modes:
+                for cache in args.caches:
+                    requests = args.batch_requests if mode == 'batch' else args.requests
+                    result = run_scenario(target, route, mode, cache, requests, args.concurrency, args.batch_size, rng)
+                    result['name'] = f"{result['name']}/{path}"
+                    result['model_loaded'] = target.model_loaded(route) if path == 'model' else False
+                    results.append(result)
+                    print(f"{result['name']:<40} {result['requests_per_second']:>9} {result['rows_per_second']:>11} "
+                          f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8}")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'target': args.url or target.name,
+            'python': platform.python_version(),
+            'concurrency': args.concurrency,
+            'batch_size': args.batch_size
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
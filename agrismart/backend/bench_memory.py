@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory benchmark for the AgriSmart production server.
+
+Starts serve.py with 1..N workers, waits for /ready, sends a few requests to
+every prediction route so lazily touched pages are counted, then reads RSS and
+PSS for the master and each worker from /proc/<pid>/smaps_rollup (Linux only).
+PSS splits shared pages between the processes that map them, so total PSS is
+the real memory cost of the deployment.
+
+Usage:
+    python bench_memory.py --max-workers 16 --output memory.json
+    python bench_memory.py --workers 1 4 8 --no-preload
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WARMUP_REQUESTS = [
+    ('/predict/soil-health', {'nitrogen': 45, 'phosphorus': 28, 'ph': 6.5}),
+    ('/predict/crop-yield', {'soilData': {'nitrogen': 45}, 'weatherData': {'temperature': 25}, 'cropType': 'rice'}),
+    ('/predict/pest-risk', {'temperature': 28, 'humidity': 75, 'rainfall': 120, 'cropType': 'cotton'}),
+    ('/predict/rainfall', {'temperature': 22, 'humidity': 85, 'pressure': 1005})
+]
+
+
+def free_port():
+    """Return a free local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def read_memory_kb(pid):
+    """Return (rss_kb, pss_kb) for a process"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+
+def child_pids(pid):
+    """Return the direct children of a process"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as handle:
+                # The command name may contain spaces, so split after its closing paren
+                fields = handle.read().rpartition(')')[2].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def wait_for_workers(pid, workers, timeout=30):
+    """Wait until the server has forked the expected number of workers"""
+    deadline = time.monotonic() + timeout
+    pids = child_pids(pid)
+    while len(pids) < workers and time.monotonic() < deadline:
+        time.sleep(0.2)
+        pids = child_pids(pid)
+    return pids
+
+
+def wait_until_ready(base_url, timeout):
+    """Poll /ready until the server reports every model settled"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/ready', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f'Server at {base_url} was not ready after {timeout}s')
+
+
+def post(base_url, path, payload):
+    """POST a JSON payload"""
+    request = urllib.request.Request(
+        f'{base_url}{path}', data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+
+
+def measure(workers, preload, requests_per_route, ready_timeout):
+    """Start a server with the given worker count and measure its memory"""
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, AGRISMART_PRELOAD='1' if preload else '0')
+    command = [sys.executable, os.path.join(BACKEND_DIR, 'serve.py'),
+               '--workers', str(workers), '--threads', '1', '--bind', f'127.0.0.1:{port}']
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        wait_until_ready(base_url, ready_timeout)
+
+        # Spread warm-up requests so every worker is likely to serve some
+        for _ in range(requests_per_route * workers):
+            for path, payload in WARMUP_REQUESTS:
+                post(base_url, path, payload)
+
+        pids = wait_for_workers(server.pid, workers)
+        master_rss, master_pss = read_memory_kb(server.pid)
+        usage = [read_memory_kb(pid) for pid in pids]
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    worker_rss = [rss for rss, _ in usage]
+    worker_pss = [pss for _, pss in usage]
+    return {
+        'workers': workers,
+        'preload': preload,
+        'master_rss_mb': round(master_rss / 1024, 1),
+        'master_pss_mb': round(master_pss / 1024, 1),
+        'worker_rss_mb': round(sum(worker_rss) / len(worker_rss) / 1024, 1),
+        'worker_pss_mb': round(sum(worker_pss) / len(worker_pss) / 1024, 1),
+        'total_rss_mb': round((master_rss + sum(worker_rss)) / 1024, 1),
+        'total_pss_mb': round((master_pss + sum(worker_pss)) / 1024, 1)
+    }
+
+
+def main(argv=None):
+    """Run the memory benchmark and print a table"""
+    parser = argparse.ArgumentParser(description='Measure per-worker RSS and PSS of the production server')
+    parser.add_argument('--max-workers', type=int, default=16, help='measure 1..N workers')
+    parser.add_argument('--workers', type=int, nargs='+', help='explicit worker counts to measure')
+    parser.add_argument('--no-preload', action='store_true', help='load models in each worker instead of before fork')
+    parser.add_argument('--requests', type=int, default=5, help='warm-up requests per route per worker')
+    parser.add_argument('--ready-timeout', type=float, default=120, help='seconds to wait for /ready')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print('❌ /proc/<pid>/smaps_rollup is required (Linux 4.14+)')
+        return 1
+
+    results = []
+    print(f"{'workers':>7} {'worker RSS':>11} {'worker PSS':>11} {'total RSS':>10} {'total PSS':>10}  (MB)")
+    for workers in args.workers or range(1, args.max_workers + 1):
+        result = measure(workers, not args.no_preload, args.requests, args.ready_timeout)
+        results.append(result)
+        print(f"{workers:>7} {result['worker_rss_mb']:>11} {result['worker_pss_mb']:>11} "
+              f"{result['total_rss_mb']:>10} {result['total_pss_mb']:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
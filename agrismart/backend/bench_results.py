@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Result-format benchmark for bulk prediction jobs.
+
+Scores the same generated records through the batch scoring path twice: into
+one JSON result dict per record serialized with jsonify, and into
+ResultColumns serialized as a packed column frame. Each run reports the
+scoring and serialization time, the response size, and the peak memory
+allocated by Python and NumPy while scoring and serializing (tracemalloc).
+The input records are generated before measuring, so they are not counted.
+Timings come from a separate pass without tracemalloc, which slows
+allocation-heavy code.
+
+The prediction cache and history are turned off so every record is scored.
+
+Usage:
+    python bench_results.py --records 200000
+    python bench_results.py --routes field-report --records 1000000 --output results.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('PREDICTION_CACHE', 'off')
+os.environ.setdefault('PREDICTION_HISTORY', 'off')
+
+from bench_api import PAYLOAD_GENERATORS, git_commit
+
+ROUTES = sorted(PAYLOAD_GENERATORS)
+
+
+def route_handlers(app):
+    """Map each route to its input extractor and chunk scorer"""
+    return {
+        'soil-health': (app.extract_soil_features, app.score_soil_health_chunk),
+        'crop-yield': (app.extract_crop_yield_inputs, app.score_crop_yield_chunk),
+        'pest-risk': (app.extract_pest_inputs, app.score_pest_risk_chunk),
+        'rainfall': (app.extract_rainfall_features, app.score_rainfall_chunk),
+        'field-report': (app.extract_field_report_inputs, app.score_field_report_chunk)
+    }
+
+
+def run_format(app, route, records, result_format):
+    """Score and serialize records in one format, returning timings and the response size"""
+    extract, score_chunk = route_handlers(app)[route]
+    with app.app.app_context():
+        started = time.perf_counter()
+        if result_format == 'json':
+            results = app.score_batch(route, records, extract, score_chunk)
+            scored = time.perf_counter()
+            body = app.jsonify({'results': results, 'count': len(results)}).get_data()
+        else:
+            columns, errors = app.score_batch_columns(route, records, extract, score_chunk)
+            scored = time.perf_counter()
+            body = b''.join(bytes(chunk) for chunk in app.pack(columns, count=len(records), errors=errors))
+        finished = time.perf_counter()
+    return {'score_seconds': scored - started, 'serialize_seconds': finished - scored, 'bytes': len(body)}
+
+
+def measure_peak(app, route, records, result_format):
+    """Return the peak bytes allocated while scoring and serializing records"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_format(app, route, records, result_format)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description='Compare JSON and packed columnar results for bulk scoring')
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=['soil-health', 'field-report'])
+    parser.add_argument('--records', type=int, default=200000, help='records per route')
+    parser.add_argument('--fallback', action='store_true', help='score with the rule-based fallbacks only')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    if args.fallback:
+        os.environ['FALLBACK_ONLY'] = '1'
+    import app
+    app.load_models(wait=True)
+    rng = random.Random(args.seed)
+
+    results = []
+    print(f"{'route':<14} {'format':<8} {'score s':>9} {'serialize s':>12} {'MB out':>9} {'peak MB':>9}")
+    for route in args.routes:
+        generate = PAYLOAD_GENERATORS[route]
+        records = [generate(rng) for _ in range(args.records)]
+        for result_format in ('json', 'columns'):
+            result = {
+                'route': route,
+                'format': result_format,
+                'records': args.records,
+                **run_format(app, route, records, result_format),
+                'peak_bytes': measure_peak(app, route, records, result_format)
+            }
+            results.append(result)
+            print(f"{route:<14} {result_format:<8} {result['score_seconds']:>9.2f} {result['serialize_seconds']:>12.3f} "
+                  f"{result['bytes'] / 1e6:>9.1f} {result['peak_bytes'] / 1e6:>9.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump({'meta': {'commit': git_commit(), 'records': args.records}, 'results': results}, handle, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the AgriSmart Backend API.
+
+Starts a fresh server process, polls /health every few milliseconds and
+records the time from launching the process to the first successful
+response, then stops the server. The server is serve.py with one gunicorn
+worker, or the werkzeug server from the Flask development setup with
+--server werkzeug. By default the rule-based fallbacks are served
+(FALLBACK_ONLY=1) with the slim serving profile, which is the configuration
+autoscaled nodes start with. The run fails when the median cold start misses
+--target-ms.
+
+With --report the last run is started with STARTUP_PROFILE=1 and the
+slowest imports recorded by the startup profiler are printed.
+
+Usage:
+    python bench_startup.py --runs 10 --target-ms 300
+    python bench_startup.py --profile full --models --target-ms 0 --report
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_api import git_commit
+from bench_memory import BACKEND_DIR, free_port
+
+# Serves app.app without the Flask reloader and debugger started by `python app.py`
+WERKZEUG_SERVER = (
+    'import sys; from werkzeug.serving import make_server; import app; '
+    'make_server("127.0.0.1", int(sys.argv[1]), app.app, threaded=True).serve_forever()'
+)
+
+
+def server_command(server, port):
+    """Return the command starting a server on port"""
+    if server == 'werkzeug':
+        return [sys.executable, '-c', WERKZEUG_SERVER, str(port)]
+    return [sys.executable, os.path.join(BACKEND_DIR, 'serve.py'),
+            '--workers', '1', '--threads', '1', '--bind', f'127.0.0.1:{port}']
+
+
+def get(port, path):
+    """GET a path, returning the status and body"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def cold_start(server, env, timeout, poll_ms, report=False):
+    """Start a server and return the seconds until /health first succeeds, with the startup report if requested"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        server_command(server, port), cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                status, _ = get(port, '/health')
+                if status == 200:
+                    seconds = time.perf_counter() - started
+                    break
+            except OSError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f'Server exited with status {process.returncode} before /health succeeded')
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f'/health did not succeed within {timeout}s')
+            time.sleep(poll_ms / 1000)
+        startup = json.loads(get(port, '/debug/startup')[1]) if report else None
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+    return seconds, startup
+
+
+def print_report(startup, limit):
+    """Print the phases and slowest imports of a startup report"""
+    print(f"\nStartup report ({startup['profile']} profile), "
+          f"{startup['before_profiler_seconds']}s before the profiler was installed:")
+    for phase in startup['phases']:
+        print(f"  {phase['phase']:<14} {phase['seconds'] * 1000:>8.1f} ms {(phase['rss_bytes'] or 0) / 1e6:>8.1f} MB RSS")
+    print(f"\n{'package':<24} {'self ms':>9} {'RSS MB':>8}")
+    for package in startup['packages'][:limit]:
+        print(f"{package['package']:<24} {package['self_seconds'] * 1000:>9.1f} {package['rss_bytes'] / 1e6:>8.1f}")
+    for name, model in startup['models'].items():
+        if model['load_seconds'] is not None:
+            print(f"model {name}: loaded in {model['load_seconds']}s, RSS +{(model['load_memory_bytes'] or 0) / 1e6:.1f} MB")
+
+
+def main(argv=None):
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description='Measure the time from process start to the first successful /health')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'], default='gunicorn')
+    parser.add_argument('--profile', choices=['slim', 'full'], default='slim', help='SERVING_PROFILE of the server')
+    parser.add_argument('--models', action='store_true', help='serve the pretrained models instead of FALLBACK_ONLY=1')
+    parser.add_argument('--target-ms', type=float, default=300, help='fail when the median exceeds this (0 disables)')
+    parser.add_argument('--poll-ms', type=float, default=2, help='delay between /health attempts')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds to wait for each start')
+    parser.add_argument('--report', action='store_true', help='print the startup profiler report of the last run')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, SERVING_PROFILE=args.profile, FALLBACK_ONLY='0' if args.models else '1')
+    seconds = []
+    startup = None
+    for run in range(args.runs):
+        report = args.report and run == args.runs - 1
+        run_env = dict(env, STARTUP_PROFILE='1', ALLOW_PROFILER='1') if report else env
+        elapsed, startup = cold_start(args.server, run_env, args.timeout, args.poll_ms, report)
+        # The profiled run pays for the import hook, so it is not counted
+        if not report:
+            seconds.append(elapsed)
+        print(f"run {run + 1}: {elapsed * 1000:.0f} ms{' (profiled)' if report else ''}")
+
+    result = None
+    if seconds:
+        result = {
+            'server': args.server,
+            'profile': args.profile,
+            'fallback_only': not args.models,
+            'runs': len(seconds),
+            'min_ms': round(min(seconds) * 1000, 1),
+            'median_ms': round(statistics.median(seconds) * 1000, 1),
+            'max_ms': round(max(seconds) * 1000, 1),
+            'target_ms': args.target_ms
+        }
+        print(f"\ncold start to /health ({args.server}, {args.profile} profile, "
+              f"{'models' if args.models else 'fallback only'}): min {result['min_ms']} ms, "
+              f"median {result['median_ms']} ms, max {result['max_ms']} ms")
+    if startup is not None:
+        print_report(startup, 15)
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump({'meta': {'commit': git_commit()}, 'result': result, 'startup': startup}, handle, indent=2)
+
+    if result is not None and args.target_ms > 0:
+        if result['median_ms'] > args.target_ms:
+            print(f"❌ median cold start {result['median_ms']} ms exceeds the {args.target_ms:.0f} ms target")
+            return 1
+        print(f"✅ median cold start within the {args.target_ms:.0f} ms target")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Server-side prediction cache for the AgriSmart prediction API.
+
+Keys are built from the endpoint, the model version and the parsed feature
+values (optionally rounded into buckets), so equivalent payloads share an
+entry regardless of key order or int/float spelling. Inputs that a result
+echoes or scales with, such as a field's area, are listed as exact keys and
+never rounded, so a hit never returns another request's field area. Entries
+are evicted least-recently-used first once the entry or byte budget is
+exceeded and expire after a TTL.
+
+Two storage backends are available:
+- MemoryCacheBackend: a per-process ordered dict
+- SQLiteCacheBackend: a local SQLite file shared by every worker on the host
+  (point PREDICTION_CACHE_PATH at /dev/shm to keep it in shared memory)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonicalize(value, digits=None, exact=()):
+    """Convert parsed inputs into a hashable, order-independent form, leaving the exact dict keys unrounded"""
+    if isinstance(value, dict):
+        return tuple(sorted(
+            (key, canonicalize(item, None if key in exact else digits, exact)) for key, item in value.items()
+        ))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonicalize(item, digits, exact) for item in value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = float(value)
+        return round(value, digits) if digits is not None else value
+    return value
+
+
+class MemoryCacheBackend:
+    """Per-process LRU store"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys, now):
+        """Return stored values for keys, None for missing or expired entries"""
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    values.append(None)
+                elif entry[2] < now:
+                    self._remove(key)
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(json.loads(entry[0]))
+        return values
+
+    def set_many(self, items, expires, max_entries, max_bytes):
+        """Store serialized values and return the number of evicted entries"""
+        evicted = 0
+        with self._lock:
+            for key, payload in items:
+                if key in self._entries:
+                    self._remove(key)
+                self._entries[key] = (payload, len(payload), expires)
+                self._bytes += len(payload)
+            while self._entries and (len(self._entries) > max_entries or self._bytes > max_bytes):
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        return evicted
+
+    def size(self):
+        """Return the number of entries and stored bytes"""
+        with self._lock:
+            return len(self._entries), self._bytes
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        payload, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+class SQLiteCacheBackend:
+    """LRU store in a SQLite file shared across worker processes"""
+
+    # The entry count and stored bytes are kept in a one-row table by triggers,
+    # so checking the budget on every write does not scan the whole cache
+    _schema = (
+        'CREATE TABLE IF NOT EXISTS predictions ('
+        'key TEXT PRIMARY KEY, value TEXT, size INTEGER, expires REAL, accessed REAL)',
+        'CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed)',
+        'CREATE INDEX IF NOT EXISTS predictions_expires ON predictions (expires)',
+        'CREATE TABLE IF NOT EXISTS predictions_size (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER, bytes INTEGER)',
+        # Counts a cache file created before the size table existed, once
+        'INSERT OR IGNORE INTO predictions_size SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM predictions',
+        'CREATE TRIGGER IF NOT EXISTS predictions_inserted AFTER INSERT ON predictions BEGIN '
+        'UPDATE predictions_size SET entries = entries + 1, bytes = bytes + NEW.size; END',
+        'CREATE TRIGGER IF NOT EXISTS predictions_deleted AFTER DELETE ON predictions BEGIN '
+        'UPDATE predictions_size SET entries = entries - 1, bytes = bytes - OLD.size; END'
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """Return a connection for the current thread and process"""
+        # Imported on first use, so processes with this store turned off never import sqlite3
+        import sqlite3
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            # INSERT OR REPLACE only fires the delete trigger for the replaced row with recursive triggers on
+            connection.execute('PRAGMA recursive_triggers=ON')
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                for statement in self._schema:
+                    connection.execute(statement)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_many(self, keys, now):
+        """Return stored values for keys, None for missing or expired entries"""
+        connection = self._connection()
+        rows = []
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows.extend(connection.execute(
+                f'SELECT key, value FROM predictions WHERE key IN ({placeholders}) AND expires >= ?',
+                (*chunk, now)
+            ).fetchall())
+        if rows:
+            connection.executemany('UPDATE predictions SET accessed = ? WHERE key = ?', [(now, key) for key, _ in rows])
+
+        found = dict(rows)
+        return [json.loads(found[key]) if key in found else None for key in keys]
+
+    def set_many(self, items, expires, max_entries, max_bytes):
+        """Store serialized values and return the number of evicted entries"""
+        connection = self._connection()
+        now = time.time()
+        connection.executemany(
+            'INSERT OR REPLACE INTO predictions (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+            [(key, payload, len(payload), expires, now) for key, payload in items]
+        )
+
+        evicted = connection.execute('DELETE FROM predictions WHERE expires < ?', (now,)).rowcount
+        entries, stored_bytes = self.size()
+        if entries > max_entries or stored_bytes > max_bytes:
+            # Evict the least recently used entries, leaving 10% headroom
+            excess = max(entries - max_entries, 0)
+            if stored_bytes > max_bytes:
+                average = stored_bytes / max(entries, 1)
+                excess = max(excess, int((stored_bytes - max_bytes) / average) + 1)
+            excess += max_entries // 10
+            evicted += connection.execute(
+                'DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY accessed LIMIT ?)',
+                (excess,)
+            ).rowcount
+        return evicted
+
+    def size(self):
+        """Return the number of entries and stored bytes"""
+        entries, stored_bytes = self._connection().execute(
+            'SELECT entries, bytes FROM predictions_size'
+        ).fetchone()
+        return entries, stored_bytes
+
+    def clear(self):
+        """Drop every entry"""
+        self._connection().execute('DELETE FROM predictions')
+
+
+class PredictionCache:
+    """Bounded LRU/TTL cache of prediction results with hit/miss counters"""
+
+    def __init__(self, backend=None, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl_seconds=300, round_digits=None,
+                 exact_keys=()):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.round_digits = round_digits
+        # Input keys never rounded, because results echo them or scale with them
+        self.exact_keys = frozenset(exact_keys)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, exact_keys=()):
+        """Create a cache configured by the PREDICTION_CACHE_* environment variables"""
+        kind = os.environ.get('PREDICTION_CACHE', 'memory')
+        if kind == 'off':
+            backend = None
+        elif kind == 'sqlite':
+            default_path = os.path.join(tempfile.gettempdir(), 'agrismart_prediction_cache.sqlite3')
+            backend = SQLiteCacheBackend(os.environ.get('PREDICTION_CACHE_PATH', default_path))
+        elif kind == 'memory':
+            backend = MemoryCacheBackend()
+        else:
+            raise ValueError(f"Unknown PREDICTION_CACHE backend: {kind}")
+
+        round_digits = os.environ.get('PREDICTION_CACHE_ROUNDING')
+        return cls(
+            backend,
+            max_entries=int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 10000)),
+            max_bytes=int(os.environ.get('PREDICTION_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL', 300)),
+            round_digits=int(round_digits) if round_digits else None,
+            exact_keys=exact_keys
+        )
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def make_key(self, endpoint, model_version, inputs):
+        """Build a cache key from the endpoint, model version and parsed inputs"""
+        canonical = repr((endpoint, model_version, canonicalize(inputs, self.round_digits, self.exact_keys)))
+        return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+    def get_many(self, keys):
+        """Look up keys, returning cached results or None for misses"""
+        values = self.backend.get_many(keys, time.time())
+        hits = sum(1 for value in values if value is not None)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(values) - hits
+        return values
+
+    def set_many(self, items):
+        """Store (key, result) pairs"""
+        payloads = [(key, json.dumps(value, separators=(',', ':'))) for key, value in items]
+        evicted = self.backend.set_many(payloads, time.time() + self.ttl_seconds, self.max_entries, self.max_bytes)
+        with self._lock:
+            self.evictions += evicted
+
+    def clear(self):
+        """Drop every cached result"""
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self):
+        """Return configuration, size and hit/miss counters"""
+        if not self.enabled:
+            return {'enabled': False}
+
+        entries, stored_bytes = self.backend.size()
+        lookups = self.hits + self.misses
+        return {
+            'enabled': True,
+            'backend': type(self.backend).__name__,
+            'entries': entries,
+            'bytes': stored_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'round_digits': self.round_digits,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,241 @@
+"""
+Columnar results and a packed binary encoding for bulk prediction jobs.
+
+The JSON routes build one dict per record, holding Python floats, strings
+and freshly built recommendation lists. For a backfill of a million records
+that is gigabytes of small objects. ResultColumns keeps a scored chunk as a
+struct of NumPy arrays instead:
+
+- numbers are stored as float32 or small integers, with the decimal places
+  the JSON response rounds to;
+- labels and recommendation lists are stored as uint8 codes into a small
+  dictionary of distinct values, which the rule tables produce directly;
+- values shared by every row are stored once as constants; when chunks
+  with different constants (such as a model version that changed between
+  them) are concatenated, the constant becomes a dictionary-coded column.
+
+A packed frame encodes one ResultColumns without copying its arrays:
+
+    magic  b'AGRICOL1'
+    uint32 header length, uint64 body length (little-endian)
+    JSON header, padded with spaces to a multiple of 8 bytes
+    body: each column's raw buffer, padded with zeros to a multiple of 8 bytes
+
+The header lists the row count, constants and, for each column, its name,
+NumPy dtype string, offset and size within the body, decimals and
+dictionary, plus any metadata of the response such as errors or progress.
+A response may hold several frames back to back, and unpack() reads each
+column as a NumPy view over the response bytes. pack() copies no column
+data; WSGI servers only accept bytes, so iter_bytes() copies each buffer
+once as the response is written.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from rules import code_dtype
+
+MIMETYPE = 'application/vnd.agrismart.columns'
+MAGIC = b'AGRICOL1'
+ALIGNMENT = 8
+
+FRAME_PREFIX = struct.Struct('<IQ')
+
+
+def padding(size):
+    """Return the bytes needed to extend size to a multiple of ALIGNMENT"""
+    return -size % ALIGNMENT
+
+
+def hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def round_half_exact(values, decimals):
+    """Round like the built-in round(), which np.round differs from at values close to a halfway point"""
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0 ** decimals
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(value, decimals) for value in values[near_half].tolist()]
+    return rounded
+
+
+def intern_codes(values):
+    """Return codes for a sequence of hashable values and the dictionary of distinct values they index"""
+    dictionary = list(dict.fromkeys(values))
+    index = {value: code for code, value in enumerate(dictionary)}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.uint32, count=len(values))
+    return codes.astype(code_dtype(len(dictionary))), dictionary
+
+
+class ResultColumns:
+    """Struct-of-arrays results of a scored chunk"""
+
+    def __init__(self, length):
+        self.length = length
+        # name -> one value per row; dotted names are nested objects in the JSON results
+        self.columns = {}
+        # name -> decimal places of a float column
+        self.decimals = {}
+        # name -> distinct values indexed by an integer code column
+        self.dictionaries = {}
+        # name -> value shared by every row
+        self.constants = {}
+
+    def add(self, name, values, dtype=None, decimals=None, dictionary=None):
+        """Add a column, rounding float values to decimals places and converting them to dtype"""
+        values = np.asarray(values)
+        if decimals is not None:
+            values = round_half_exact(values, decimals)
+            self.decimals[name] = decimals
+        self.columns[name] = values.astype(dtype, copy=False) if dtype is not None else values
+        if dictionary is not None:
+            self.dictionaries[name] = [list(value) if isinstance(value, tuple) else value for value in dictionary]
+        return self
+
+    def constant(self, name, value):
+        """Add a value shared by every row"""
+        self.constants[name] = value
+        return self
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays"""
+        return sum(values.nbytes for values in self.columns.values())
+
+    @classmethod
+    def merge(cls, parts):
+        """Combine column sets describing the same rows under their own name prefixes, given as (prefix, columns)"""
+        merged = cls(parts[0][1].length)
+        for prefix, part in parts:
+            for attribute in ('columns', 'decimals', 'dictionaries', 'constants'):
+                getattr(merged, attribute).update(
+                    {f'{prefix}.{name}': value for name, value in getattr(part, attribute).items()}
+                )
+        return merged
+
+    @classmethod
+    def concat(cls, parts, length=0):
+        """Append the rows of column sets with the same columns, merging their dictionaries
+
+        Constants that differ between parts become dictionary-coded columns.
+        """
+        if not parts:
+            return cls(length)
+        combined = cls(sum(part.length for part in parts))
+        first = parts[0]
+        combined.decimals = dict(first.decimals)
+        for name in dict.fromkeys(name for part in parts for name in part.constants):
+            values = [part.constants.get(name) for part in parts]
+            if all(value == values[0] for value in values):
+                combined.constants[name] = values[0]
+                continue
+            codes, dictionary = intern_codes([hashable(value) for value in values])
+            combined.add(name, np.repeat(codes, [part.length for part in parts]), dictionary=dictionary)
+        for name in first.columns:
+            dictionaries = [part.dictionaries.get(name) for part in parts]
+            if dictionaries[0] is None or all(dictionary == dictionaries[0] for dictionary in dictionaries):
+                combined.columns[name] = np.concatenate([part.columns[name] for part in parts])
+                if dictionaries[0] is not None:
+                    combined.dictionaries[name] = dictionaries[0]
+                continue
+            # Chunks interned different values, so their codes are remapped onto one dictionary
+            merged = {}
+            for dictionary in dictionaries:
+                for value in dictionary:
+                    merged.setdefault(hashable(value), value)
+            index = {key: code for code, key in enumerate(merged)}
+            codes = [
+                np.array([index[hashable(value)] for value in dictionary], dtype=np.uint32)[part.columns[name]]
+                for part, dictionary in zip(parts, dictionaries)
+            ]
+            combined.columns[name] = np.concatenate(codes).astype(code_dtype(len(index)))
+            combined.dictionaries[name] = list(merged.values())
+        return combined
+
+    def rows(self):
+        """Return the equivalent JSON result dicts"""
+        columns = []
+        for name, values in self.columns.items():
+            if name in self.dictionaries:
+                dictionary = self.dictionaries[name]
+                values = [dictionary[code] for code in values.tolist()]
+            elif name in self.decimals:
+                decimals = self.decimals[name]
+                # float32 values are rounded again after widening, so 53.1 is not returned as 53.099998
+                values = [round(value, decimals) for value in values.tolist()]
+            else:
+                values = values.tolist()
+            columns.append((name.split('.'), values))
+
+        constants = [(name.split('.'), value) for name, value in self.constants.items()]
+        rows = []
+        for position in range(self.length):
+            row = {}
+            for path, value in constants + [(path, values[position]) for path, values in columns]:
+                target = row
+                for key in path[:-1]:
+                    target = target.setdefault(key, {})
+                target[path[-1]] = list(value) if isinstance(value, list) else value
+            rows.append(row)
+        return rows
+
+
+def pack(columns, **metadata):
+    """Encode columns as one packed frame, returned as a list of bytes and array buffers to write in order"""
+    descriptions = []
+    buffers = []
+    offset = 0
+    for name, values in columns.columns.items():
+        values = np.ascontiguousarray(values)
+        if values.dtype.byteorder == '>':
+            values = values.astype(values.dtype.newbyteorder('<'))
+        description = {'name': name, 'dtype': values.dtype.str, 'offset': offset, 'size': values.nbytes}
+        if name in columns.decimals:
+            description['decimals'] = columns.decimals[name]
+        if name in columns.dictionaries:
+            description['dictionary'] = columns.dictionaries[name]
+        descriptions.append(description)
+        buffers.append(memoryview(values).cast('B'))
+        if padding(values.nbytes):
+            buffers.append(bytes(padding(values.nbytes)))
+        offset += values.nbytes + padding(values.nbytes)
+
+    header = json.dumps({
+        'length': columns.length, 'constants': columns.constants, 'columns': descriptions, **metadata
+    }, separators=(',', ':')).encode()
+    header += b' ' * padding(len(MAGIC) + FRAME_PREFIX.size + len(header))
+    return [MAGIC + FRAME_PREFIX.pack(len(header), offset) + header, *buffers]
+
+
+def iter_bytes(frame):
+    """Yield the parts of a packed frame as bytes, the only type WSGI servers accept for a response body"""
+    for part in frame:
+        yield part if isinstance(part, bytes) else part.tobytes()
+
+
+def unpack(data):
+    """Decode every frame in packed bytes, yielding (header, {name: array}) with arrays viewing data"""
+    data = memoryview(data)
+    position = 0
+    while position < len(data):
+        if bytes(data[position:position + len(MAGIC)]) != MAGIC:
+            raise ValueError(f'No packed frame at byte {position}')
+        position += len(MAGIC)
+        header_length, body_length = FRAME_PREFIX.unpack_from(data, position)
+        position += FRAME_PREFIX.size
+        header = json.loads(bytes(data[position:position + header_length]))
+        position += header_length
+        columns = {
+            column['name']: np.frombuffer(
+                data, dtype=column['dtype'], count=column['size'] // np.dtype(column['dtype']).itemsize,
+                offset=position + column['offset']
+            )
+            for column in header['columns']
+        }
+        position += body_length
+        yield header, columns
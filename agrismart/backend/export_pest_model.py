@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Export the Keras pest model to NumPy weights for TensorFlow-free serving.
+
+Reads pest_model.h5 with h5py (installed alongside TensorFlow, but TensorFlow
+itself is not imported), writes pest_model.npz next to it, and checks that
+the NumPy backend reproduces the Keras outputs. load_models() prefers the
+.npz file when it exists, so serving workers never import TensorFlow.
+
+Without --check, only the exported archive is verified to reload and
+reproduce the in-memory NumPy model. --check compares against the Keras
+model itself and fails when TensorFlow is not installed, since the NumPy
+layers cannot be checked against themselves; tests/test_numpy_model.py
+checks them against naive loop implementations instead.
+
+Usage:
+    python export_pest_model.py
+    python export_pest_model.py --check --samples 16 --atol 1e-4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from numpy_model import SUPPORTED_LAYERS, NumpyModel
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'saved_Models')
+
+# Layer config keys needed at inference time
+LAYER_KEYS = ('activation', 'strides', 'padding', 'pool_size', 'units', 'filters', 'kernel_size', 'data_format')
+
+
+def read_keras_h5(path):
+    """Read the layer configs and weights of a Sequential model from a Keras .h5 file"""
+    import h5py
+
+    with h5py.File(path, 'r') as handle:
+        model_config = handle.attrs['model_config']
+        model_config = json.loads(model_config.decode('utf-8') if isinstance(model_config, bytes) else model_config)
+        if model_config['class_name'] != 'Sequential':
+            raise ValueError(f"Only Sequential models can be exported, found {model_config['class_name']}")
+
+        weights_group = handle['model_weights']
+        layers = []
+        weights = []
+        input_shape = None
+        for layer in model_config['config']['layers']:
+            kind = layer['class_name']
+            config = layer['config']
+            if kind == 'InputLayer':
+                input_shape = config.get('batch_shape') or config.get('batch_input_shape')
+                continue
+            if kind not in SUPPORTED_LAYERS:
+                raise ValueError(f"Unsupported layer type for NumPy export: {kind}")
+            if config.get('data_format', 'channels_last') != 'channels_last':
+                raise ValueError(f"Only channels_last layers can be exported: {config['name']}")
+            if input_shape is None:
+                input_shape = config.get('batch_shape') or config.get('batch_input_shape')
+
+            layer_group = weights_group[config['name']]
+            names = [name.decode('utf-8') if isinstance(name, bytes) else name for name in layer_group.attrs['weight_names']]
+            layers.append({'class_name': kind, 'name': config['name'], 'weights': len(names),
+                           **{key: config[key] for key in LAYER_KEYS if key in config}})
+            weights.append([np.asarray(layer_group[name], dtype=np.float32) for name in names])
+
+    if input_shape is None:
+        raise ValueError('Could not determine the model input shape')
+    return NumpyModel(layers, weights, input_shape)
+
+
+def sample_inputs(input_shape, samples, seed):
+    """Random inputs in [0, 1), the range of normalized image pixels"""
+    rng = np.random.default_rng(seed)
+    return rng.random((samples, *input_shape[1:]), dtype=np.float32)
+
+
+def main(argv=None):
+    """Export the pest model and check parity"""
+    parser = argparse.ArgumentParser(description='Export pest_model.h5 to NumPy weights')
+    parser.add_argument('--input', default=os.path.join(MODELS_DIR, 'pest_model.h5'))
+    parser.add_argument('--output', help='defaults to the input path with an .npz extension')
+    parser.add_argument('--check', action='store_true', help='compare outputs against the Keras model')
+    parser.add_argument('--samples', type=int, default=8, help='random inputs used for the parity check')
+    parser.add_argument('--atol', type=float, default=1e-4, help='allowed absolute output difference')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    output = args.output or os.path.splitext(args.input)[0] + '.npz'
+
+    model = read_keras_h5(args.input)
+    model.save(output)
+    print(f"✅ Exported {len(model.layers)} layers from {args.input} to {output}")
+
+    inputs = sample_inputs(model.input_shape, args.samples, args.seed)
+    expected = model.predict(inputs)
+    exported = NumpyModel.load(output)
+
+    started = time.perf_counter()
+    actual = exported.predict(inputs[:1])
+    print(f"Single-input NumPy inference: {(time.perf_counter() - started) * 1000:.2f} ms")
+    actual = exported.predict(inputs)
+
+    if args.check:
+        try:
+            from tensorflow.keras.models import load_model
+        except ImportError:
+            print("❌ TensorFlow is not installed, so the Keras parity check cannot run")
+            return 1
+        else:
+            expected = np.asarray(load_model(args.input).predict(inputs, verbose=0))
+
+    difference = float(np.abs(actual - expected).max())
+    if difference > args.atol:
+        print(f"❌ Outputs differ by up to {difference:.2e} (tolerance {args.atol:.0e})")
+        return 1
+    print(f"✅ Outputs match within {args.atol:.0e} (max difference {difference:.2e})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
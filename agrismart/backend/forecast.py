@@ -0,0 +1,120 @@
+"""
+Rolling-window forecasts over sequences of weather observations.
+
+A forecast request carries the hourly or daily observations of one field.
+Every observation is scored in one vectorized pass, then trailing-window
+aggregates (mean rainfall probability, total expected rainfall, mean and
+peak pest risk) are computed for each observation from strided window views.
+
+Each response ends with a small state object: the settings, the number of
+observations scored so far and the last window - 1 values of each scored
+series. Posting new observations together with that state scores only the
+new observations and continues the windows where the previous response
+stopped, with the same results as rescoring the whole sequence. The state
+travels with the client, so any worker can serve the next update.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from schemas import FORECAST_SCHEMA, ValidationError
+
+# Per-observation series carried in the forecast state
+SERIES = ('rainfallProbability', 'expectedAmount', 'pestRiskScore')
+
+# Trailing window length, in observations, when neither the request nor the state sets one
+DEFAULT_WINDOWS = {'hourly': 24, 'daily': 3}
+DEFAULT_INTERVAL = 'daily'
+
+MAX_FORECAST_OBSERVATIONS = 10000
+
+
+def trailing_windows(history, values, window, fill):
+    """Return one length-window row per value, covering the history tail and values up to that value"""
+    history = np.asarray(history, dtype=float)[max(len(history) - (window - 1), 0):]
+    padding = np.full(window - 1 - len(history), fill)
+    return sliding_window_view(np.concatenate([padding, history, values]), window)
+
+
+def rolling_aggregates(history, values, window, count):
+    """Trailing-window sums, means and maxima of new values following count earlier observations"""
+    sums = trailing_windows(history, values, window, 0.0).sum(axis=1)
+    maxima = trailing_windows(history, values, window, -np.inf).max(axis=1)
+    # Windows at the start of the sequence hold fewer than window observations
+    sizes = np.minimum(np.arange(count + 1, count + len(values) + 1), window)
+    return sums, sums / sizes, maxima
+
+
+def parse_state(state):
+    """Validate a forecast state returned by an earlier response"""
+    if not isinstance(state, dict):
+        raise ValidationError([{'field': 'state', 'message': 'must be a JSON object'}])
+
+    try:
+        _, crop_type, interval, window, seed = FORECAST_SCHEMA.validate(state)
+    except ValidationError as e:
+        raise ValidationError([{**error, 'field': f"state.{error['field']}"} for error in e.errors])
+    errors = [
+        {'field': f'state.{name}', 'message': 'is required'}
+        for name, value in (('cropType', crop_type), ('interval', interval), ('window', window), ('seed', seed))
+        if value is None
+    ]
+    count = state.get('count')
+    if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+        errors.append({'field': 'state.count', 'message': 'must be a non-negative integer'})
+    tail = state.get('tail')
+    if not isinstance(tail, dict):
+        errors.append({'field': 'state.tail', 'message': 'must be a JSON object'})
+    if errors:
+        raise ValidationError(errors)
+
+    history = {}
+    expected_length = min(count, window - 1)
+    for name in SERIES:
+        values = tail.get(name)
+        if (not isinstance(values, list) or len(values) != expected_length
+                or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values)):
+            errors.append({'field': f'state.tail.{name}', 'message': f'must be a list of {expected_length} numbers'})
+        else:
+            history[name] = np.array(values, dtype=float)
+    if errors:
+        raise ValidationError(errors)
+
+    return {'count': count, 'window': window, 'interval': interval, 'cropType': crop_type, 'seed': seed,
+            'history': history}
+
+
+def build_state(settings, count, history, series):
+    """Return the state continuing a forecast after its newest observation"""
+    window = settings['window']
+    tail = {}
+    for name in SERIES:
+        values = np.concatenate([history[name], series[name]]) if history else np.asarray(series[name], dtype=float)
+        tail[name] = values[len(values) - min(len(values), window - 1):].tolist()
+    return {
+        'count': count,
+        'window': window,
+        'interval': settings['interval'],
+        'cropType': settings['cropType'],
+        'seed': settings['seed'],
+        'tail': tail
+    }
+
+
+def resolve_settings(requested, state):
+    """Combine request settings with those of a continued forecast, rejecting conflicts"""
+    settings = {}
+    errors = []
+    defaults = {'cropType': 'wheat', 'interval': DEFAULT_INTERVAL, 'seed': 0}
+    for name in ('cropType', 'interval', 'seed', 'window'):
+        value = requested[name]
+        if state is not None:
+            if value is not None and value != state[name]:
+                errors.append({'field': name, 'message': f'must match the forecast state ({state[name]})'})
+            value = state[name]
+        if value is None:
+            value = DEFAULT_WINDOWS[settings['interval']] if name == 'window' else defaults[name]
+        settings[name] = value
+    if errors:
+        raise ValidationError(errors)
+    return settings
@@ -0,0 +1,399 @@
+"""
+Append-only prediction history for the AgriSmart prediction API.
+
+Every scored record is logged with its inputs, outputs, model version and
+time to a local SQLite file in WAL mode, shared by every worker on the host.
+Request handlers only put rows on a bounded in-process queue; a background
+thread writes them in batches, one transaction per batch. When the queue is
+full, rows are dropped and counted rather than blocking the request.
+
+Besides the raw rows, each record keeps a headline score and label (for
+example soilHealthScore and classification) next to its endpoint, field,
+crop and time. The crop is the one the scorer used, so requests that relied
+on the default crop are stored under it rather than without a crop. Covering
+indexes on those columns let /history page through records and compute
+time-bucketed aggregates without scanning the table. Rows become visible to
+queries after the writer's next flush, normally within flush_interval_ms.
+Listeners such as the analytics rollups run inside each write transaction,
+so they see every row exactly once.
+
+History is bounded: rows older than PREDICTION_HISTORY_RETENTION_DAYS and
+the oldest rows beyond PREDICTION_HISTORY_MAX_ROWS are deleted by the writer
+at most once per prune interval. Rollups built from them are kept.
+"""
+
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+# Headline score and label paths in each endpoint's result
+HEADLINES = {
+    'soil-health': (('soilHealthScore',), ('classification',)),
+    'crop-yield': (('predictedYield',), ('factors', 'overallRating')),
+    'pest-risk': (('riskScore',), ('riskLevel',)),
+    'rainfall': (('probability',), ('recommendation',)),
+    'field-report': (('soilHealth', 'soilHealthScore'), ('soilHealth', 'classification')),
+    'pest-image': (('confidence',), ('label',))
+}
+
+MAX_PAGE_SIZE = 1000
+MAX_BUCKETS = 10000
+
+# Seconds between retention passes of the writer
+PRUNE_INTERVAL = 60
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS history ('
+    'id INTEGER PRIMARY KEY, created REAL NOT NULL, endpoint TEXT NOT NULL, field_id TEXT, crop_type TEXT, '
+    'model_version TEXT, score REAL, label TEXT, inputs TEXT, outputs TEXT)',
+    # Each index covers the aggregate columns, so bucketed queries never read the table itself
+    'CREATE INDEX IF NOT EXISTS history_endpoint ON history (endpoint, created, score, label)',
+    'CREATE INDEX IF NOT EXISTS history_field ON history (field_id, endpoint, created, score, label)',
+    'CREATE INDEX IF NOT EXISTS history_crop ON history (crop_type, endpoint, created, score, label)',
+    'CREATE INDEX IF NOT EXISTS history_created ON history (created)'
+)
+
+
+def headline(result, path):
+    """Follow a key path into a result, returning None when it is missing"""
+    for key in path:
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+def record_key(record, *names):
+    """Return the first named value of a request record as a string, or None"""
+    if not isinstance(record, dict):
+        return None
+    for name in names:
+        value = record.get(name)
+        if isinstance(value, (str, int)) and not isinstance(value, bool):
+            return str(value)
+    return None
+
+
+class PredictionHistory:
+    """SQLite prediction log with a batched background writer and indexed queries"""
+
+    def __init__(self, path, max_queue=10000, batch_size=500, flush_interval_ms=200, retention_days=30,
+                 max_rows=1000000):
+        self.path = path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.pruned = 0
+        self._last_prune = None
+        self.listeners = []
+        self._schema = list(SCHEMA)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queue = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls):
+        """Create a history store configured by the PREDICTION_HISTORY* environment variables"""
+        kind = os.environ.get('PREDICTION_HISTORY', 'sqlite')
+        if kind == 'off':
+            return cls(None)
+        if kind != 'sqlite':
+            raise ValueError(f"Unknown PREDICTION_HISTORY backend: {kind}")
+
+        default_path = os.path.join(tempfile.gettempdir(), 'agrismart_prediction_history.sqlite3')
+        return cls(
+            os.environ.get('PREDICTION_HISTORY_PATH', default_path),
+            max_queue=int(os.environ.get('PREDICTION_HISTORY_MAX_QUEUE', 10000)),
+            batch_size=int(os.environ.get('PREDICTION_HISTORY_BATCH_SIZE', 500)),
+            flush_interval_ms=float(os.environ.get('PREDICTION_HISTORY_FLUSH_MS', 200)),
+            retention_days=float(os.environ.get('PREDICTION_HISTORY_RETENTION_DAYS', 30)),
+            max_rows=int(os.environ.get('PREDICTION_HISTORY_MAX_ROWS', 1000000))
+        )
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def _connection(self):
+        """Return a connection for the current thread and process"""
+        # Imported on first use, so processes with this store turned off never import sqlite3
+        import sqlite3
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in self._schema:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def add_listener(self, listener, schema=()):
+        """Call listener(connection, entries) inside every write transaction, creating its tables first
+
+        entries holds one (created, endpoint, field_id, crop_type, result) tuple per written row.
+        """
+        self._schema += list(schema)
+        self.listeners.append(listener)
+
+    def execute(self, sql, parameters=()):
+        """Run a read query on this thread's connection and return the cursor"""
+        return self._connection().execute(sql, parameters)
+
+    def record_many(self, endpoint, model_versions, records, results, crop_types=None):
+        """Queue scored records for writing without blocking; returns the number dropped
+
+        model_versions holds the version that scored each record, and crop_types the crop each record was
+        scored for, when it may differ from the one in the record.
+        """
+        if not self.enabled:
+            return 0
+        pending = self._ensure_writer()
+        created = time.time()
+        dropped = 0
+        for model_version, record, result, crop_type in zip(
+            model_versions, records, results, crop_types or [None] * len(records)
+        ):
+            if 'error' in result:
+                continue
+            try:
+                pending.put_nowait((created, endpoint, model_version, record, result, crop_type))
+            except queue.Full:
+                dropped += 1
+        if dropped:
+            with self._lock:
+                self.dropped += dropped
+        return dropped
+
+    def flush(self):
+        """Block until every queued row has been written"""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _ensure_writer(self):
+        """Start the writer thread, restarting it in forked worker processes"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue(self.max_queue)
+                    threading.Thread(target=self._run, args=(self._queue,), name='history-writer', daemon=True).start()
+                    self._pid = pid
+        return self._queue
+
+    def _run(self, pending):
+        """Collect queued rows into batches and write each batch in one transaction"""
+        max_wait = self.flush_interval_ms / 1000
+        while True:
+            batch = [pending.get()]
+            deadline = time.perf_counter() + max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Prediction history write failed, dropping {len(batch)} rows: {str(e)}")
+                with self._lock:
+                    self.write_errors += len(batch)
+            finally:
+                for _ in batch:
+                    pending.task_done()
+
+            try:
+                self._prune()
+            except Exception as e:
+                logger.error(f"Prediction history retention failed: {str(e)}")
+
+    def _write(self, batch):
+        rows = []
+        entries = []
+        for created, endpoint, model_version, record, result, crop_type in batch:
+            score_path, label_path = HEADLINES.get(endpoint, ((), ()))
+            score = headline(result, score_path) if score_path else None
+            label = headline(result, label_path) if label_path else None
+            field_id = record_key(record, 'fieldId', 'field_id')
+            if crop_type is None:
+                crop_type = record_key(record, 'cropType', 'crop_type')
+            crop_type = crop_type.lower() if crop_type is not None else None
+            rows.append((
+                created, endpoint, field_id, crop_type, model_version,
+                score if isinstance(score, (int, float)) else None, label if isinstance(label, str) else None,
+                jsoncodec.dumps(record), jsoncodec.dumps(result)
+            ))
+            entries.append((created, endpoint, field_id, crop_type, result))
+
+        connection = self._connection()
+        connection.execute('BEGIN')
+        try:
+            connection.executemany(
+                'INSERT INTO history (created, endpoint, field_id, crop_type, model_version, score, label, inputs, outputs) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            for listener in self.listeners:
+                listener(connection, entries)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        with self._lock:
+            self.written += len(rows)
+
+    def _prune(self, now=None):
+        """Delete rows past the retention period or the row cap, at most once per PRUNE_INTERVAL"""
+        now = time.time() if now is None else now
+        if self._last_prune is not None and now - self._last_prune < PRUNE_INTERVAL:
+            return 0
+        self._last_prune = now
+
+        connection = self._connection()
+        deleted = 0
+        if self.retention_days > 0:
+            deleted += connection.execute(
+                'DELETE FROM history WHERE created < ?', (now - self.retention_days * 86400,)
+            ).rowcount
+        if self.max_rows > 0:
+            # Rows are only ever appended, so the newest max_rows ids are the rows to keep
+            deleted += connection.execute(
+                'DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?', (self.max_rows,)
+            ).rowcount
+        with self._lock:
+            self.pruned += deleted
+        return deleted
+
+    def _filters(self, endpoint, field_id, crop_type, start, end):
+        clauses = ['endpoint = ?']
+        parameters = [endpoint]
+        if field_id is not None:
+            clauses.append('field_id = ?')
+            parameters.append(field_id)
+        if crop_type is not None:
+            clauses.append('crop_type = ?')
+            parameters.append(crop_type.lower())
+        if start is not None:
+            clauses.append('created >= ?')
+            parameters.append(start)
+        if end is not None:
+            clauses.append('created < ?')
+            parameters.append(end)
+        return clauses, parameters
+
+    def query(self, endpoint, field_id=None, crop_type=None, start=None, end=None, limit=100, cursor=None):
+        """Return up to limit records, newest first, and the cursor of the next page (or None)"""
+        clauses, parameters = self._filters(endpoint, field_id, crop_type, start, end)
+        if cursor is not None:
+            # Keyset pagination: continue strictly after the last (created, id) returned
+            created, row_id = cursor
+            clauses.append('(created < ? OR (created = ? AND id < ?))')
+            parameters += [created, created, row_id]
+
+        rows = self._connection().execute(
+            'SELECT id, created, endpoint, field_id, crop_type, model_version, inputs, outputs FROM history '
+            f"WHERE {' AND '.join(clauses)} ORDER BY created DESC, id DESC LIMIT ?",
+            (*parameters, limit + 1)
+        ).fetchall()
+
+        next_cursor = (rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [
+            {
+                'id': row_id,
+                'created': created,
+                'endpoint': row_endpoint,
+                'fieldId': row_field_id,
+                'cropType': row_crop_type,
+                'modelVersion': model_version,
+                'inputs': jsoncodec.loads(inputs),
+                'outputs': jsoncodec.loads(outputs)
+            }
+            for row_id, created, row_endpoint, row_field_id, row_crop_type, model_version, inputs, outputs
+            in rows[:limit]
+        ], next_cursor
+
+    def iter_rows(self, endpoint=None, field_id=None, crop_type=None, start=None, end=None, batch_size=1000):
+        """Yield raw history rows oldest first, fetching batch_size rows at a time"""
+        clauses, parameters = self._filters(endpoint, field_id, crop_type, start, end)
+        if endpoint is None:
+            clauses, parameters = clauses[1:], parameters[1:]
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        self._connection()
+        # A dedicated connection keeps the read snapshot independent of this thread's other queries
+        import sqlite3
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            cursor = connection.execute(
+                'SELECT id, created, endpoint, field_id, crop_type, model_version, score, label, inputs, outputs '
+                f'FROM history {where}ORDER BY id',
+                parameters
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            connection.close()
+
+    def aggregate(self, endpoint, bucket_seconds, field_id=None, crop_type=None, start=None, end=None):
+        """Return count, mean, min, max and label counts of the headline score per time bucket"""
+        clauses, parameters = self._filters(endpoint, field_id, crop_type, start, end)
+        where = ' AND '.join(clauses)
+        connection = self._connection()
+
+        buckets = {}
+        for bucket, count, mean, minimum, maximum in connection.execute(
+            f'SELECT CAST(created / ? AS INTEGER) AS bucket, COUNT(*), AVG(score), MIN(score), MAX(score) '
+            f'FROM history WHERE {where} GROUP BY bucket ORDER BY bucket LIMIT ?',
+            (bucket_seconds, *parameters, MAX_BUCKETS)
+        ):
+            buckets[bucket] = {
+                'start': bucket * bucket_seconds,
+                'count': count,
+                'mean': round(mean, 2) if mean is not None else None,
+                'min': minimum,
+                'max': maximum,
+                'labels': {}
+            }
+        for bucket, label, count in connection.execute(
+            f'SELECT CAST(created / ? AS INTEGER) AS bucket, label, COUNT(*) '
+            f'FROM history WHERE {where} AND label IS NOT NULL GROUP BY bucket, label',
+            (bucket_seconds, *parameters)
+        ):
+            if bucket in buckets:
+                buckets[bucket]['labels'][label] = count
+        return list(buckets.values())
+
+    def stats(self):
+        """Return configuration, queue state and write counters"""
+        if not self.enabled:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'path': self.path,
+            'queued': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+            'max_queue': self.max_queue,
+            'retention_days': self.retention_days,
+            'max_rows': self.max_rows,
+            'written': self.written,
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+            'pruned': self.pruned
+        }
@@ -0,0 +1,139 @@
+"""
+Image uploads and decoding for pest detection from photos.
+
+Uploads are read in fixed-size chunks. Each chunk updates a SHA-256 content
+hash and is written to a spooled temporary file, which moves to disk once it
+passes UPLOAD_SPOOL_BYTES, so a large photo is never held in memory whole.
+The content hash is the prediction cache key. A re-uploaded photo is
+therefore answered from the cache without being decoded at all.
+
+Photos that miss the cache are decoded and resized in a thread pool. Pillow
+releases the GIL while it decodes, so one request's photos decode in
+parallel. JPEG files are decoded at a reduced scale close to the model's
+input size instead of at full resolution. Pixels are scaled to [0, 1] with
+the usual Keras 1/255 rescaling. Pillow is imported by the first decode, so
+workers that never receive a photo do not pay for importing it.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MAX_IMAGES_PER_REQUEST = 32
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+# Uploads larger than this are spooled to a temporary file instead of memory
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+UPLOAD_READ_SIZE = 64 * 1024
+
+TOP_PREDICTIONS = 3
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload exceeds MAX_IMAGE_BYTES"""
+
+
+def hash_upload(stream, spool=True):
+    """Hash an upload in chunks, returning its SHA-256 hex digest, size and a rewound file
+
+    With spool=False the stream must be seekable and is returned rewound instead of copied.
+    """
+    digest = hashlib.sha256()
+    file = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES) if spool else stream
+    size = 0
+    while True:
+        chunk = stream.read(UPLOAD_READ_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_IMAGE_BYTES:
+            raise ImageTooLarge(f'image is larger than {MAX_IMAGE_BYTES // (1024 * 1024)} MB')
+        digest.update(chunk)
+        if spool:
+            file.write(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size, file
+
+
+def decode_image(file, size):
+    """Decode an image file into a (height, width, 3) float32 array of the given (width, height) in [0, 1]"""
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(file) as image:
+            # JPEG decoders can scale down by 1/2, 1/4 or 1/8 while decoding, which skips most of the work
+            image.draft('RGB', size)
+            image = ImageOps.exif_transpose(image).convert('RGB').resize(size, Image.BILINEAR)
+    except Image.DecompressionBombError:
+        raise ValueError('image has too many pixels')
+    except (OSError, SyntaxError):
+        raise ValueError('file is not a supported image')
+    return np.asarray(image, dtype=np.float32) / 255
+
+
+def load_class_names(path, count):
+    """Read the model's class names from a JSON list, or name classes by index when the file is missing"""
+    try:
+        with open(path) as handle:
+            names = json.load(handle)
+    except FileNotFoundError:
+        names = []
+    if not isinstance(names, list) or len(names) != count:
+        return [f'class-{index}' for index in range(count)]
+    return [str(name) for name in names]
+
+
+def top_predictions(probabilities, class_names, count=TOP_PREDICTIONS):
+    """Return the most likely classes of each row as label and confidence (0-100) pairs"""
+    probabilities = np.asarray(probabilities, dtype=float)
+    order = np.argsort(-probabilities, axis=1, kind='stable')[:, :count]
+    return [
+        [{'label': class_names[index], 'confidence': round(confidence * 100, 1)}
+         for index, confidence in zip(row, probabilities[position, row].tolist())]
+        for position, row in enumerate(order.tolist())
+    ]
+
+
+class ImageDecoder:
+    """Thread pool decoding and resizing uploaded images"""
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Create a decoder with IMAGE_DECODE_WORKERS threads"""
+        return cls(int(os.environ.get('IMAGE_DECODE_WORKERS', min(4, os.cpu_count() or 1))))
+
+    @property
+    def available(self):
+        """Whether Pillow is installed"""
+        return importlib.util.find_spec('PIL') is not None
+
+    def decode_many(self, files, size):
+        """Decode files in parallel, returning an array or the ValueError raised for each file"""
+        return list(self._ensure_executor().map(lambda file: self._decode(file, size), files))
+
+    def _decode(self, file, size):
+        try:
+            return decode_image(file, size)
+        except ValueError as e:
+            return e
+
+    def _ensure_executor(self):
+        """Start the thread pool, restarting it in forked worker processes"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-decode')
+                    self._pid = pid
+        return self._executor
@@ -0,0 +1,55 @@
+"""
+JSON encoding and decoding for the AgriSmart API.
+
+Uses orjson when it is installed, falling back to the standard library json
+module. Set FAST_JSON=0 to force the standard library. Output is compact with
+sorted keys either way, matching the key order of Flask's default jsonify.
+"""
+
+import json
+import os
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.environ.get('FAST_JSON', '1') == '0':
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def loads(data):
+    """Parse a JSON document from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value):
+    """Serialize a value to a compact JSON string"""
+    if orjson is not None:
+        return orjson.dumps(value, option=ORJSON_OPTIONS).decode('utf-8')
+    return json.dumps(value, separators=(',', ':'), sort_keys=True)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify and request.get_json"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+
+def install(app):
+    """Use the fast JSON backend for a Flask app when one is available"""
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
@@ -0,0 +1,189 @@
+"""
+In-process metrics for the AgriSmart prediction API.
+
+Counters, gauges and histograms keyed by label values, rendered in the
+Prometheus text exposition format by the /metrics endpoint.
+
+Metrics are kept per process. Under gunicorn (serve.py) each scrape of
+/metrics is answered by whichever worker accepts it and reports only that
+worker's values, so every sample carries a pid label naming the worker.
+Series from different workers therefore never overwrite each other, and
+queries aggregate them, e.g. sum without (pid) (rate(agrismart_requests_total[5m])).
+A restarted worker starts new series under its new pid. Every worker is
+only seen once scrapes have reached it, which with several scrapes per
+minute happens within a few scrape intervals.
+"""
+
+import bisect
+import threading
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Thread-safe histogram with cumulative buckets"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Return cumulative bucket counts, total count and sum"""
+        with self._lock:
+            counts = list(self._counts)
+            count = self._count
+            total = self._sum
+
+        buckets = {}
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        buckets['+Inf'] = count
+
+        return {'buckets': buckets, 'count': count, 'sum': round(total, 6)}
+
+
+class Counter:
+    """Monotonic value"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class Metric:
+    """A named family of labelled counters, gauges or histograms"""
+
+    def __init__(self, kind, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the child metric for a set of label values"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == 'histogram' else (
+                        Gauge() if self.kind == 'gauge' else Counter()
+                    )
+                    self._children[values] = child
+        return child
+
+    def render(self):
+        """Render the family in the Prometheus text format"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == 'histogram':
+                lines.extend(format_histogram(self.name, labels, child.snapshot()))
+            else:
+                lines.append(format_sample(self.name, labels, child.value))
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Metric('counter', name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Metric('gauge', name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Metric('histogram', name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Render every registered family as a list of lines"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return lines
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+def format_labels(labels):
+    """Format a label dict as {name="value",...}"""
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def escape_label_value(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_sample(name, labels, value):
+    """Format one sample line"""
+    value = float(value)
+    return f'{name}{format_labels(labels)} {int(value) if value.is_integer() else repr(value)}'
+
+
+def add_labels(lines, labels):
+    """Add labels to every sample of rendered lines, such as the pid label of the reporting process"""
+    added = format_labels(labels)[1:-1]
+    labelled = []
+    for line in lines:
+        if not line.startswith('#'):
+            # Metric names contain neither braces nor spaces, so the first of either ends the name
+            end = min(index for index in (line.find('{'), line.find(' ')) if index >= 0)
+            if line[end] == '{':
+                line = f'{line[:end + 1]}{added},{line[end + 1:]}'
+            else:
+                line = f'{line[:end]}{{{added}}}{line[end:]}'
+        labelled.append(line)
+    return labelled
+
+
+def format_histogram(name, labels, snapshot):
+    """Format a Histogram snapshot as _bucket, _sum and _count lines"""
+    lines = [
+        format_sample(f'{name}_bucket', {**labels, 'le': bound}, count)
+        for bound, count in snapshot['buckets'].items()
+    ]
+    lines.append(format_sample(f'{name}_sum', labels, snapshot['sum']))
+    lines.append(format_sample(f'{name}_count', labels, snapshot['count']))
+    return lines
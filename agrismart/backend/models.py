@@ -0,0 +1,474 @@
+"""
+Model registry for the AgriSmart prediction API.
+
+Each model is loaded in its own background thread, either on first use or
+when load_all() is called, so slow loads (TensorFlow in particular) never
+block a worker from serving fallback-backed routes. Loader imports are
+deferred until the model is actually loaded.
+
+Models are reloaded without a restart. A watcher thread polls the model
+files every MODEL_WATCH_INTERVAL seconds, and reload() can also be called
+directly. A reload loads the new file in the background, warms it with a
+few synthetic predictions and then swaps it in with a single reference
+assignment; requests already holding the previous model finish with it.
+With shadow=True the new version is kept beside the current one instead:
+shadow_compare() runs it on a sample of live batches in a background
+thread, recording its latency and output drift, until promote() swaps it in.
+"""
+
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from startup import rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# Model load states
+PENDING = 'pending'
+LOADING = 'loading'
+LOADED = 'loaded'
+MISSING = 'missing'
+UNAVAILABLE = 'unavailable'
+FAILED = 'failed'
+
+SETTLED_STATES = (LOADED, MISSING, UNAVAILABLE, FAILED)
+
+WARMUP_ROWS = 4
+
+# Shadow batches allowed to wait for the shadow thread before new samples are skipped
+MAX_PENDING_SHADOW = 8
+
+# Bytes read at a time when hashing a model file
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Content hash of each model file, keyed by path, with the stat signature it was computed for
+_file_hashes = {}
+
+# A loaded model version; swapped as a whole so its model and version always match
+LoadedModel = namedtuple(
+    'LoadedModel', ['model', 'version', 'filename', 'load_seconds', 'warmup_seconds', 'load_memory_bytes']
+)
+
+
+def load_joblib_model(path):
+    """Load a scikit-learn model saved with joblib, memory-mapping its arrays"""
+    import joblib
+    # Memory-mapped arrays live in the OS page cache, so every worker process
+    # on the host shares one copy. Set MODEL_MMAP_MODE=none to load into the heap.
+    # Compressed joblib files cannot be mapped and are loaded normally.
+    mmap_mode = os.environ.get('MODEL_MMAP_MODE', 'r')
+    return joblib.load(path, mmap_mode=None if mmap_mode == 'none' else mmap_mode)
+
+
+def load_keras_model(path):
+    """Load a Keras model, importing TensorFlow only when it is needed"""
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+def load_numpy_model(path):
+    """Load a Keras model exported to NumPy weights by export_pest_model.py"""
+    from numpy_model import NumpyModel
+    return NumpyModel.load(path)
+
+
+def get_file_version(path):
+    """Identify a model file by a short hash of its contents
+
+    The hash is only recomputed when the file's inode, size or nanosecond modification time changes, so
+    polling for changes costs one stat per file and an unchanged file that is touched keeps its version.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.blake2b(digest_size=6)
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    version = digest.hexdigest()
+    _file_hashes[path] = (signature, version)
+    return version
+
+
+def warm_up(model, rows=WARMUP_ROWS):
+    """Run a few synthetic predictions so the first real request does not pay for lazy initialization"""
+    input_shape = getattr(model, 'input_shape', None)
+    if input_shape is not None:
+        inputs = np.random.default_rng(0).random((rows, *input_shape[1:]), dtype=np.float32)
+    elif getattr(model, 'n_features_in_', None) is not None:
+        inputs = np.random.default_rng(0).normal(size=(rows, model.n_features_in_))
+    else:
+        return
+    model.predict(inputs)
+
+
+class ModelEntry:
+    """Load state of one registered model"""
+
+    def __init__(self, name, candidates):
+        self.name = name
+        # (filename, loader) pairs in order of preference
+        self.candidates = candidates
+        self.current = None
+        self.shadow = None
+        self.state = PENDING
+        self.error = None
+        self.thread = None
+        self.pid = None
+        self.reloading = False
+        self.reloads = 0
+        self.reload_error = None
+        self.failed_version = None
+        self.shadow_stats = None
+
+    @property
+    def model(self):
+        current = self.current
+        return current.model if current is not None else None
+
+    @property
+    def version(self):
+        current = self.current
+        return current.version if current is not None else None
+
+
+class ModelRegistry:
+    """Registry of models loaded lazily and in parallel, and reloaded when their files change"""
+
+    def __init__(self, models_dir, fallback_only=False, watch_interval=0.0, reload_mode='swap', shadow_sample=0.1):
+        self.models_dir = models_dir
+        # When set, get() reports every model as unavailable so routes use the rule-based fallbacks
+        self.fallback_only = fallback_only
+        self.watch_interval = watch_interval
+        # 'swap' replaces a changed model once it is warm; 'shadow' keeps it beside the current one
+        self.reload_mode = reload_mode
+        self.shadow_sample = shadow_sample
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._watch_pid = None
+        self._shadow_executor = None
+        self._shadow_pid = None
+        self._shadow_pending = 0
+
+    @classmethod
+    def from_env(cls, models_dir):
+        """Create a registry configured by FALLBACK_ONLY and the MODEL_* reload variables"""
+        return cls(
+            models_dir,
+            fallback_only=os.environ.get('FALLBACK_ONLY', '0') == '1',
+            watch_interval=float(os.environ.get('MODEL_WATCH_INTERVAL', 10)),
+            reload_mode=os.environ.get('MODEL_RELOAD_MODE', 'swap'),
+            shadow_sample=float(os.environ.get('MODEL_SHADOW_SAMPLE', 0.1))
+        )
+
+    def register(self, name, filename, loader, alternatives=()):
+        """Register a model file and its loader, plus (filename, loader) alternatives tried if it is missing"""
+        self._entries[name] = ModelEntry(name, [(filename, loader), *alternatives])
+
+    def get(self, name):
+        """Return a loaded model, or None while it is loading or unavailable"""
+        return self.get_versioned(name)[0]
+
+    def get_versioned(self, name):
+        """Return a loaded model and its version from one snapshot, or (None, None)"""
+        if self.fallback_only:
+            return None, None
+        if self._watch_pid != os.getpid():
+            self._ensure_watcher()
+        entry = self._entries[name]
+        if entry.state == PENDING or (entry.state == LOADING and entry.pid != os.getpid()):
+            self.start(name)
+        current = entry.current
+        return (current.model, current.version) if current is not None else (None, None)
+
+    def version(self, name):
+        """Return the version of a loaded model"""
+        return self._entries[name].version
+
+    def start(self, name):
+        """Start loading a model in a background thread if it is not loading already"""
+        entry = self._entries[name]
+        with self._lock:
+            # A load thread started before a fork does not exist in this process
+            if entry.state == LOADING and entry.pid != os.getpid():
+                entry.state = PENDING
+            if entry.state != PENDING:
+                return
+            entry.state = LOADING
+            entry.pid = os.getpid()
+            entry.thread = threading.Thread(target=self._load, args=(entry,), name=f'load-{name}', daemon=True)
+            entry.thread.start()
+
+    def reload(self, name, shadow=None):
+        """Load a model's current file in the background and swap it in (or hold it as a shadow) once warm
+
+        Returns False when the model is not loaded yet or a reload is already running.
+        """
+        entry = self._entries[name]
+        shadow = self.reload_mode == 'shadow' if shadow is None else shadow
+        with self._lock:
+            if entry.state != LOADED or entry.reloading:
+                return False
+            entry.reloading = True
+        threading.Thread(target=self._reload, args=(entry, shadow), name=f'reload-{name}', daemon=True).start()
+        return True
+
+    def promote(self, name):
+        """Swap a model's shadow version in as the current one; returns False without a shadow"""
+        entry = self._entries[name]
+        with self._lock:
+            shadow = entry.shadow
+            if shadow is None:
+                return False
+            entry.current = shadow
+            entry.shadow = None
+            entry.reloads += 1
+        logger.info(f"{name} promoted to version {shadow.version}")
+        return True
+
+    def check_for_updates(self):
+        """Reload models whose preferred file changed and start loading models whose file appeared"""
+        for name, entry in self._entries.items():
+            located = self._locate(entry)
+            if located is None:
+                continue
+            filename, _, path = located
+            version = get_file_version(path)
+            # Retry models whose file appeared, or changed since it failed to load
+            if entry.state == MISSING or (entry.state == FAILED and version != entry.failed_version):
+                with self._lock:
+                    entry.state = PENDING
+                self.start(name)
+            elif entry.state == LOADED and not entry.reloading:
+                known = {loaded.version for loaded in (entry.current, entry.shadow) if loaded is not None}
+                changed = version not in known or filename != entry.current.filename
+                # A file that failed to reload is retried only once it changes again
+                if changed and version != entry.failed_version:
+                    logger.info(f"{name} changed on disk ({filename} {version}), reloading")
+                    self.reload(name)
+
+    def shadow_compare(self, name, features, outputs, primary_seconds, predict):
+        """Score a sample of live batches with a model's shadow version in the background
+
+        predict(model, features) must return outputs shaped like the current model's outputs.
+        """
+        entry = self._entries[name]
+        shadow = entry.shadow
+        if shadow is None or random.random() >= self.shadow_sample:
+            return
+        with self._lock:
+            if self._shadow_pid != os.getpid():
+                self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+                self._shadow_pid = os.getpid()
+                self._shadow_pending = 0
+            if self._shadow_pending >= MAX_PENDING_SHADOW:
+                return
+            self._shadow_pending += 1
+        self._shadow_executor.submit(self._run_shadow, entry, shadow, features, outputs, primary_seconds, predict)
+
+    def load_all(self, wait=False, timeout=None):
+        """Start loading every registered model in parallel, optionally waiting for them"""
+        if self.fallback_only:
+            return
+        self._ensure_watcher()
+        for name in self._entries:
+            self.start(name)
+        if wait:
+            self.wait(timeout)
+
+    def wait(self, timeout=None):
+        """Wait for in-progress loads to finish"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for entry in self._entries.values():
+            if entry.thread is not None:
+                entry.thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def is_ready(self):
+        """Return True once every model has finished loading or failed to load"""
+        if self.fallback_only:
+            return True
+        return all(entry.state in SETTLED_STATES for entry in self._entries.values())
+
+    def status(self):
+        """Return the load state, load time and version of every model, with reload and shadow state"""
+        status = {}
+        for name, entry in self._entries.items():
+            current = entry.current
+            shadow = entry.shadow
+            status[name] = {
+                'state': entry.state,
+                'load_seconds': current.load_seconds if current is not None else None,
+                'warmup_seconds': current.warmup_seconds if current is not None else None,
+                'load_memory_bytes': current.load_memory_bytes if current is not None else None,
+                'version': current.version if current is not None else None,
+                'file': current.filename if current is not None else None,
+                'error': entry.error,
+                'reloading': entry.reloading,
+                'reloads': entry.reloads,
+                'reload_error': entry.reload_error,
+                'shadow': None if shadow is None else {
+                    'version': shadow.version,
+                    'file': shadow.filename,
+                    **self._shadow_summary(entry.shadow_stats)
+                }
+            }
+        return status
+
+    def _ensure_watcher(self):
+        """Start the file watcher thread, restarting it in forked worker processes"""
+        pid = os.getpid()
+        with self._lock:
+            if self._watch_pid == pid:
+                return
+            self._watch_pid = pid
+        if self.watch_interval > 0 and not self.fallback_only:
+            threading.Thread(target=self._watch, name='model-watcher', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                self.check_for_updates()
+            except Exception as e:
+                logger.error(f"Model watcher failed: {str(e)}")
+
+    def _locate(self, entry):
+        """Return the (filename, loader, path) of a model's preferred existing file, or None"""
+        for filename, loader in entry.candidates:
+            path = os.path.join(self.models_dir, filename)
+            if os.path.exists(path):
+                return filename, loader, path
+        return None
+
+    def _load_version(self, entry):
+        """Load and warm a model's preferred file, returning a LoadedModel or None when no file exists"""
+        located = self._locate(entry)
+        if located is None:
+            return None
+        filename, loader, path = located
+        version = get_file_version(path)
+
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        model = loader(path)
+        load_seconds = round(time.perf_counter() - started, 3)
+        # Process RSS growth, including the loader's first imports; models loading in parallel overlap
+        rss_after = rss_bytes()
+        load_memory_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+
+        started = time.perf_counter()
+        warm_up(model)
+        warmup_seconds = round(time.perf_counter() - started, 3)
+        return LoadedModel(model, version, filename, load_seconds, warmup_seconds, load_memory_bytes)
+
+    def _load(self, entry):
+        """Load one model and record its state"""
+        try:
+            loaded = self._load_version(entry)
+        except ImportError as e:
+            logger.warning(f"{entry.name} dependencies not available - using fallback predictions: {str(e)}")
+            entry.error = str(e)
+            entry.state = UNAVAILABLE
+            return
+        except Exception as e:
+            logger.error(f"Error loading {entry.name}: {str(e)}")
+            located = self._locate(entry)
+            entry.failed_version = get_file_version(located[2]) if located is not None else None
+            entry.error = str(e)
+            entry.state = FAILED
+            return
+
+        if loaded is None:
+            paths = ', '.join(os.path.join(self.models_dir, filename) for filename, _ in entry.candidates)
+            logger.warning(f"{entry.name} not found at {paths}")
+            entry.state = MISSING
+            return
+
+        entry.current = loaded
+        entry.error = None
+        entry.state = LOADED
+        logger.info(f"{entry.name} loaded from {loaded.filename} in {loaded.load_seconds}s")
+
+    def _reload(self, entry, shadow):
+        """Load a new version of a loaded model, keeping the current one if anything fails"""
+        try:
+            loaded = self._load_version(entry)
+            if loaded is None:
+                raise FileNotFoundError(f"{entry.name} file disappeared during reload")
+        except Exception as e:
+            logger.error(f"Error reloading {entry.name}, keeping version {entry.version}: {str(e)}")
+            located = self._locate(entry)
+            entry.failed_version = get_file_version(located[2]) if located is not None else None
+            entry.reload_error = str(e)
+            entry.reloading = False
+            return
+
+        with self._lock:
+            if shadow:
+                entry.shadow_stats = {
+                    'batches': 0, 'rows': 0, 'values': 0, 'errors': 0, 'primary_seconds': 0.0,
+                    'shadow_seconds': 0.0, 'drift_total': 0.0, 'drift_max': 0.0
+                }
+                entry.shadow = loaded
+            else:
+                # One reference assignment; in-flight requests keep using the model they already hold
+                entry.current = loaded
+                entry.reloads += 1
+            entry.reload_error = None
+            entry.reloading = False
+        logger.info(
+            f"{entry.name} version {loaded.version} loaded from {loaded.filename} in {loaded.load_seconds}s "
+            f"(warm-up {loaded.warmup_seconds}s), {'shadowing' if shadow else 'now serving'}"
+        )
+
+    def _run_shadow(self, entry, shadow, features, outputs, primary_seconds, predict):
+        try:
+            started = time.perf_counter()
+            shadow_outputs = np.asarray(predict(shadow.model, features), dtype=float)
+            shadow_seconds = time.perf_counter() - started
+            drift = np.abs(shadow_outputs - np.asarray(outputs, dtype=float))
+            with self._lock:
+                stats = entry.shadow_stats
+                if entry.shadow is shadow and stats is not None:
+                    stats['batches'] += 1
+                    stats['rows'] += len(features)
+                    stats['values'] += drift.size
+                    stats['primary_seconds'] += primary_seconds
+                    stats['shadow_seconds'] += shadow_seconds
+                    stats['drift_total'] += float(drift.sum())
+                    stats['drift_max'] = max(stats['drift_max'], float(drift.max()) if drift.size else 0.0)
+        except Exception as e:
+            logger.warning(f"Shadow scoring failed for {entry.name}: {str(e)}")
+            with self._lock:
+                if entry.shadow is shadow and entry.shadow_stats is not None:
+                    entry.shadow_stats['errors'] += 1
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    @staticmethod
+    def _shadow_summary(stats):
+        """Mean latencies and output drift of the shadow version against the current one"""
+        if not stats or not stats['batches']:
+            return {'batches': 0, 'rows': 0, 'errors': stats['errors'] if stats else 0}
+        batches = stats['batches']
+        return {
+            'batches': batches,
+            'rows': stats['rows'],
+            'errors': stats['errors'],
+            'primary_ms_mean': round(stats['primary_seconds'] / batches * 1000, 3),
+            'shadow_ms_mean': round(stats['shadow_seconds'] / batches * 1000, 3),
+            'drift_mean': round(stats['drift_total'] / max(stats['values'], 1), 6),
+            'drift_max': round(stats['drift_max'], 6)
+        }
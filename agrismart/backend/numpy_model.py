@@ -0,0 +1,121 @@
+"""
+NumPy inference backend for small Keras Sequential models.
+
+export_pest_model.py converts a Keras .h5 file once into an .npz archive of
+layer configs and weight arrays. NumpyModel evaluates that archive with plain
+NumPy (convolutions as im2col matrix products), so serving workers get the
+same predictions without importing TensorFlow.
+"""
+
+import json
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+SUPPORTED_LAYERS = (
+    'Conv2D', 'MaxPooling2D', 'GlobalAveragePooling2D', 'GlobalMaxPooling2D',
+    'Flatten', 'Dense', 'Dropout', 'Activation'
+)
+
+
+def softmax(x):
+    exponentials = np.exp(x - x.max(axis=-1, keepdims=True))
+    return exponentials / exponentials.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+    'softmax': softmax
+}
+
+
+def windows(x, size, strides, padding, fill=0):
+    """Return (N, H', W', C, kh, kw) sliding windows over an NHWC batch"""
+    if padding == 'same':
+        # As in TensorFlow, the smaller half of the padding goes before the data and the rest after it
+        pads = []
+        for dim, kernel, stride in zip(x.shape[1:3], size, strides):
+            out = -(-dim // stride)
+            total = max((out - 1) * stride + kernel - dim, 0)
+            pads.append((total // 2, total - total // 2))
+        x = np.pad(x, [(0, 0), pads[0], pads[1], (0, 0)], constant_values=fill)
+    return sliding_window_view(x, size, axis=(1, 2))[:, ::strides[0], ::strides[1]]
+
+
+def conv2d(x, kernel, bias, strides, padding):
+    """2D convolution (cross-correlation, as in Keras) of an NHWC batch"""
+    patches = windows(x, kernel.shape[:2], strides, padding)
+    # Patch axes are (C, kh, kw); reorder the (kh, kw, C, F) kernel to match
+    return np.tensordot(patches, kernel.transpose(2, 0, 1, 3), axes=3) + bias
+
+
+def max_pool2d(x, size, strides, padding):
+    """Max pooling of an NHWC batch"""
+    if padding == 'valid' and tuple(size) == tuple(strides):
+        # Non-overlapping windows reduce to a reshape
+        n, h, w, c = x.shape
+        ph, pw = size
+        x = x[:, :h - h % ph, :w - w % pw]
+        return x.reshape(n, h // ph, ph, w // pw, pw, c).max(axis=(2, 4))
+    # Padding never wins the maximum
+    return windows(x, size, strides, padding, fill=-np.inf).max(axis=(4, 5))
+
+
+class NumpyModel:
+    """Keras Sequential model evaluated with NumPy"""
+
+    def __init__(self, layers, weights, input_shape):
+        self.layers = layers
+        self.weights = weights
+        self.input_shape = tuple(input_shape)
+
+    @classmethod
+    def load(cls, path):
+        """Load a model exported by export_pest_model.py"""
+        with np.load(path, allow_pickle=False) as archive:
+            config = json.loads(str(archive['config']))
+            weights = [
+                [archive[f'{index}/{position}'] for position in range(layer['weights'])]
+                for index, layer in enumerate(config['layers'])
+            ]
+        return cls(config['layers'], weights, config['input_shape'])
+
+    def save(self, path):
+        """Write the layer configs and weights to an .npz archive"""
+        arrays = {
+            f'{index}/{position}': weight
+            for index, layer_weights in enumerate(self.weights) for position, weight in enumerate(layer_weights)
+        }
+        config = {'input_shape': list(self.input_shape), 'layers': self.layers}
+        np.savez(path, config=np.array(json.dumps(config)), **arrays)
+
+    def predict(self, x, verbose=0):
+        """Run a forward pass over a batch, returning float32 outputs"""
+        x = np.asarray(x, dtype=np.float32)
+        for layer, weights in zip(self.layers, self.weights):
+            x = self._apply(layer, weights, x)
+        return x
+
+    def _apply(self, layer, weights, x):
+        kind = layer['class_name']
+        if kind == 'Conv2D':
+            x = conv2d(x, weights[0], weights[1] if len(weights) > 1 else 0, layer['strides'], layer['padding'])
+        elif kind == 'MaxPooling2D':
+            return max_pool2d(x, layer['pool_size'], layer['strides'], layer['padding'])
+        elif kind == 'GlobalAveragePooling2D':
+            return x.mean(axis=(1, 2))
+        elif kind == 'GlobalMaxPooling2D':
+            return x.max(axis=(1, 2))
+        elif kind == 'Flatten':
+            return x.reshape(len(x), -1)
+        elif kind == 'Dense':
+            x = x @ weights[0]
+            if len(weights) > 1:
+                x = x + weights[1]
+        elif kind == 'Dropout':
+            # Dropout is inactive at inference time
+            return x
+        return ACTIVATIONS[layer.get('activation', 'linear')](x)
@@ -0,0 +1,58 @@
+"""
+Composable prediction pipeline for the AgriSmart API.
+
+A Pipeline is a set of named stages, each computed from the outputs of other
+stages. Running it for a chunk of inputs computes only the stages that the
+requested outputs depend on, each exactly once, so responses that share
+intermediate results (the soil scores behind both the soil health and crop
+yield responses, for example) pay for them once. Any stage can be seeded with
+a precomputed value to enter the pipeline part way through.
+"""
+
+from contextlib import nullcontext
+
+
+class Stage:
+    """One named step of a pipeline"""
+
+    def __init__(self, name, fn, inputs, timing):
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+        self.timing = timing
+
+
+class Pipeline:
+    """Dependency-resolved set of named prediction stages"""
+
+    def __init__(self, timer=None):
+        self.stages = {}
+        self.timer = timer
+
+    def stage(self, name, inputs=(), timing=None):
+        """Register the decorated function as a stage computed from the named inputs"""
+        def register(fn):
+            self.stages[name] = Stage(name, fn, tuple(inputs), timing)
+            return fn
+        return register
+
+    def run(self, values, outputs):
+        """Compute the requested outputs from seed values, running each needed stage once"""
+        values = dict(values)
+        for output in outputs:
+            self._resolve(output, values, ())
+        return {output: values[output] for output in outputs}
+
+    def _resolve(self, name, values, path):
+        if name in values:
+            return values[name]
+        stage = self.stages.get(name)
+        if stage is None:
+            raise KeyError(f"No pipeline stage or seed value named '{name}'")
+        if name in path:
+            raise ValueError(f"Cycle in pipeline stages: {' -> '.join(path + (name,))}")
+
+        args = [self._resolve(dependency, values, path + (name,)) for dependency in stage.inputs]
+        with self.timer(stage.timing) if self.timer and stage.timing else nullcontext():
+            values[name] = stage.fn(*args)
+        return values[name]
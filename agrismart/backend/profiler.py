@@ -0,0 +1,102 @@
+"""
+Sampling profiler for the AgriSmart prediction API.
+
+While running, a background thread snapshots the stacks of every other thread
+at a fixed interval and counts identical stacks. The collapsed output
+("frame;frame;frame count" per line) can be fed straight into flamegraph
+tools. Sampling only reads frames, so the profiled code runs unmodified.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Bound on distinct stacks kept, so a long run cannot grow without limit
+MAX_STACKS = 10000
+
+# Shortest sampling interval; shorter ones would keep the sampler thread busy and slow every request
+MIN_INTERVAL_MS = 1.0
+
+
+class SamplingProfiler:
+    """Runtime-toggleable stack sampling profiler"""
+
+    def __init__(self):
+        self.interval_ms = None
+        self.samples = 0
+        self.started_at = None
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=5.0):
+        """Start sampling, discarding previous samples"""
+        if not interval_ms >= MIN_INTERVAL_MS:
+            raise ValueError(f'intervalMs must be at least {MIN_INTERVAL_MS:g}')
+        self.stop()
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self.interval_ms = interval_ms
+        self.started_at = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling, keeping the collected samples"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def snapshot(self, limit=50):
+        """Return the most frequent stacks and functions"""
+        with self._lock:
+            stacks = self._stacks.most_common()
+            samples = self.samples
+
+        functions = Counter()
+        for stack, count in stacks:
+            functions[stack.rpartition(';')[2]] += count
+
+        return {
+            'running': self.running,
+            'interval_ms': self.interval_ms,
+            'samples': samples,
+            'started_at': self.started_at,
+            'top_functions': [
+                {'function': function, 'samples': count, 'share': round(count / samples, 4) if samples else 0.0}
+                for function, count in functions.most_common(limit)
+            ],
+            'collapsed': [f'{stack} {count}' for stack, count in stacks[:limit]]
+        }
+
+    def _run(self, stop):
+        own_thread = threading.get_ident()
+        interval = self.interval_ms / 1000
+        while not stop.wait(interval):
+            frames = sys._current_frames()
+            collected = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                collected.append(';'.join(reversed(stack)))
+
+            with self._lock:
+                self.samples += 1
+                for stack in collected:
+                    if stack in self._stacks or len(self._stacks) < MAX_STACKS:
+                        self._stacks[stack] += 1
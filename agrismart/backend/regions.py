@@ -0,0 +1,116 @@
+"""
+Grid-cell aggregation of field scores for region maps.
+
+A region request holds thousands of georeferenced fields. Each field falls
+into a square grid cell of cellSize degrees (or a cell named by the client),
+all fields are scored in one vectorized pass, and the per-field scores are
+reduced per cell with grouped NumPy operations: a single sort serves every
+percentile of every cell, and one bincount each for means and label counts.
+"""
+
+import math
+
+import numpy as np
+
+from schemas import REGION_WEATHER_DEFAULTS, REGION_WEATHER_SCHEMA, ValidationError
+
+DEFAULT_PERCENTILES = (10, 50, 90)
+MAX_PERCENTILES = 10
+MAX_REGION_FIELDS = 250000
+
+# Per-field errors listed in a response; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def grid_cell(latitude, longitude, cell_size):
+    """Return the id, row and column of the grid cell containing a coordinate"""
+    row = math.floor(latitude / cell_size)
+    column = math.floor(longitude / cell_size)
+    return f'{row}:{column}', row, column
+
+
+def cell_bounds(row, column, cell_size):
+    """Return the south-west and north-east corners of a grid cell"""
+    # Rounding hides binary floating-point noise such as 70.10000000000001
+    return {
+        'south': round(row * cell_size, 9),
+        'west': round(column * cell_size, 9),
+        'north': round((row + 1) * cell_size, 9),
+        'east': round((column + 1) * cell_size, 9)
+    }
+
+
+def parse_percentiles(percentiles):
+    """Validate the requested percentiles, defaulting to DEFAULT_PERCENTILES"""
+    if percentiles is None:
+        return DEFAULT_PERCENTILES
+    if (not isinstance(percentiles, list) or not 0 < len(percentiles) <= MAX_PERCENTILES
+            or not all(isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 100
+                       for value in percentiles)):
+        raise ValidationError([{
+            'field': 'percentiles', 'message': f'must be a list of 1 to {MAX_PERCENTILES} numbers between 0 and 100'
+        }])
+    return percentiles
+
+
+def parse_cell_weather(cells):
+    """Validate shared weather per cell id, filling missing values with the defaults"""
+    if cells is None:
+        return {}
+    if not isinstance(cells, dict):
+        raise ValidationError([{'field': 'cells', 'message': 'must be a JSON object keyed by cell id'}])
+
+    weather = {}
+    errors = []
+    for cell, data in cells.items():
+        try:
+            values = REGION_WEATHER_SCHEMA.validate(data)
+        except ValidationError as e:
+            errors += [{**error, 'field': f"cells.{cell}" + (f".{error['field']}" if error['field'] else '')}
+                       for error in e.errors]
+            continue
+        weather[cell] = [default if value is None else value for value, default in zip(values, REGION_WEATHER_DEFAULTS)]
+    if errors:
+        raise ValidationError(errors)
+    return weather
+
+
+def percentile_key(percentile):
+    return f'p{percentile:g}'
+
+
+def summarize_groups(groups, group_count, values, labels, label_name, percentiles):
+    """Mean, min, max, percentiles and label counts of values per group, one dict per group"""
+    values = np.asarray(values, dtype=float)
+    counts = np.bincount(groups, minlength=group_count)
+    means = np.bincount(groups, weights=values, minlength=group_count) / counts
+
+    # Sorting by group, then value, puts each group's values in one ascending run
+    sorted_values = values[np.lexsort((values, groups))]
+    starts = np.cumsum(counts) - counts
+    positions = starts[:, None] + (counts[:, None] - 1) * (np.asarray(percentiles, dtype=float) / 100)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.ceil(positions).astype(np.intp)
+    # Linear interpolation between the closest ranks, as np.percentile does by default
+    quantiles = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (positions - lower)
+
+    categories, codes = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    label_counts = np.bincount(
+        groups * len(categories) + codes.ravel(), minlength=group_count * len(categories)
+    ).reshape(group_count, len(categories))
+
+    keys = [percentile_key(percentile) for percentile in percentiles]
+    categories = categories.tolist()
+    return [
+        {
+            'mean': round(mean, 1),
+            'min': round(minimum, 1),
+            'max': round(maximum, 1),
+            'percentiles': {key: round(value, 1) for key, value in zip(keys, row)},
+            label_name: {category: count for category, count in zip(categories, label_row) if count}
+        }
+        for mean, minimum, maximum, row, label_row in zip(
+            means.tolist(), sorted_values[starts].tolist(), sorted_values[starts + counts - 1].tolist(),
+            quantiles.tolist(), label_counts.tolist()
+        )
+    ]
@@ -0,0 +1,199 @@
+"""
+Rule-table engine for the AgriSmart rule-based scorers.
+
+A rule set is plain data: a list of inputs and a list of terms, where each
+term takes the value of its first matching case (a list of conditions such
+as ["ph", ">=", 6.0]) or of a lookup table keyed by a categorical input.
+Term values are combined by sum, product, into a list, or taken as-is.
+
+At startup a rule set is compiled into a RuleTable: the thresholds on every
+numeric input become sorted bin edges, categorical inputs become category
+indices, and the rule set is evaluated once per combination of bins into a
+dense result tensor. Scoring is then one np.searchsorted per input and a
+single gather, whatever the number of rules or categories.
+"""
+
+import itertools
+import json
+
+import numpy as np
+
+UNKNOWN = None
+
+# Inputs with at most this many bin edges are binned by comparison counting
+MAX_COUNTED_EDGES = 16
+
+
+def load_rules(path):
+    """Load rule sets and lookup tables from a JSON file"""
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def condition_edge(op, value):
+    """Return the left-closed bin edge at which a condition changes value"""
+    if op in ('>=', '<'):
+        return float(value)
+    if op in ('>', '<='):
+        return float(np.nextafter(value, np.inf))
+    raise ValueError(f"Unsupported rule operator: {op}")
+
+
+def matches(conditions, values):
+    """Check whether every condition holds for the named input values"""
+    for name, op, threshold in conditions:
+        value = values[name]
+        if op == '>=':
+            ok = value >= threshold
+        elif op == '>':
+            ok = value > threshold
+        elif op == '<=':
+            ok = value <= threshold
+        else:
+            ok = value < threshold
+        if not ok:
+            return False
+    return True
+
+
+def evaluate(rule_set, values, tables):
+    """Evaluate a rule set for one set of named input values"""
+    combine = rule_set.get('combine', 'sum')
+    result = rule_set.get('initial', [] if combine == 'list' else 0)
+
+    for term in rule_set['terms']:
+        if 'lookup' in term:
+            key = values[term['lookup']]
+            value = tables[term['table']].get(key, term.get('default')) if key is not UNKNOWN else term.get('default')
+        else:
+            value = term.get('default')
+            for case in term['cases']:
+                if matches(case['when'], values):
+                    value = case['value']
+                    break
+
+        if combine == 'sum':
+            result += value
+        elif combine == 'product':
+            result *= value
+        elif combine == 'list':
+            if value is not None:
+                result = result + [value]
+        else:
+            result = value
+
+    if rule_set.get('max') is not None:
+        result = min(result, rule_set['max'])
+    if rule_set.get('min') is not None:
+        result = max(rule_set['min'], result)
+    return tuple(result) if combine == 'list' else result
+
+
+def code_dtype(count):
+    """Return the smallest unsigned integer dtype holding count distinct codes"""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if count <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+class RuleTable:
+    """A rule set compiled to per-input bin edges and a dense result tensor"""
+
+    def __init__(self, rule_set, tables=None):
+        tables = tables or {}
+        self.inputs = list(rule_set['inputs'])
+        self.edges = {}
+        self.categories = {}
+        representatives = []
+
+        for name in self.inputs:
+            lookup_tables = [term['table'] for term in rule_set['terms'] if term.get('lookup') == name]
+            if lookup_tables:
+                # Categorical input: one index per known key, plus a final index for unknown keys
+                keys = sorted({key for table in lookup_tables for key in tables[table]})
+                self.categories[name] = {key: index for index, key in enumerate(keys)}
+                representatives.append(keys + [UNKNOWN])
+            else:
+                edges = sorted({
+                    condition_edge(op, threshold)
+                    for term in rule_set['terms'] for case in term.get('cases', [])
+                    for input_name, op, threshold in case['when'] if input_name == name
+                })
+                self.edges[name] = np.array(edges, dtype=float)
+                # Bin 0 lies below the first edge; bin i + 1 starts at edge i
+                lowest = [float(np.nextafter(edges[0], -np.inf))] if edges else [0.0]
+                representatives.append(lowest + edges)
+
+        self.shape = tuple(len(values) for values in representatives)
+        self.strides = [int(np.prod(self.shape[index + 1:])) for index in range(len(self.shape))]
+        self.index_dtype = np.int32 if np.prod(self.shape) < 2 ** 31 else np.intp
+
+        results = [
+            evaluate(rule_set, dict(zip(self.inputs, combination)), tables)
+            for combination in itertools.product(*representatives)
+        ]
+        self.dictionary = None
+        if all(isinstance(result, (int, float)) for result in results):
+            self.tensor = np.array(results)
+        else:
+            # Labels and recommendation lists are gathered as Python objects
+            self.tensor = np.empty(len(results), dtype=object)
+            self.tensor[:] = results
+            # ...or as small integer codes into the distinct results, for columnar output
+            keys = [tuple(result) if isinstance(result, list) else result for result in results]
+            self.dictionary = list(dict.fromkeys(keys))
+            codes = {key: code for code, key in enumerate(self.dictionary)}
+            self.code_tensor = np.array([codes[key] for key in keys], dtype=code_dtype(len(codes)))
+
+    def bin_index(self, name, values):
+        """Map input values to bin or category indices"""
+        categories = self.categories.get(name)
+        if categories is None:
+            edges = self.edges[name]
+            values = np.asarray(values, dtype=float)
+            if values.ndim == 0 or len(edges) > MAX_COUNTED_EDGES:
+                return np.searchsorted(edges, values, side='right')
+            # With only a few edges, counting the edges at or below each value
+            # is equivalent to searchsorted and several times faster
+            indices = np.zeros(values.shape, dtype=np.uint8)
+            for edge in edges:
+                indices += (values >= edge).view(np.uint8)
+            return indices
+
+        unknown = len(categories)
+        if isinstance(values, str):
+            return categories.get(values.lower(), unknown)
+
+        # Resolve each distinct key once; batches usually hold only a few
+        resolved = {value: categories.get(value.lower(), unknown) for value in dict.fromkeys(values)}
+        return np.fromiter(map(resolved.__getitem__, values), dtype=np.intp, count=len(values))
+
+    def score(self, *values):
+        """Score array-likes (or scalars) given in input order, returning an array of results"""
+        return self.tensor[self.flat_index(*values)]
+
+    def codes(self, *values):
+        """Score like score(), returning codes into self.dictionary instead of label or list objects"""
+        if self.dictionary is None:
+            raise TypeError('Only rule sets with label or list results have codes')
+        return self.code_tensor[self.flat_index(*values)]
+
+    def flat_index(self, *values):
+        """Return the result tensor index of each set of input values"""
+        flat = 0
+        for name, stride, value in zip(self.inputs, self.strides, values):
+            index = self.bin_index(name, value)
+            if isinstance(index, np.ndarray):
+                index = index.astype(self.index_dtype)
+                if stride != 1:
+                    index *= stride
+            else:
+                index = index * stride
+            flat = flat + index
+        return flat
+
+    def lookup(self, *values):
+        """Score one set of scalar inputs, returning a plain Python value"""
+        result = self.score(*values)
+        return result.item() if isinstance(result, np.generic) else result
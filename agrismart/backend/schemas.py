@@ -0,0 +1,211 @@
+"""
+Declarative input schemas for the AgriSmart prediction endpoints.
+
+Each schema lists its fields once, with the camelCase name clients send,
+snake_case aliases, defaults, allowed ranges and types. Schemas are compiled
+into flat lookup tuples when they are defined, so validating a payload is a
+single pass over the fields. Validation collects every field error before
+raising, so a bad request becomes one structured 400 before any scoring runs.
+"""
+
+import math
+
+
+class ValidationError(ValueError):
+    """Invalid request input, with one entry per offending field"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(
+            f"{error['field']}: {error['message']}" if error['field'] else error['message'] for error in errors
+        ))
+
+
+class Field:
+    """One scalar input field"""
+
+    def __init__(self, name, default, minimum=None, maximum=None, dtype=float, aliases=(), choices=None):
+        self.name = name
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.dtype = dtype
+        self.aliases = tuple(aliases)
+        self.choices = tuple(choices) if choices is not None else None
+
+    def compile(self):
+        return (
+            self.name, (self.name,) + self.aliases, self.default, self.minimum, self.maximum, self.dtype, self.choices,
+            None
+        )
+
+
+class Schema:
+    """Ordered set of fields and nested sections validated in one pass"""
+
+    def __init__(self, fields, name=None, aliases=()):
+        self.fields = list(fields)
+        self.name = name
+        self.aliases = tuple(aliases)
+        self._compiled = tuple(field.compile() for field in self.fields)
+
+    def compile(self):
+        return (self.name, (self.name,) + self.aliases, None, None, None, dict, None, self._compiled)
+
+    def validate(self, data):
+        """Return converted values in field order, with nested sections as lists"""
+        errors = []
+        values = _validate(self._compiled, data, '', errors)
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def validate_list(self, items, name, max_length):
+        """Validate a non-empty list of objects, labelling errors with each item's index"""
+        if not isinstance(items, list) or not items:
+            raise ValidationError([{'field': name, 'message': 'must be a non-empty list of JSON objects'}])
+        if len(items) > max_length:
+            raise ValidationError([{'field': name, 'message': f'must hold at most {max_length} items'}])
+        errors = []
+        values = [_validate(self._compiled, item, f'{name}[{index}].', errors) for index, item in enumerate(items)]
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+
+def _validate(compiled, data, prefix, errors):
+    if not isinstance(data, dict):
+        errors.append({'field': prefix.rstrip('.') or None, 'message': 'must be a JSON object'})
+        return None
+
+    values = []
+    for name, names, default, minimum, maximum, dtype, choices, children in compiled:
+        value = None
+        for key in names:
+            value = data.get(key)
+            if value is not None:
+                break
+        label = prefix + name
+
+        if children is not None:
+            values.append(_validate(children, {} if value is None else value, label + '.', errors))
+        elif value is None:
+            values.append(default)
+        elif dtype is str:
+            if not isinstance(value, str):
+                errors.append({'field': label, 'message': 'must be a string'})
+            elif choices is not None and value not in choices:
+                errors.append({'field': label, 'message': f"must be one of {', '.join(choices)}"})
+            values.append(value)
+        else:
+            number = _to_float(value)
+            if number is None:
+                errors.append({'field': label, 'message': 'must be a number'})
+            elif dtype is int and not number.is_integer():
+                errors.append({'field': label, 'message': 'must be an integer'})
+            elif (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+                errors.append({'field': label, 'message': f'must be between {minimum} and {maximum}'})
+            elif dtype is int:
+                number = int(number)
+            values.append(number)
+    return values
+
+
+def _to_float(value):
+    """Convert numbers and numeric strings (as in CSV uploads) to a finite float"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+    else:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def soil_fields():
+    return [
+        Field('nitrogen', 45.0, 0, 5000),
+        Field('phosphorus', 28.0, 0, 5000),
+        Field('potassium', 62.0, 0, 5000),
+        Field('ph', 6.5, 0, 14),
+        Field('organicMatter', 3.2, 0, 100, aliases=['organic_matter']),
+        Field('temperature', 25.0, -60, 60),
+        Field('humidity', 65.0, 0, 100)
+    ]
+
+
+def weather_fields(*names):
+    fields = {
+        'temperature': Field('temperature', 25.0, -60, 60),
+        'humidity': Field('humidity', 65.0, 0, 100),
+        'rainfall': Field('rainfall', 120.0, 0, 10000),
+        'pressure': Field('pressure', 1013.0, 800, 1100),
+        'windSpeed': Field('windSpeed', 10.0, 0, 200, aliases=['wind_speed'])
+    }
+    return [fields[name] for name in names]
+
+
+CROP_TYPE = Field('cropType', 'wheat', dtype=str, aliases=['crop_type'])
+FIELD_AREA = Field('fieldArea', 1.0, 0, 1e6, aliases=['field_area'])
+
+SOIL_SCHEMA = Schema(soil_fields())
+
+PEST_SCHEMA = Schema(weather_fields('temperature', 'humidity', 'rainfall') + [CROP_TYPE])
+
+RAINFALL_SCHEMA = Schema(weather_fields('temperature', 'humidity', 'pressure', 'windSpeed'))
+
+CROP_YIELD_SCHEMA = Schema([
+    Schema(soil_fields(), 'soilData', aliases=['soil_data']),
+    Schema(weather_fields('temperature', 'humidity', 'rainfall'), 'weatherData', aliases=['weather_data']),
+    CROP_TYPE,
+    FIELD_AREA
+])
+
+FIELD_REPORT_SCHEMA = Schema([
+    Schema(soil_fields(), 'soilData', aliases=['soil_data']),
+    Schema(
+        weather_fields('temperature', 'humidity', 'rainfall', 'pressure', 'windSpeed'),
+        'weatherData',
+        aliases=['weather_data']
+    ),
+    CROP_TYPE,
+    FIELD_AREA
+])
+
+# Forecast settings default to the values carried in the forecast state, then to the interval defaults
+FORECAST_SCHEMA = Schema([
+    Field('fieldId', None, dtype=str, aliases=['field_id']),
+    Field('cropType', None, dtype=str, aliases=['crop_type']),
+    Field('interval', None, dtype=str, choices=['hourly', 'daily']),
+    Field('window', None, 1, 744, dtype=int),
+    Field('seed', None, 0, 2 ** 32 - 1, dtype=int)
+])
+
+FORECAST_OBSERVATION_SCHEMA = Schema(
+    weather_fields('temperature', 'humidity', 'rainfall', 'pressure', 'windSpeed') + [Field('timestamp', None, dtype=str)]
+)
+
+# Region fields fill missing weather values from their cell's weather, then from the usual defaults
+REGION_WEATHER_FIELDS = weather_fields('temperature', 'humidity', 'rainfall')
+REGION_WEATHER_DEFAULTS = [field.default for field in REGION_WEATHER_FIELDS]
+REGION_WEATHER_SCHEMA = Schema(
+    [Field(field.name, None, field.minimum, field.maximum, aliases=field.aliases) for field in REGION_WEATHER_FIELDS],
+    'weatherData',
+    aliases=['weather_data']
+)
+
+REGION_SCHEMA = Schema([Field('cellSize', 0.1, 0.0001, 90, aliases=['cell_size']), CROP_TYPE])
+
+REGION_FIELD_SCHEMA = Schema([
+    Field('latitude', None, -90, 90, aliases=['lat']),
+    Field('longitude', None, -180, 180, aliases=['lon', 'lng']),
+    Field('cell', None, dtype=str),
+    Schema(soil_fields(), 'soilData', aliases=['soil_data']),
+    REGION_WEATHER_SCHEMA,
+    Field('cropType', None, dtype=str, aliases=['crop_type'])
+])
@@ -0,0 +1,77 @@
+"""
+Rule-based fallback scorers for the AgriSmart prediction API.
+
+The rules and the crop lookup tables live as data in rules.json (or the file
+named by RULES_PATH) and are compiled into RuleTables at import, so adding a
+crop or adjusting a threshold does not touch the hot path. Every scorer takes
+array-likes (or scalars) and returns NumPy arrays, so single predictions are
+scored as batches of one; tests/test_scoring.py checks them against the
+original if/elif rules. Expected rainfall amounts come from draws hashed
+from the input features, so the same inputs always get the same amount and
+their results can be cached.
+"""
+
+import os
+
+import numpy as np
+
+from rules import RuleTable, load_rules
+
+RULES_PATH = os.environ.get('RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json'))
+
+RULES = load_rules(RULES_PATH)
+TABLES = RULES['tables']
+
+# Crop lookup tables, editable in the rules file
+BASE_YIELDS = TABLES['base_yields']
+PESTS_BY_CROP = TABLES['pests_by_crop']
+DEFAULT_BASE_YIELD = RULES['defaults']['base_yield']
+DEFAULT_COMMON_PESTS = RULES['defaults']['common_pests']
+
+SOIL_HEALTH_TABLE = RuleTable(RULES['soil_health'], TABLES)
+WEATHER_FACTOR_TABLE = RuleTable(RULES['weather_factor'], TABLES)
+PEST_RISK_TABLE = RuleTable(RULES['pest_risk'], TABLES)
+RAINFALL_PROBABILITY_TABLE = RuleTable(RULES['rainfall_probability'], TABLES)
+SOIL_CLASSIFICATION_TABLE = RuleTable(RULES['soil_classification'], TABLES)
+SOIL_RECOMMENDATIONS_TABLE = RuleTable(RULES['soil_recommendations'], TABLES)
+YIELD_RECOMMENDATIONS_TABLE = RuleTable(RULES['yield_recommendations'], TABLES)
+PEST_RISK_LEVEL_TABLE = RuleTable(RULES['pest_risk_level'], TABLES)
+PREVENTIVE_MEASURES_TABLE = RuleTable(RULES['preventive_measures'], TABLES)
+
+# SplitMix64 constants used to hash feature rows into reproducible draws
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+MIX_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+def calculate_soil_health_fallback_batch(nitrogen, phosphorus, ph, temperature, humidity):
+    """Rule-based soil health scores (0-100) for arrays of soil parameters, used when the model is not available"""
+    return SOIL_HEALTH_TABLE.score(nitrogen, phosphorus, ph, temperature, humidity)
+
+def calculate_weather_factor_batch(temperature, humidity, rainfall):
+    """Weather impact factors on crop yield (0.6-1.4) for arrays of weather conditions"""
+    return WEATHER_FACTOR_TABLE.score(temperature, humidity, rainfall)
+
+def calculate_pest_risk_fallback_batch(temperature, humidity, rainfall, crop_types):
+    """Rule-based pest risk scores (0-100); crop_types is a string or a sequence of strings"""
+    return PEST_RISK_TABLE.score(temperature, humidity, rainfall, crop_types)
+
+def calculate_rainfall_probability_fallback_batch(temperature, humidity, pressure):
+    """Rule-based rainfall probabilities (0-90) for arrays of weather conditions"""
+    return RAINFALL_PROBABILITY_TABLE.score(temperature, humidity, pressure)
+
+def seeded_uniform_batch(features, seed=0):
+    """Reproducible uniform [0, 1) draws, one per feature row, derived from the row values and a seed"""
+    features = np.ascontiguousarray(features, dtype=np.float64)
+    bits = features.reshape(len(features), -1).view(np.uint64)
+    state = np.full(len(features), np.uint64(seed), dtype=np.uint64)
+    for column in bits.T:
+        # Unsigned arithmetic wraps modulo 2**64, as SplitMix64 expects
+        state = (state ^ column) + GOLDEN_GAMMA
+        state = (state ^ (state >> np.uint64(30))) * MIX_MULTIPLIERS[0]
+        state = (state ^ (state >> np.uint64(27))) * MIX_MULTIPLIERS[1]
+        state ^= state >> np.uint64(31)
+    return (state >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+
+def expected_rainfall_amount_batch(probabilities, draws):
+    """Expected rainfall amounts in mm for probabilities and uniform draws"""
+    probabilities = np.asarray(probabilities, dtype=float)
+    return np.where(probabilities > 60, np.round(5 + draws * 20), np.round(draws * 5)).astype(int)
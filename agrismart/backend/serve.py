@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Production server for the AgriSmart Backend API.
+
+Runs the Flask app under gunicorn with several worker processes. Models are
+loaded once in the master process before the workers are forked (preload),
+so every worker starts with the models already in memory and shares their
+pages copy-on-write; joblib models are also memory-mapped (see models.py).
+SIGTERM stops accepting connections and lets in-flight requests finish
+within the graceful timeout.
+
+SERVING_PROFILE=slim starts workers faster: models are not preloaded and
+the prediction history and model file watcher are off (see startup.py).
+STARTUP_PROFILE=1 logs where startup time and memory went.
+
+Usage:
+    python serve.py --workers 4 --threads 4 --bind 0.0.0.0:5000
+    SERVING_PROFILE=slim python serve.py --workers 2
+
+Every option can also be set with an AGRISMART_* environment variable.
+"""
+
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+
+
+def default_workers():
+    """Default worker count: one per CPU core, capped to keep model memory bounded"""
+    return min(multiprocessing.cpu_count(), 8)
+
+
+def parse_args(argv=None):
+    """Parse serving options from the command line and environment"""
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description='Run the AgriSmart Backend API in production mode')
+    parser.add_argument('--bind', default=env('AGRISMART_BIND', f"0.0.0.0:{env('PORT', '5000')}"),
+                        help='address to listen on (default: 0.0.0.0:$PORT or 0.0.0.0:5000)')
+    parser.add_argument('--workers', type=int, default=int(env('AGRISMART_WORKERS', default_workers())),
+                        help='number of worker processes')
+    parser.add_argument('--threads', type=int, default=int(env('AGRISMART_THREADS', 4)),
+                        help='request threads per worker')
+    parser.add_argument('--timeout', type=int, default=int(env('AGRISMART_TIMEOUT', 30)),
+                        help='seconds before a silent worker is killed and restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=int(env('AGRISMART_GRACEFUL_TIMEOUT', 30)),
+                        help='seconds in-flight requests get to finish on shutdown')
+    parser.add_argument('--max-requests', type=int, default=int(env('AGRISMART_MAX_REQUESTS', 0)),
+                        help='restart a worker after this many requests (0 disables)')
+    parser.add_argument('--deadline-ms', type=float, default=float(env('INFERENCE_DEADLINE_MS', 1000)),
+                        help='per-request model time budget before falling back to rules; '
+                             'batch and stream chunks only get one from X-Deadline-Ms (0 disables)')
+    parser.add_argument('--no-preload', action='store_true', default=env('AGRISMART_PRELOAD', '1') == '0',
+                        help='load models in each worker instead of once before forking')
+    parser.add_argument('--no-control-socket', action='store_true',
+                        default=env('AGRISMART_CONTROL_SOCKET', '1') == '0',
+                        help="skip the control socket of gunicorn versions that have one, which starts faster")
+    return parser.parse_args(argv)
+
+
+def run(options):
+    """Start gunicorn with the AgriSmart app"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ gunicorn is not installed. Run: pip install -r requirements.txt")
+        return 1
+
+    class AgriSmartApplication(BaseApplication):
+        """gunicorn application that builds the Flask app through create_app()"""
+
+        def load_config(self):
+            self.cfg.set('bind', options.bind)
+            self.cfg.set('workers', options.workers)
+            self.cfg.set('threads', options.threads)
+            self.cfg.set('worker_class', 'gthread' if options.threads > 1 else 'sync')
+            self.cfg.set('timeout', options.timeout)
+            self.cfg.set('graceful_timeout', options.graceful_timeout)
+            self.cfg.set('max_requests', options.max_requests)
+            self.cfg.set('max_requests_jitter', options.max_requests // 10)
+            self.cfg.set('preload_app', not options.no_preload)
+            self.cfg.set('accesslog', '-')
+            if options.no_control_socket and 'control_socket_disable' in self.cfg.settings:
+                self.cfg.set('control_socket_disable', True)
+
+        def load(self):
+            os.environ['INFERENCE_DEADLINE_MS'] = str(options.deadline_ms)
+            from app import create_app
+            # With preload_app this runs once in the master, before fork
+            application = create_app(preload_models=not options.no_preload)
+            if not options.no_preload:
+                # Keep the garbage collector in the workers from writing to the
+                # preloaded objects, which would un-share their pages
+                gc.collect()
+                gc.freeze()
+            return application
+
+    AgriSmartApplication().run()
+    return 0
+
+
+def main(argv=None):
+    """Production entry point"""
+    # Resolve `import app` relative to this file regardless of the working directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # The serving profile's defaults, such as AGRISMART_PRELOAD=0 for slim, apply to the options below
+    from startup import apply_serving_profile
+    apply_serving_profile()
+    return run(parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
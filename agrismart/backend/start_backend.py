@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 """
 Startup script for AgriSmart Backend API
-This script installs dependencies and starts the Flask server
+This script checks dependencies and starts the API server, either the
+production gunicorn server (serve.py) or the Flask development server (--dev)
 """
 
+import argparse
+import importlib.util
 import subprocess
 import sys
 import os
 
+# Modules that must be importable before the server can start
+REQUIRED_MODULES = ['flask', 'flask_cors', 'numpy', 'joblib', 'gunicorn']
+
+def dependencies_installed():
+    """Check whether the required Python packages are already installed"""
+    return all(importlib.util.find_spec(module) is not None for module in REQUIRED_MODULES)
+
 def install_requirements():
     """Install required Python packages"""
     print("Installing Python dependencies...")
@@ -19,26 +29,42 @@ def install_requirements():
         print(f"❌ Error installing dependencies: {e}")
         return False
 
-def start_server():
-    """Start the Flask development server"""
+def start_server(dev=False, serve_args=None):
+    """Start the production server, or the Flask development server with dev=True"""
     print("Starting AgriSmart Backend API server...")
     print("Server will be available at: http://localhost:5000")
     print("API endpoints:")
     print("  - GET  /health")
+    print("  - GET  /ready")
+    print("  - GET  /metrics")
+    print("  - GET  /history")
+    print("  - GET  /analytics/rollups")
+    print("  - GET  /analytics/export")
     print("  - POST /predict/soil-health")
     print("  - POST /predict/crop-yield")
     print("  - POST /predict/pest-risk")
     print("  - POST /predict/rainfall")
+    print("  - POST /predict/field-report")
+    print("  - POST /predict/pest-image")
+    print("  - POST /predict/forecast")
+    print("  - POST /predict/region")
+    print("  - POST /models/reload, /models/promote (ALLOW_MODEL_ADMIN=1)")
+    print("  - POST /predict/<soil-health|crop-yield|pest-risk|rainfall|field-report>/batch")
+    print("  - POST /predict/<soil-health|crop-yield|pest-risk|rainfall|field-report>/stream")
     print("\nPress Ctrl+C to stop the server")
     print("-" * 50)
-    
+
     try:
-        # Set environment variables for Flask
-        os.environ['FLASK_APP'] = 'app.py'
-        os.environ['FLASK_ENV'] = 'development'
-        
-        # Start the Flask app
-        subprocess.run([sys.executable, "app.py"])
+        if dev:
+            # Set environment variables for Flask
+            os.environ['FLASK_APP'] = 'app.py'
+            os.environ['FLASK_ENV'] = 'development'
+
+            # Start the Flask development server
+            subprocess.run([sys.executable, "app.py"])
+        else:
+            # Start the production server
+            subprocess.run([sys.executable, "serve.py", *(serve_args or [])])
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
     except Exception as e:
@@ -46,24 +72,31 @@ def start_server():
 
 def main():
     """Main startup function"""
+    parser = argparse.ArgumentParser(description='Start the AgriSmart Backend API')
+    parser.add_argument('--dev', action='store_true', help='run the Flask development server with the reloader')
+    parser.add_argument('--install', action='store_true', help='reinstall requirements.txt before starting')
+    args, serve_args = parser.parse_known_args()
+
     print("🌾 AgriSmart Backend API Startup")
     print("=" * 40)
-    
+
     # Check if we're in the right directory
     if not os.path.exists("app.py"):
         print("❌ Error: app.py not found. Make sure you're in the backend directory.")
         return
-    
+
     if not os.path.exists("requirements.txt"):
         print("❌ Error: requirements.txt not found.")
         return
-    
-    # Install dependencies
-    if install_requirements():
-        print("\n" + "=" * 40)
-        start_server()
-    else:
-        print("❌ Failed to install dependencies. Please check the error messages above.")
+
+    # Install dependencies only when asked or when something is missing
+    if args.install or not dependencies_installed():
+        if not install_requirements():
+            print("❌ Failed to install dependencies. Please check the error messages above.")
+            return
+
+    print("\n" + "=" * 40)
+    start_server(dev=args.dev, serve_args=serve_args)
 
 if __name__ == "__main__":
     main()
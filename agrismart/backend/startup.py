@@ -0,0 +1,204 @@
+"""
+Startup profiling and serving profiles for the AgriSmart prediction API.
+
+With STARTUP_PROFILE=1, app.py installs a StartupProfiler before importing
+anything else. It wraps builtins.__import__ and records, for every module
+imported for the first time, the time spent importing it (including the
+modules it imports itself), its own share of that time, and how much the
+process RSS grew meanwhile. Named phases (imports, module setup, app
+creation, model loading) are marked as startup progresses. The report is
+logged once the app is created and served by /debug/startup. Model load
+times and memory are reported by the model registry alongside it.
+
+SERVING_PROFILE selects defaults for the optional features:
+
+- full (default): every feature on, models preloaded before forking;
+- slim: the prediction history and its analytics rollups, the model file
+  watcher and model preloading are off, so a worker starts serving as soon
+  as the routes are registered and models load in the background on first
+  use. Modules whose dependencies are only needed by one endpoint (pyarrow
+  for Parquet exports, Pillow for photos, joblib and TensorFlow for models)
+  import them when that endpoint is first used, in every profile.
+
+A profile only provides defaults: variables set explicitly still win.
+"""
+
+import builtins
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+# Environment defaults applied by each serving profile
+SERVING_PROFILES = {
+    'full': {},
+    'slim': {
+        'PREDICTION_HISTORY': 'off',
+        'MODEL_WATCH_INTERVAL': '0',
+        'AGRISMART_PRELOAD': '0',
+        'AGRISMART_CONTROL_SOCKET': '0'
+    }
+}
+
+
+def apply_serving_profile():
+    """Apply the defaults of the SERVING_PROFILE profile to the environment, returning its name"""
+    name = os.environ.get('SERVING_PROFILE', 'full')
+    if name not in SERVING_PROFILES:
+        raise ValueError(f"SERVING_PROFILE must be one of: {', '.join(SERVING_PROFILES)}")
+    for variable, value in SERVING_PROFILES[name].items():
+        os.environ.setdefault(variable, value)
+    return name
+
+
+def rss_bytes():
+    """Return the resident set size of this process, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def process_age():
+    """Return the seconds since this process was started, or None where /proc is not available"""
+    try:
+        with open('/proc/self/stat') as handle:
+            # The command name may contain spaces, so fields are counted after its closing parenthesis
+            started_ticks = int(handle.read().rpartition(')')[2].split()[19])
+        with open('/proc/uptime') as handle:
+            uptime = float(handle.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - started_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+
+
+class StartupProfiler:
+    """Import hook timing each first import, with the RSS growth it caused and named startup phases"""
+
+    def __init__(self):
+        # Seconds the interpreter ran before the profiler was installed
+        self.before_install = None
+        self.started = None
+        # module -> {'seconds', 'self_seconds', 'rss_bytes', 'self_rss_bytes', 'parent'}
+        self.imports = {}
+        # (phase, seconds since install, RSS bytes) in the order they were marked
+        self.phases = []
+        self._original_import = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def installed(self):
+        return self._original_import is not None
+
+    def install(self):
+        """Start recording imports"""
+        if self.installed:
+            return self
+        self.before_install = process_age()
+        self.started = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def uninstall(self):
+        """Stop recording imports, keeping what was recorded"""
+        if self.installed:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def mark(self, phase):
+        """Record the end of a startup phase"""
+        if self.started is not None:
+            self.phases.append((phase, time.perf_counter() - self.started, rss_bytes()))
+
+    def _new_module(self, name, globals, fromlist, level):
+        """Return the module an import statement is about to load for the first time, or None"""
+        try:
+            resolved = importlib.util.resolve_name('.' * level + name, globals.get('__package__')) if level else name
+        except (AttributeError, ImportError, ValueError):
+            return None
+        module = sys.modules.get(resolved)
+        if module is None:
+            return resolved
+        # `from package import submodule` loads the submodule when the package lacks the attribute
+        if fromlist and hasattr(module, '__path__'):
+            for item in fromlist:
+                if item != '*' and not hasattr(module, item):
+                    return f'{resolved}.{item}'
+        return None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = self._new_module(name, globals or {}, fromlist, level) if name else None
+        if module is None:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        frame = {'name': module, 'children': 0.0, 'children_rss': 0}
+        stack.append(frame)
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            seconds = time.perf_counter() - started
+            rss_after = rss_bytes()
+            # RSS is shared by the whole process, so memory allocated by other threads meanwhile is included
+            rss = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            stack.pop()
+            if parent is not None:
+                parent['children'] += seconds
+                parent['children_rss'] += rss or 0
+            with self._lock:
+                self.imports.setdefault(module, {
+                    'seconds': seconds,
+                    'self_seconds': max(seconds - frame['children'], 0.0),
+                    'rss_bytes': rss,
+                    'self_rss_bytes': rss - frame['children_rss'] if rss is not None else None,
+                    'parent': parent['name'] if parent is not None else None
+                })
+
+    def report(self, limit=30):
+        """Return the phases, the slowest imports and totals per top-level package"""
+        with self._lock:
+            imports = dict(self.imports)
+
+        packages = {}
+        for module, record in imports.items():
+            package = packages.setdefault(module.partition('.')[0], {'seconds': 0.0, 'rss_bytes': 0})
+            package['seconds'] += record['self_seconds']
+            package['rss_bytes'] += record['self_rss_bytes'] or 0
+        top_level = [record for record in imports.values() if record['parent'] is None]
+
+        return {
+            'enabled': self.started is not None,
+            'before_profiler_seconds': round(self.before_install, 3) if self.before_install is not None else None,
+            'import_seconds': round(sum(record['seconds'] for record in top_level), 4),
+            'rss_bytes': rss_bytes(),
+            'phases': [
+                {'phase': phase, 'seconds': round(seconds, 4), 'rss_bytes': rss}
+                for phase, seconds, rss in self.phases
+            ],
+            'packages': [
+                {'package': package, 'self_seconds': round(totals['seconds'], 4), 'rss_bytes': totals['rss_bytes']}
+                for package, totals in sorted(packages.items(), key=lambda item: -item[1]['seconds'])[:limit]
+            ],
+            'imports': [
+                {
+                    'module': module,
+                    'seconds': round(record['seconds'], 4),
+                    'self_seconds': round(record['self_seconds'], 4),
+                    'rss_bytes': record['rss_bytes'],
+                    'self_rss_bytes': record['self_rss_bytes'],
+                    'parent': record['parent']
+                }
+                for module, record in sorted(imports.items(), key=lambda item: -item[1]['seconds'])[:limit]
+            ]
+        }
+
+
+# Process-wide profiler; app.py installs it first thing when STARTUP_PROFILE=1
+profiler = StartupProfiler()
@@ -0,0 +1,47 @@
+import csv
+import io
+
+from analytics import EXPORT_COLUMNS, AnalyticsRollups, history_export_rows, stream_csv
+from history import PredictionHistory
+
+
+def test_defaulted_crops_roll_up_under_the_resolved_crop(tmp_path):
+    history = PredictionHistory(str(tmp_path / 'history.sqlite3'))
+    rollups = AnalyticsRollups(history)
+    crop_yield = {'predictedYield': 3.0, 'cropType': 'wheat', 'factors': {'overallRating': 'Good'}}
+    report = {
+        'soilHealth': {'soilHealthScore': 70.0, 'classification': 'Good'},
+        'cropYield': {'predictedYield': 5.0, 'cropType': 'wheat', 'factors': {'overallRating': 'Good'}},
+        'pestRisk': {'riskScore': 40.0, 'riskLevel': 'Medium'}
+    }
+
+    history.record_many('crop-yield', ['rules', 'rules'], [{'fieldId': 'f1'}, {'cropType': 'Rice'}],
+                        [crop_yield, {**crop_yield, 'cropType': 'Rice'}], ['wheat', 'Rice'])
+    history.record_many('field-report', ['rules'], [{'fieldId': 'f1'}], [report], ['wheat'])
+    history.flush()
+
+    groups = {group['crop']: group for group in rollups.query('crop-yield', 'crop')}
+    assert sorted(groups) == ['rice', 'wheat']
+    assert (groups['wheat']['count'], groups['wheat']['mean']) == (2, 4.0)
+    assert [group['crop'] for group in rollups.query('pest-risk', 'crop', crop_type='Wheat')] == ['wheat']
+
+
+def test_rollups_match_the_raw_rows_and_export_as_csv(tmp_path):
+    history = PredictionHistory(str(tmp_path / 'history.sqlite3'))
+    rollups = AnalyticsRollups(history)
+    scores = [40.0, 60.0, 80.0, 90.0]
+    results = [{'soilHealthScore': score, 'classification': 'Good' if score < 85 else 'Excellent'} for score in scores]
+
+    history.record_many('soil-health', ['rules'] * 4, [{'fieldId': 'north'}] * 3 + [{'fieldId': 'south'}], results)
+    history.flush()
+
+    groups = {group['field']: group for group in rollups.query('soil-health', 'field')}
+    assert (groups['north']['count'], groups['north']['mean'], groups['north']['std']) == (3, 60.0, 16.33)
+    assert (groups['north']['min'], groups['north']['max']) == (40.0, 80.0)
+    assert groups['south']['labels'] == {'Excellent': 1}
+
+    columns = EXPORT_COLUMNS['history']
+    text = ''.join(stream_csv(columns, history_export_rows(history.iter_rows('soil-health', batch_size=2))))
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert [float(row['score']) for row in rows] == scores
+    assert [row['fieldId'] for row in rows] == ['north', 'north', 'north', 'south']
@@ -0,0 +1,136 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('PREDICTION_HISTORY', 'off')
+os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')
+
+import app  # noqa: E402
+from history import PredictionHistory  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def without_timestamp(result):
+    return {key: value for key, value in result.items() if key != 'timestamp'}
+
+
+@pytest.mark.parametrize('route, record', [
+    ('soil-health', {'nitrogen': 52, 'phosphorus': 14, 'ph': 7.2}),
+    ('crop-yield', {'nitrogen': 35, 'cropType': 'rice', 'fieldArea': 2.5, 'rainfall': 120}),
+    ('pest-risk', {'temperature': 31, 'humidity': 75, 'cropType': 'cotton'}),
+    ('rainfall', {'humidity': 85, 'pressure': 1005})
+])
+def test_batch_results_match_single_predictions(client, route, record):
+    single = client.post(f'/predict/{route}', json=record).get_json()
+    batch = client.post(f'/predict/{route}/batch', json=[record, record]).get_json()
+
+    assert (batch['count'], batch['failed']) == (2, 0)
+    assert [without_timestamp(result) for result in batch['results']] == [without_timestamp(single)] * 2
+
+
+def test_batch_keeps_per_record_errors_in_place(client):
+    records = [{'nitrogen': 40}, 'not a record', {'nitrogen': 'lots'}, {'nitrogen': 60}]
+    body = client.post('/predict/soil-health/batch', json={'records': records}).get_json()
+
+    assert (body['count'], body['failed']) == (4, 2)
+    assert ['error' in result for result in body['results']] == [False, True, True, False]
+    assert body['results'][1]['index'] == 1
+
+
+def test_batch_accepts_ndjson_across_chunks(client, monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_CHUNK_SIZE', 2)
+    lines = [json.dumps({'humidity': humidity}) for humidity in (50, 65, 81)] + ['{broken']
+    response = client.post(
+        '/predict/rainfall/batch', data='\n'.join(lines), content_type='application/x-ndjson'
+    )
+
+    body = response.get_json()
+    expected = [
+        client.post('/predict/rainfall', json={'humidity': humidity}).get_json()['probability']
+        for humidity in (50, 65, 81)
+    ]
+    assert [result.get('probability') for result in body['results'][:3]] == expected
+    assert len(set(expected)) == 3
+    assert 'error' in body['results'][3]
+
+
+def test_batch_rejects_malformed_and_oversized_payloads(client, monkeypatch):
+    assert client.post('/predict/pest-risk/batch', json={'temperature': 30}).status_code == 400
+    monkeypatch.setattr(app, 'MAX_BATCH_RECORDS', 2)
+    assert client.post('/predict/pest-risk/batch', json=[{}, {}, {}]).status_code == 400
+
+
+@pytest.mark.parametrize('header, deadline_ms, chunk_deadline_ms', [
+    (None, app.INFERENCE_DEADLINE_MS, 0),
+    ('250', 250, 250),
+    ('0', 0, 0),
+    ('1e12', app.MAX_DEADLINE_MS, app.MAX_DEADLINE_MS),
+    ('inf', app.INFERENCE_DEADLINE_MS, 0),
+    ('nan', app.INFERENCE_DEADLINE_MS, 0),
+    ('-5', app.INFERENCE_DEADLINE_MS, 0),
+    ('soon', app.INFERENCE_DEADLINE_MS, 0)
+])
+def test_deadline_header_is_validated_and_capped(header, deadline_ms, chunk_deadline_ms):
+    headers = {} if header is None else {'X-Deadline-Ms': header}
+    with app.app.test_request_context('/predict/soil-health', method='POST', headers=headers):
+        app.start_request_metrics()
+        assert (app.g.deadline_ms, app.g.chunk_deadline_ms) == (deadline_ms, chunk_deadline_ms)
+
+
+def test_invalid_deadline_header_still_scores(client):
+    response = client.post('/predict/soil-health', json={'nitrogen': 52}, headers={'X-Deadline-Ms': 'inf'})
+
+    assert response.status_code == 200
+    assert 'soilHealthScore' in response.get_json()
+
+
+class SoilModel:
+    """A soil model answering every row with the same class probabilities, or failing"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def predict(self, features):
+        if self.fail:
+            raise RuntimeError('model unavailable')
+        return np.full(len(features), 0.7)
+
+    def predict_proba(self, features):
+        return np.tile([0.1, 0.9], (len(features), 1))
+
+
+@pytest.fixture
+def soil_model(monkeypatch, tmp_path):
+    """Serve a soil model at version v1, logging history to a temporary file"""
+    model = SoilModel()
+    registry_get = app.model_registry.get
+    monkeypatch.setattr(app.model_registry, 'get', lambda name: model if name == 'soil_model' else registry_get(name))
+    monkeypatch.setattr(app.model_registry, 'version', lambda name: 'v1')
+    monkeypatch.setattr(app, 'prediction_history', PredictionHistory(str(tmp_path / 'history.sqlite3')))
+    app.prediction_cache.clear()
+    yield model
+    app.prediction_cache.clear()
+
+
+def test_rows_the_model_fell_back_on_are_labelled_rules(soil_model):
+    client = app.app.test_client()
+    scored = client.post('/predict/soil-health', json={'nitrogen': 41}).get_json()
+    assert (scored['confidence'], scored['modelVersion']) == (90.0, 'v1')
+
+    soil_model.fail = True
+    results = client.post('/predict/soil-health/batch', json=[{'nitrogen': 41}, {'nitrogen': 42}]).get_json()['results']
+    # The first record is served from the cache, scored by the model; the second fell back
+    assert [(result['confidence'], result['modelVersion']) for result in results] == [(90.0, 'v1'), (85.0, 'rules')]
+    report = client.post('/predict/field-report', json={'nitrogen': 43}).get_json()
+    assert report['modelVersion'] == 'rules+' + app.endpoint_model_version('field-report').partition('+')[2]
+
+    app.prediction_history.flush()
+    assert app.prediction_history.execute(
+        "SELECT model_version FROM history WHERE endpoint = 'soil-health' ORDER BY id"
+    ).fetchall() == [('v1',), ('v1',), ('rules',)]
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batching import DeadlineExceeded, InferenceQueueFull, MicroBatcher
+
+
+def recording_model(calls, delay=0):
+    """A model returning row sums that records the thread and row count of each call"""
+    def predict(features):
+        calls.append((threading.current_thread().name, len(features)))
+        time.sleep(delay)
+        return features.sum(axis=1)
+    return predict
+
+
+def test_full_batches_without_a_deadline_skip_the_queue():
+    calls = []
+    batcher = MicroBatcher('test', recording_model(calls), max_batch_size=4)
+
+    outputs = batcher.predict(np.ones((4, 2)))
+    assert outputs.tolist() == [2, 2, 2, 2]
+    assert calls == [(threading.current_thread().name, 4)]
+    assert batcher.stats()['batch_size']['count'] == 1
+
+
+def test_small_or_deadline_bound_requests_are_queued():
+    calls = []
+    batcher = MicroBatcher('test', recording_model(calls), max_batch_size=4, max_wait_ms=0)
+
+    assert batcher.predict(np.ones((1, 2))).tolist() == [2]
+    assert batcher.predict(np.ones((4, 2)), timeout=5).tolist() == [2, 2, 2, 2]
+    assert [name.startswith('test-batcher') for name, _ in calls] == [True, True]
+
+
+def test_disabled_batcher_calls_the_model_directly():
+    calls = []
+    batcher = MicroBatcher('test', recording_model(calls), max_batch_size=4, enabled=False)
+
+    assert batcher.predict(np.ones((1, 2))).tolist() == [2]
+    assert calls == [(threading.current_thread().name, 1)]
+
+
+def test_concurrent_requests_share_a_model_call():
+    calls = []
+    batcher = MicroBatcher('test', recording_model(calls, delay=0.1), max_batch_size=64, max_wait_ms=0)
+    results = {}
+
+    def request(value, rows):
+        results[value] = batcher.predict(np.full((rows, 2), value)).tolist()
+
+    # The first request occupies the worker while the others queue up behind it
+    first = threading.Thread(target=request, args=(1, 1))
+    first.start()
+    time.sleep(0.05)
+    others = [threading.Thread(target=request, args=(value, value)) for value in (2, 3, 4)]
+    for thread in others:
+        thread.start()
+    for thread in [first] + others:
+        thread.join()
+
+    assert results == {1: [2], 2: [4] * 2, 3: [6] * 3, 4: [8] * 4}
+    assert [rows for _, rows in calls] == [1, 9]
+    assert all(name.startswith('test-batcher') for name, _ in calls)
+    assert batcher.stats()['queue_wait_ms']['count'] == 4
+
+
+def test_model_errors_reach_every_caller():
+    def failing(features):
+        raise RuntimeError('model failed')
+
+    batcher = MicroBatcher('test', failing, max_batch_size=4, max_wait_ms=0)
+    with pytest.raises(RuntimeError, match='model failed'):
+        batcher.predict(np.ones((1, 2)))
+
+
+def test_missed_deadline_raises():
+    batcher = MicroBatcher('test', recording_model([], delay=0.2), max_batch_size=4, max_wait_ms=0)
+
+    with pytest.raises(DeadlineExceeded):
+        batcher.predict(np.ones((1, 2)), timeout=0.01)
+    with pytest.raises(DeadlineExceeded):
+        batcher.predict(np.ones((1, 2)), timeout=0)
+    assert batcher.stats()['deadline_misses'] == 2
+
+
+def test_full_queue_rejects_requests():
+    batcher = MicroBatcher('test', recording_model([]), max_batch_size=4, max_queue=0)
+
+    with pytest.raises(InferenceQueueFull):
+        batcher.predict(np.ones((1, 2)))
+    assert batcher.stats()['rejected'] == 1
@@ -0,0 +1,86 @@
+import time
+
+from cache import MemoryCacheBackend, PredictionCache, SQLiteCacheBackend
+
+
+def test_keys_ignore_key_order_and_number_spelling():
+    cache = PredictionCache(MemoryCacheBackend())
+
+    assert cache.make_key('soil', 'rules', {'features': [45, 28.0], 'crop_type': 'rice'}) == cache.make_key(
+        'soil', 'rules', {'crop_type': 'rice', 'features': [45.0, 28]}
+    )
+    assert cache.make_key('soil', 'rules', {'features': [45]}) != cache.make_key('soil', 'v2', {'features': [45]})
+
+
+def test_memory_cache_evicts_least_recently_used_and_expires():
+    cache = PredictionCache(MemoryCacheBackend(), max_entries=2)
+
+    cache.set_many([('a', {'score': 1}), ('b', {'score': 2})])
+    assert cache.get_many(['a']) == [{'score': 1}]
+    cache.set_many([('c', {'score': 3})])
+    assert cache.get_many(['a', 'b', 'c']) == [{'score': 1}, None, {'score': 3}]
+    assert cache.stats()['evictions'] == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    cache.ttl_seconds = -1
+    cache.set_many([('d', {'score': 4})])
+    assert cache.get_many(['d']) == [None]
+
+
+def test_rounded_keys_keep_exact_inputs():
+    cache = PredictionCache(MemoryCacheBackend(), round_digits=0, exact_keys=['field_area'])
+    inputs = {'soil_features': [45.2, 28.0], 'crop_type': 'rice', 'field_area': 2.4}
+
+    assert cache.make_key('crop-yield', 'rules', inputs) == cache.make_key(
+        'crop-yield', 'rules', {**inputs, 'soil_features': [44.8, 28.3]}
+    )
+    assert cache.make_key('crop-yield', 'rules', inputs) != cache.make_key(
+        'crop-yield', 'rules', {**inputs, 'field_area': 2.41}
+    )
+
+
+def test_sqlite_size_is_tracked_across_replace_expiry_and_eviction(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+    later = time.time() + 60
+
+    assert backend.set_many([('a', '1' * 10), ('b', '2' * 20)], later, 100, 10 ** 6) == 0
+    assert backend.size() == (2, 30)
+
+    # Replacing an entry swaps its size instead of adding a second entry
+    backend.set_many([('a', '3' * 5)], later, 100, 10 ** 6)
+    assert backend.size() == (2, 25)
+    assert backend.get_many(['a'], time.time()) == [33333]
+
+    # Expired entries are dropped by the next write
+    backend.set_many([('c', '4' * 7)], time.time() - 1, 100, 10 ** 6)
+    backend.set_many([('d', '5' * 3)], later, 100, 10 ** 6)
+    assert backend.size() == (3, 28)
+    assert backend.get_many(['c'], time.time()) == [None]
+
+    # Over the entry budget, the least recently used entries are evicted
+    evicted = backend.set_many([(f'k{index}', '6') for index in range(10)], later, 10, 10 ** 6)
+    entries, stored_bytes = backend._connection().execute(
+        'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM predictions'
+    ).fetchone()
+    assert evicted > 0
+    assert backend.size() == (entries, stored_bytes)
+    assert entries <= 10
+
+    backend.clear()
+    assert backend.size() == (0, 0)
+
+
+def test_sqlite_size_counts_a_cache_file_from_before_the_size_table(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / 'cache.sqlite3')
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute(
+        'CREATE TABLE predictions (key TEXT PRIMARY KEY, value TEXT, size INTEGER, expires REAL, accessed REAL)'
+    )
+    connection.execute("INSERT INTO predictions VALUES ('a', '\"x\"', 3, ?, 0)", (time.time() + 60,))
+    connection.close()
+
+    backend = SQLiteCacheBackend(path)
+    assert backend.size() == (1, 3)
+    assert backend.get_many(['a'], time.time()) == ['x']
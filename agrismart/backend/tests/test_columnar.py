@@ -0,0 +1,56 @@
+import numpy as np
+
+from columnar import ResultColumns, iter_bytes, pack, unpack
+
+
+def chunk(scores, labels, version):
+    """A scored chunk with a float, a dictionary-coded and a constant column"""
+    dictionary = sorted(set(labels))
+    return (
+        ResultColumns(len(scores))
+        .add('soilHealthScore', scores, np.float32, decimals=1)
+        .add('classification', [dictionary.index(label) for label in labels], np.uint8, dictionary=dictionary)
+        .constant('modelVersion', version)
+    )
+
+
+def test_pack_unpack_round_trip():
+    columns = chunk([71.25, 40.0, 88.85], ['Good', 'Poor', 'Excellent'], 'v1')
+    columns.add('index', [4, 0, 2], np.uint32)
+    data = b''.join(iter_bytes(pack(columns, count=3, errors=[{'index': 1, 'error': 'bad'}])))
+    data += b''.join(iter_bytes(pack(ResultColumns(0), progress={'processed': 3})))
+
+    (header, arrays), (final, empty) = list(unpack(data))
+    assert header['length'] == 3
+    assert header['constants'] == {'modelVersion': 'v1'}
+    assert header['errors'] == [{'index': 1, 'error': 'bad'}]
+    assert final['progress'] == {'processed': 3} and empty == {}
+    for name, values in columns.columns.items():
+        assert arrays[name].dtype == values.dtype
+        np.testing.assert_array_equal(arrays[name], values)
+    descriptions = {column['name']: column for column in header['columns']}
+    assert descriptions['soilHealthScore']['decimals'] == 1
+    assert descriptions['classification']['dictionary'] == ['Excellent', 'Good', 'Poor']
+    # Every column starts on an 8-byte boundary of the frame
+    assert all(column['offset'] % 8 == 0 for column in header['columns'])
+
+
+def test_packed_parts_are_bytes():
+    frame = pack(chunk([50.0], ['Fair'], 'v1'))
+
+    assert any(isinstance(part, memoryview) for part in frame)
+    assert all(type(part) is bytes for part in iter_bytes(frame))
+
+
+def test_concat_keeps_equal_constants_and_codes_differing_ones():
+    parts = [chunk([70.0, 30.0], ['Good', 'Poor'], 'v1'), chunk([90.0], ['Excellent'], 'v2')]
+
+    combined = ResultColumns.concat(parts)
+    assert combined.length == 3
+    assert 'modelVersion' not in combined.constants
+    assert [row['modelVersion'] for row in combined.rows()] == ['v1', 'v1', 'v2']
+    assert [row['classification'] for row in combined.rows()] == ['Good', 'Poor', 'Excellent']
+
+    same = ResultColumns.concat([chunk([70.0], ['Good'], 'v1'), chunk([30.0], ['Poor'], 'v1')])
+    assert same.constants == {'modelVersion': 'v1'}
+    assert 'modelVersion' not in same.columns
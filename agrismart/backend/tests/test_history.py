@@ -0,0 +1,66 @@
+import logging
+import time
+
+from history import PredictionHistory
+
+
+def test_query_pages_newest_first_and_aggregate_buckets(tmp_path):
+    history = PredictionHistory(str(tmp_path / 'history.sqlite3'))
+    # Well inside one hour bucket
+    created = 1700000000.0
+    history._write([
+        (created + index, 'soil-health', 'rules', {'fieldId': 'north'}, {'soilHealthScore': score, 'classification': label}, None)
+        for index, (score, label) in enumerate([(40, 'Fair'), (60, 'Good'), (80, 'Excellent')])
+    ])
+
+    rows, cursor = history.query('soil-health', field_id='north', limit=2)
+    assert [row['outputs']['soilHealthScore'] for row in rows] == [80, 60]
+    rows, cursor = history.query('soil-health', field_id='north', limit=2, cursor=cursor)
+    assert ([row['outputs']['soilHealthScore'] for row in rows], cursor) == ([40], None)
+
+    [bucket] = history.aggregate('soil-health', 3600)
+    assert (bucket['count'], bucket['mean'], bucket['min'], bucket['max']) == (3, 60, 40, 80)
+    assert bucket['labels'] == {'Excellent': 1, 'Fair': 1, 'Good': 1}
+
+
+def test_resolved_crop_type_is_stored(tmp_path):
+    history = PredictionHistory(str(tmp_path / 'history.sqlite3'))
+    records = [{'temperature': 30}, {'temperature': 30, 'cropType': 'Rice'}, {'temperature': 30, 'cropType': 'Rice'}]
+    results = [{'riskScore': 45.0}, {'riskScore': 55.0}, {'riskScore': 55.0}]
+
+    history.record_many('pest-risk', ['rules'] * 3, records, results, ['wheat', 'rice', None])
+    history.flush()
+
+    assert history.execute('SELECT crop_type FROM history ORDER BY id').fetchall() == [('wheat',), ('rice',), ('rice',)]
+    rows, _ = history.query('pest-risk', crop_type='wheat')
+    assert [row['inputs'] for row in rows] == [{'temperature': 30}]
+
+
+def test_prune_applies_retention_and_row_cap(tmp_path):
+    history = PredictionHistory(str(tmp_path / 'history.sqlite3'), retention_days=1, max_rows=3)
+    now = time.time()
+    history._write([
+        (now - 3 * 86400, 'rainfall', 'rules', {}, {'probability': 1.0}, None),
+        *[(now, 'rainfall', 'rules', {}, {'probability': float(index)}, None) for index in range(5)]
+    ])
+
+    assert history._prune(now) == 3
+    assert [row[0] for row in history.execute('SELECT score FROM history ORDER BY id')] == [2.0, 3.0, 4.0]
+    # Passes within PRUNE_INTERVAL of the last one are skipped
+    history._write([(now, 'rainfall', 'rules', {}, {'probability': 5.0}, None)])
+    assert history._prune(now + 1) == 0
+    assert history._prune(now + 120) == 1
+    assert history.stats()['pruned'] == 4
+
+
+def test_write_errors_are_logged(tmp_path, caplog):
+    history = PredictionHistory(str(tmp_path / 'history.sqlite3'))
+    history.add_listener(lambda connection, entries: 1 / 0)
+
+    with caplog.at_level(logging.ERROR, logger='history'):
+        history.record_many('rainfall', ['rules'], [{}], [{'probability': 10.0}])
+        history.flush()
+
+    assert history.stats()['write_errors'] == 1
+    assert 'division by zero' in caplog.text
+    assert history.execute('SELECT COUNT(*) FROM history').fetchone() == (0,)
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from metrics import MetricsRegistry, add_labels, format_histogram
+from profiler import SamplingProfiler
+
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests', ['route', 'status']).labels('/health', '200').inc(3)
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+    latency.labels().observe(0.05)
+    latency.labels().observe(0.5)
+
+    assert registry.render() == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{route="/health",status="200"} 3',
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 2',
+        'latency_seconds_sum 0.55',
+        'latency_seconds_count 2'
+    ]
+
+
+def test_add_labels_labels_every_sample():
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests', ['route']).labels('/health').inc()
+    registry.gauge('in_flight', 'In flight').labels().set(2)
+    lines = registry.render() + format_histogram('latency_seconds', {}, {'buckets': {'0.1': 1, '+Inf': 1}, 'count': 1, 'sum': 0.05})
+
+    labelled = add_labels(lines, {'pid': 42})
+
+    assert 'requests_total{pid="42",route="/health"} 1' in labelled
+    assert 'in_flight{pid="42"} 2' in labelled
+    assert 'latency_seconds_bucket{pid="42",le="0.1"} 1' in labelled
+    assert 'latency_seconds_sum{pid="42"} 0.05' in labelled
+    assert [line for line in labelled if line.startswith('#')] == [line for line in lines if line.startswith('#')]
+
+
+def test_metrics_endpoint_labels_samples_with_the_worker_pid():
+    import app
+
+    client = app.app.test_client()
+    client.get('/health')
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert f'agrismart_requests_total{{pid="{os.getpid()}",route="/health",status="200"}}' in body
+
+
+@pytest.mark.parametrize('interval_ms', [0, -5, 0.5, float('nan')])
+def test_profiler_rejects_busy_spinning_intervals(interval_ms):
+    profiler = SamplingProfiler()
+    with pytest.raises(ValueError):
+        profiler.start(interval_ms)
+    assert not profiler.running
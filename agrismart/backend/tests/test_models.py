@@ -0,0 +1,48 @@
+import os
+import time
+
+from models import ModelRegistry, get_file_version
+
+
+def read_model(path):
+    with open(path) as handle:
+        return handle.read()
+
+
+def test_file_version_follows_the_contents(tmp_path):
+    path = str(tmp_path / 'model.bin')
+    with open(path, 'w') as handle:
+        handle.write('weights-a')
+    stat = os.stat(path)
+    version = get_file_version(path)
+
+    # Same size, same whole-second mtime, different contents
+    with open(path, 'w') as handle:
+        handle.write('weights-b')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    swapped = get_file_version(path)
+    assert swapped != version
+
+    # Touching the file without changing it keeps its version
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert get_file_version(path) == swapped
+
+
+def test_same_size_swap_is_reloaded(tmp_path):
+    path = str(tmp_path / 'model.bin')
+    with open(path, 'w') as handle:
+        handle.write('weights-a')
+    registry = ModelRegistry(str(tmp_path))
+    registry.register('model', 'model.bin', read_model)
+    registry.load_all(wait=True)
+    assert registry.get('model') == 'weights-a'
+
+    stat = os.stat(path)
+    with open(path, 'w') as handle:
+        handle.write('weights-b')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    registry.check_for_updates()
+    deadline = time.monotonic() + 5
+    while registry._entries['model'].reloading and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert registry.get('model') == 'weights-b'
@@ -0,0 +1,136 @@
+"""
+Tests for the NumPy inference backend.
+
+The layers are checked against naive loop implementations that follow
+TensorFlow's definitions directly, including its 'same' padding, which puts
+the smaller half of the padding before the data.
+"""
+
+import numpy as np
+import pytest
+
+from numpy_model import NumpyModel, conv2d, max_pool2d
+
+
+def same_padding(dim, kernel, stride):
+    """Return (output size, padding before) of a TensorFlow 'same' dimension"""
+    out = -(-dim // stride)
+    return out, max((out - 1) * stride + kernel - dim, 0) // 2
+
+
+def output_geometry(shape, size, strides, padding):
+    """Return the output height and width and the padding before each of them"""
+    if padding == 'same':
+        (out_h, top), (out_w, left) = (same_padding(dim, k, s) for dim, k, s in zip(shape, size, strides))
+        return out_h, out_w, top, left
+    return (shape[0] - size[0]) // strides[0] + 1, (shape[1] - size[1]) // strides[1] + 1, 0, 0
+
+
+def naive_conv2d(x, kernel, bias, strides, padding):
+    n, h, w, channels = x.shape
+    kh, kw, _, filters = kernel.shape
+    out_h, out_w, top, left = output_geometry((h, w), (kh, kw), strides, padding)
+    out = np.zeros((n, out_h, out_w, filters))
+    for b in range(n):
+        for i in range(out_h):
+            for j in range(out_w):
+                for f in range(filters):
+                    total = bias[f]
+                    for di in range(kh):
+                        for dj in range(kw):
+                            row, column = i * strides[0] + di - top, j * strides[1] + dj - left
+                            if 0 <= row < h and 0 <= column < w:
+                                total += np.dot(x[b, row, column], kernel[di, dj, :, f])
+                    out[b, i, j, f] = total
+    return out
+
+
+def naive_max_pool2d(x, size, strides, padding):
+    n, h, w, channels = x.shape
+    out_h, out_w, top, left = output_geometry((h, w), size, strides, padding)
+    out = np.full((n, out_h, out_w, channels), -np.inf)
+    for i in range(out_h):
+        for j in range(out_w):
+            for di in range(size[0]):
+                for dj in range(size[1]):
+                    row, column = i * strides[0] + di - top, j * strides[1] + dj - left
+                    if 0 <= row < h and 0 <= column < w:
+                        out[:, i, j] = np.maximum(out[:, i, j], x[:, row, column])
+    return out
+
+
+SHAPES = [
+    # (height, width), window, strides, padding
+    ((5, 5), (3, 3), (2, 2), 'same'),
+    ((6, 7), (3, 3), (2, 2), 'same'),
+    ((7, 6), (2, 3), (3, 2), 'same'),
+    ((8, 8), (3, 3), (1, 1), 'same'),
+    ((4, 4), (2, 2), (2, 2), 'same'),
+    ((7, 7), (3, 3), (2, 2), 'valid'),
+    ((7, 5), (2, 2), (2, 2), 'valid'),
+    ((6, 6), (3, 2), (1, 2), 'valid')
+]
+
+
+@pytest.mark.parametrize('shape, size, strides, padding', SHAPES)
+def test_conv2d_matches_loops(shape, size, strides, padding):
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((2, *shape, 3))
+    kernel = rng.standard_normal((*size, 3, 4))
+    bias = rng.standard_normal(4)
+
+    expected = naive_conv2d(x, kernel, bias, strides, padding)
+    np.testing.assert_allclose(conv2d(x, kernel, bias, strides, padding), expected, rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize('shape, size, strides, padding', SHAPES)
+def test_max_pool2d_matches_loops(shape, size, strides, padding):
+    # All negative, so padding filled with zeros instead of -inf would win the maximum
+    x = -np.random.default_rng(1).random((2, *shape, 3)) - 1
+
+    np.testing.assert_array_equal(max_pool2d(x, size, strides, padding), naive_max_pool2d(x, size, strides, padding))
+
+
+def test_max_pool2d_same_padding_splits_like_tensorflow():
+    x = np.arange(5, dtype=np.float32).reshape(1, 1, 5, 1)
+
+    assert max_pool2d(x, (1, 3), (1, 2), 'same').ravel().tolist() == [1, 3, 4]
+
+
+def test_model_forward_pass_matches_loops():
+    rng = np.random.default_rng(2)
+    kernel, bias = rng.standard_normal((3, 3, 2, 4)), rng.standard_normal(4)
+    dense, dense_bias = rng.standard_normal((3 * 3 * 4, 5)), rng.standard_normal(5)
+    model = NumpyModel([
+        {'class_name': 'Conv2D', 'strides': [2, 2], 'padding': 'same', 'activation': 'relu'},
+        {'class_name': 'MaxPooling2D', 'pool_size': [3, 3], 'strides': [2, 2], 'padding': 'same'},
+        {'class_name': 'Dropout'},
+        {'class_name': 'Flatten'},
+        {'class_name': 'Dense', 'activation': 'softmax'}
+    ], [[kernel, bias], [], [], [], [dense, dense_bias]], (None, 11, 11, 2))
+    x = rng.random((3, 11, 11, 2))
+
+    hidden = naive_max_pool2d(np.maximum(naive_conv2d(x, kernel, bias, (2, 2), 'same'), 0), (3, 3), (2, 2), 'same')
+    logits = hidden.reshape(3, -1) @ dense + dense_bias
+    expected = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+
+    outputs = model.predict(x)
+    assert outputs.shape == (3, 5)
+    np.testing.assert_allclose(outputs, expected, rtol=1e-4, atol=1e-6)
+
+
+def test_saved_archive_reloads(tmp_path):
+    rng = np.random.default_rng(3)
+    model = NumpyModel(
+        [{'class_name': 'GlobalAveragePooling2D', 'weights': 0},
+         {'class_name': 'Dense', 'activation': 'sigmoid', 'weights': 2}],
+        [[], [rng.standard_normal((2, 1)).astype(np.float32), np.zeros(1, dtype=np.float32)]],
+        (None, 4, 4, 2)
+    )
+    path = str(tmp_path / 'model.npz')
+    model.save(path)
+    x = rng.random((2, 4, 4, 2))
+
+    reloaded = NumpyModel.load(path)
+    assert reloaded.input_shape == (None, 4, 4, 2)
+    np.testing.assert_array_equal(reloaded.predict(x), model.predict(x))
@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from rules import RuleTable, condition_edge, evaluate
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def single_condition_table(op, threshold=10):
+    """A rule set scoring 1 when value <op> threshold holds and 0 otherwise"""
+    return {
+        'inputs': ['value'],
+        'terms': [{'cases': [{'when': [['value', op, threshold]], 'value': 1}], 'default': 0}]
+    }
+
+
+@pytest.mark.parametrize('op, below, at, above', [
+    ('>=', 0, 1, 1),
+    ('>', 0, 0, 1),
+    ('<=', 1, 1, 0),
+    ('<', 1, 0, 0)
+])
+def test_strict_and_inclusive_bounds(op, below, at, above):
+    table = RuleTable(single_condition_table(op))
+    values = [np.nextafter(10, -np.inf), 10, np.nextafter(10, np.inf)]
+
+    assert table.score(values).tolist() == [below, at, above]
+    assert [table.lookup(value) for value in values] == [below, at, above]
+
+
+@pytest.mark.parametrize('op', ['>=', '>', '<=', '<'])
+def test_compiled_table_matches_the_rules_around_each_edge(op):
+    rule_set = single_condition_table(op, 0.1)
+    table = RuleTable(rule_set)
+    values = np.concatenate([np.linspace(-1, 1, 201), [0.1, np.nextafter(0.1, -np.inf), np.nextafter(0.1, np.inf)]])
+
+    expected = [evaluate(rule_set, {'value': value}, {}) for value in values.tolist()]
+    assert table.score(values).tolist() == expected
+
+
+def test_edges_are_left_closed():
+    assert condition_edge('>=', 5) == 5.0
+    assert condition_edge('<', 5) == 5.0
+    assert condition_edge('>', 5) == np.nextafter(5.0, np.inf)
+    assert condition_edge('<=', 5) == np.nextafter(5.0, np.inf)
+    with pytest.raises(ValueError):
+        condition_edge('==', 5)
+
+
+def test_ranges_and_first_matching_case():
+    table = RuleTable({
+        'inputs': ['ph'],
+        'terms': [{
+            'cases': [
+                {'when': [['ph', '>=', 6.0], ['ph', '<=', 7.0]], 'value': 20},
+                {'when': [['ph', '>=', 5.5], ['ph', '<=', 7.5]], 'value': 15}
+            ],
+            'default': 5
+        }]
+    })
+
+    assert table.score([5.49, 5.5, 5.99, 6.0, 7.0, 7.01, 7.5, 7.51]).tolist() == [5, 15, 15, 20, 20, 15, 15, 5]
+
+
+def test_many_edges_use_searchsorted_with_the_same_bins():
+    cases = [{'when': [['value', '>=', threshold]], 'value': threshold} for threshold in range(40, 0, -1)]
+    table = RuleTable({'inputs': ['value'], 'terms': [{'cases': cases, 'default': 0}]})
+    values = np.arange(-1, 42, 0.5)
+
+    assert table.score(values).tolist() == [min(max(int(np.floor(value)), 0), 40) for value in values]
+
+
+def test_unknown_categories_use_the_lookup_default():
+    tables = {'factors': {'rice': 25, 'wheat': 15}}
+    table = RuleTable({
+        'inputs': ['crop_type'],
+        'terms': [{'lookup': 'crop_type', 'table': 'factors', 'default': 20}]
+    }, tables)
+
+    assert table.score(['rice', 'Wheat', 'barley', '']).tolist() == [25, 15, 20, 20]
+    assert table.lookup('RICE') == 25
+    assert table.lookup('sorghum') == 20
+
+
+def test_label_results_have_codes_into_a_dictionary():
+    table = RuleTable({
+        'inputs': ['score'],
+        'combine': 'value',
+        'terms': [{'cases': [{'when': [['score', '>=', 80]], 'value': 'Excellent'}], 'default': 'Poor'}]
+    })
+
+    codes = table.codes([90, 10, 80])
+    assert [table.dictionary[code] for code in codes.tolist()] == ['Excellent', 'Poor', 'Excellent']
+    assert table.score([90, 10]).tolist() == ['Excellent', 'Poor']
+
+
+def test_rules_path_override(tmp_path):
+    with open(os.path.join(BACKEND_DIR, 'rules.json')) as handle:
+        rules = json.load(handle)
+    # Stricter nitrogen threshold and a new crop in the pest risk lookup table
+    rules['soil_health']['terms'][0]['cases'][0]['when'] = [['nitrogen', '>', 50]]
+    rules['tables']['crop_risk_factors']['millet'] = 12
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps(rules))
+
+    script = (
+        'from scoring import calculate_soil_health_fallback_batch as soil, calculate_pest_risk_fallback_batch as pest; '
+        'print(soil([50, 50.5], 10, 4, 0, 0).tolist(), pest(0, 0, 0, ["millet", "rice"]).tolist())'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', script], cwd=BACKEND_DIR, env=dict(os.environ, RULES_PATH=str(path)),
+        capture_output=True, text=True, check=True
+    ).stdout
+
+    assert output.strip() == '[43, 53] [27, 40]'
@@ -0,0 +1,240 @@
+"""
+Parity tests for the rule-based fallback scorers.
+
+The reference functions below are the original if/elif rules the API served
+before they were vectorized and compiled from rules.json; the scorers must
+reproduce them exactly, at every threshold and on random inputs.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from scoring import (
+    calculate_pest_risk_fallback_batch,
+    calculate_rainfall_probability_fallback_batch,
+    calculate_soil_health_fallback_batch,
+    calculate_weather_factor_batch
+)
+
+REFERENCE_CROP_RISK_FACTORS = {'wheat': 15, 'rice': 25, 'corn': 20, 'cotton': 30, 'soybean': 18}
+
+
+def reference_soil_health(nitrogen, phosphorus, ph, temperature, humidity):
+    score = 0
+    if nitrogen >= 50:
+        score += 30
+    elif nitrogen >= 30:
+        score += 20
+    else:
+        score += 10
+    if phosphorus >= 25:
+        score += 25
+    elif phosphorus >= 15:
+        score += 18
+    else:
+        score += 8
+    if 6.0 <= ph <= 7.0:
+        score += 20
+    elif 5.5 <= ph <= 7.5:
+        score += 15
+    else:
+        score += 5
+    if 20 <= temperature <= 30 and 40 <= humidity <= 70:
+        score += 25
+    elif 15 <= temperature <= 35 and 30 <= humidity <= 80:
+        score += 18
+    else:
+        score += 10
+    return min(score, 100)
+
+
+def reference_weather_factor(temperature, humidity, rainfall):
+    factor = 1.0
+    if 20 <= temperature <= 30:
+        factor *= 1.1
+    elif temperature < 15 or temperature > 35:
+        factor *= 0.8
+    if 50 <= humidity <= 70:
+        factor *= 1.05
+    elif humidity < 30 or humidity > 85:
+        factor *= 0.9
+    if 50 <= rainfall <= 150:
+        factor *= 1.1
+    elif rainfall > 200:
+        factor *= 0.85
+    return max(0.6, min(1.4, factor))
+
+
+def reference_pest_risk(temperature, humidity, rainfall, crop_type):
+    risk_score = 0
+    if temperature > 30 and humidity > 70:
+        risk_score += 40
+    elif temperature > 25 and humidity > 60:
+        risk_score += 25
+    else:
+        risk_score += 10
+    if rainfall > 100:
+        risk_score += 30
+    elif rainfall > 50:
+        risk_score += 20
+    else:
+        risk_score += 5
+    risk_score += REFERENCE_CROP_RISK_FACTORS.get(crop_type.lower(), 20)
+    return min(risk_score, 100)
+
+
+def reference_rainfall_probability(temperature, humidity, pressure):
+    probability = 0
+    if humidity > 80:
+        probability += 40
+    elif humidity > 60:
+        probability += 20
+    if pressure < 1000:
+        probability += 30
+    elif pressure < 1010:
+        probability += 15
+    if temperature < 25:
+        probability += 10
+    return min(probability, 90)
+
+
+def near(rng, thresholds, low, high):
+    """Draw a value at, just around or between the thresholds of a rule"""
+    choice = rng.random()
+    if choice < 0.3:
+        return rng.choice(thresholds)
+    if choice < 0.6:
+        return rng.choice(thresholds) + rng.choice([-1e-9, 1e-9, -0.01, 0.01])
+    return rng.uniform(low, high)
+
+
+@pytest.mark.parametrize('inputs, expected', [
+    ((50, 10, 4, 0, 0), 53),
+    ((49.99, 10, 4, 0, 0), 43),
+    ((30, 10, 4, 0, 0), 43),
+    ((29.99, 10, 4, 0, 0), 33),
+    ((0, 25, 4, 0, 0), 50),
+    ((0, 24.99, 4, 0, 0), 43),
+    ((0, 15, 4, 0, 0), 43),
+    ((0, 14.99, 4, 0, 0), 33),
+    ((0, 0, 6.0, 0, 0), 48),
+    ((0, 0, 7.0, 0, 0), 48),
+    ((0, 0, 5.99, 0, 0), 43),
+    ((0, 0, 7.01, 0, 0), 43),
+    ((0, 0, 5.5, 0, 0), 43),
+    ((0, 0, 7.5, 0, 0), 43),
+    ((0, 0, 5.49, 0, 0), 33),
+    ((0, 0, 7.51, 0, 0), 33),
+    ((0, 10, 4, 20, 40), 48),
+    ((0, 10, 4, 30, 70), 48),
+    ((0, 10, 4, 19.99, 50), 41),
+    ((0, 10, 4, 15, 30), 41),
+    ((0, 10, 4, 35, 80), 41),
+    ((0, 10, 4, 14.99, 50), 33),
+    ((0, 10, 4, 25, 80.01), 33),
+    ((50, 25, 6.5, 25, 50), 100)
+])
+def test_soil_health_thresholds(inputs, expected):
+    assert calculate_soil_health_fallback_batch(*inputs) == expected
+    assert reference_soil_health(*inputs) == expected
+
+
+@pytest.mark.parametrize('inputs, expected', [
+    ((25, 60, 100), 1.1 * 1.05 * 1.1),
+    ((20, 50, 50), 1.1 * 1.05 * 1.1),
+    ((30, 70, 150), 1.1 * 1.05 * 1.1),
+    ((15, 30, 200), 1.0),
+    ((35, 85, 49.99), 1.0),
+    ((14.99, 29.99, 200.01), 0.8 * 0.9 * 0.85),
+    ((35.01, 85.01, 0), 0.8 * 0.9),
+    ((30.01, 70.01, 150.01), 1.0)
+])
+def test_weather_factor_thresholds(inputs, expected):
+    assert calculate_weather_factor_batch(*inputs) == pytest.approx(expected)
+    assert calculate_weather_factor_batch(*inputs) == reference_weather_factor(*inputs)
+
+
+@pytest.mark.parametrize('inputs, expected', [
+    ((30.01, 70.01, 0, 'wheat'), 60),
+    ((30, 70.01, 0, 'wheat'), 45),
+    ((30.01, 70, 0, 'wheat'), 45),
+    ((25.01, 60.01, 0, 'wheat'), 45),
+    ((25, 60.01, 0, 'wheat'), 30),
+    ((0, 0, 100.01, 'rice'), 65),
+    ((0, 0, 100, 'rice'), 55),
+    ((0, 0, 50.01, 'rice'), 55),
+    ((0, 0, 50, 'rice'), 40),
+    ((0, 0, 0, 'Cotton'), 45),
+    ((0, 0, 0, 'soybean'), 33),
+    ((0, 0, 0, 'corn'), 35),
+    ((0, 0, 0, 'barley'), 35),
+    ((31, 71, 101, 'cotton'), 100)
+])
+def test_pest_risk_thresholds(inputs, expected):
+    assert calculate_pest_risk_fallback_batch(*inputs) == expected
+    assert reference_pest_risk(*inputs) == expected
+
+
+@pytest.mark.parametrize('inputs, expected', [
+    ((25, 80.01, 999.99), 70),
+    ((25, 80, 1000), 35),
+    ((25, 60, 1010), 0),
+    ((25, 60.01, 1009.99), 35),
+    ((24.99, 80.01, 999), 80),
+    ((24.99, 0, 1010), 10)
+])
+def test_rainfall_probability_thresholds(inputs, expected):
+    assert calculate_rainfall_probability_fallback_batch(*inputs) == expected
+    assert reference_rainfall_probability(*inputs) == expected
+
+
+def test_soil_health_matches_reference():
+    rng = random.Random(1)
+    rows = [
+        (near(rng, [30, 50], 0, 100), near(rng, [15, 25], 0, 60), near(rng, [5.5, 6.0, 7.0, 7.5], 3, 10),
+         near(rng, [15, 20, 30, 35], -5, 50), near(rng, [30, 40, 70, 80], 0, 100))
+        for _ in range(20000)
+    ]
+    scores = calculate_soil_health_fallback_batch(*map(list, zip(*rows)))
+    assert scores.tolist() == [reference_soil_health(*row) for row in rows]
+
+
+def test_weather_factor_matches_reference():
+    rng = random.Random(2)
+    rows = [
+        (near(rng, [15, 20, 30, 35], -5, 50), near(rng, [30, 50, 70, 85], 0, 100), near(rng, [50, 150, 200], 0, 400))
+        for _ in range(20000)
+    ]
+    factors = calculate_weather_factor_batch(*map(list, zip(*rows)))
+    # Compared exactly: the factors are multiplied in the same order as the reference
+    assert factors.tolist() == [reference_weather_factor(*row) for row in rows]
+
+
+def test_pest_risk_matches_reference():
+    rng = random.Random(3)
+    crops = list(REFERENCE_CROP_RISK_FACTORS) + ['Rice', 'WHEAT', 'barley', '']
+    rows = [
+        (near(rng, [25, 30], 0, 50), near(rng, [60, 70], 0, 100), near(rng, [50, 100], 0, 300), rng.choice(crops))
+        for _ in range(20000)
+    ]
+    temperature, humidity, rainfall, crop_types = map(list, zip(*rows))
+    scores = calculate_pest_risk_fallback_batch(temperature, humidity, rainfall, crop_types)
+    assert scores.tolist() == [reference_pest_risk(*row) for row in rows]
+
+
+def test_rainfall_probability_matches_reference():
+    rng = random.Random(4)
+    rows = [
+        (near(rng, [25], 0, 50), near(rng, [60, 80], 0, 100), near(rng, [1000, 1010], 950, 1050))
+        for _ in range(20000)
+    ]
+    probabilities = calculate_rainfall_probability_fallback_batch(*map(list, zip(*rows)))
+    assert probabilities.tolist() == [reference_rainfall_probability(*row) for row in rows]
+
+
+def test_scalar_inputs_score_like_a_batch_of_one():
+    assert calculate_soil_health_fallback_batch(45, 28, 6.5, 25, 60) == reference_soil_health(45, 28, 6.5, 25, 60)
+    assert calculate_pest_risk_fallback_batch(28, 75, 120, 'cotton') == reference_pest_risk(28, 75, 120, 'cotton')
+    assert np.ndim(calculate_rainfall_probability_fallback_batch(22, 85, 1005)) == 0